@@ -0,0 +1,702 @@
+"""
+Micro-benchmarks for the hash tables and the search engine.
+
+Run a single benchmark by name, e.g.
+
+    python benchmarks.py hashtable 1000 100000
+
+Every benchmark prints one line per measurement so results can be diffed
+between runs.
+"""
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from hashtables import (HashTableSepchain, HashTableQuadratic, HashTableLinear,
+                        HashTableCompact, polynomial_hash)
+from project4 import SearchEngine, import_stopwords
+from server import QueryServer, request
+from sharding import ShardedSearchEngine
+from stopwords import read_stopwords, stopword_set
+from tokenizer import CHUNK_SIZE, Analyzer, split_chunks
+
+
+def timed(func, *args):
+    """runs func once and measures how long it took
+    Args:
+    func (callable) : the function to time
+    Returns:
+    float : elapsed wall clock seconds
+    """
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_hashtable(sizes=(10**3, 10**4, 10**5, 10**6, 10**7), table=HashTableLinear):
+    """measures put and get throughput of a hash table class
+    Args:
+    sizes (iterable) : numbers of keys to insert
+    table (class) : the hash table class to benchmark
+    """
+    for size in sizes:
+        keys = ["key%d" % i for i in range(size)]
+        hash_table = table()
+
+        def fill():
+            for key in keys:
+                hash_table.put(key, 1)
+
+        def lookup():
+            for key in keys:
+                hash_table.get(key)
+
+        put_time = timed(fill)
+        get_time = timed(lookup)
+        print("%s n=%d put=%.0f ops/s get=%.0f ops/s" % (
+            table.__name__, size, size / put_time, size / get_time))
+
+
+def bench_table_memory(sizes=(10**3, 10**4, 10**5, 10**6), tables=(HashTableLinear, HashTableCompact)):
+    """measures the bytes each table class allocates per stored key/int pair
+    Args:
+    sizes (iterable) : numbers of keys to insert
+    tables (iterable) : the hash table classes to compare
+    """
+    for size in sizes:
+        keys = ["doc%d.txt" % i for i in range(size)]
+        for table in tables:
+            tracemalloc.start()
+            hash_table = table()
+            for key in keys:
+                hash_table.put(key, 1)
+            used = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print("%s n=%d bytes/entry=%.1f" % (table.__name__, size, used / size))
+            del hash_table
+
+
+def bench_hashing(sizes=(10**3, 10**4, 10**5, 10**6)):
+    """compares insert throughput of every table class when keys are hashed
+    with the old per-character polynomial_hash and with the built-in hash
+    Args:
+    sizes (iterable) : numbers of keys to insert
+    """
+    tables = (HashTableSepchain, HashTableQuadratic, HashTableLinear, HashTableCompact)
+    for size in sizes:
+        keys = ["term%d" % i for i in range(size)]
+        for table in tables:
+            for hash_func in (polynomial_hash, hash):
+                hash_table = table(hash_func=hash_func)
+
+                def fill():
+                    for key in keys:
+                        hash_table.put(key, 1)
+
+                elapsed = timed(fill)
+                print("%s hash=%s n=%d put=%.0f ops/s" % (
+                    table.__name__, hash_func.__name__, size, size / elapsed))
+
+
+def make_corpus(directory, num_docs=2000, words_per_doc=2000, vocabulary=50000, seed=4):
+    """writes a synthetic corpus of text files with a Zipf-like term distribution
+    Args:
+    directory (str) : the directory to write the files to
+    num_docs (int) : number of documents
+    words_per_doc (int) : number of words in each document
+    vocabulary (int) : number of distinct terms
+    seed (int) : random seed, so runs index the same corpus
+    """
+    rng = random.Random(seed)
+    terms = ["term%d" % i for i in range(vocabulary)]
+    weights = [1.0 / (rank + 1) for rank in range(vocabulary)]
+    for doc in range(num_docs):
+        words = rng.choices(terms, weights, k=words_per_doc)
+        with open(os.path.join(directory, "doc%05d.txt" % doc), "w") as writer:
+            for start in range(0, len(words), 20):
+                writer.write(" ".join(words[start:start + 20]) + "\n")
+
+
+def bench_indexing(max_workers=os.cpu_count(), num_docs=2000):
+    """measures how index build time scales with the number of worker processes
+    Args:
+    max_workers (int) : the largest worker count to try
+    num_docs (int) : number of documents in the synthetic corpus
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs)
+        stopwords = import_stopwords("stop_words.txt", HashTableLinear())
+        base = None
+        workers = 1
+        while workers <= max_workers:
+            elapsed = timed(SearchEngine, directory, stopwords, None, True, workers)
+            base = base or elapsed
+            print("index docs=%d workers=%d time=%.2fs speedup=%.2fx" % (
+                num_docs, workers, elapsed, base / elapsed))
+            workers *= 2
+    finally:
+        shutil.rmtree(directory)
+
+
+def list_scores(engine, terms):
+    """the original get_scores accumulator: parallel lists searched with
+    'not in' and index() for every posting
+    Args:
+    engine (SearchEngine) : the engine to score with
+    terms (list) : query terms
+    Returns:
+    tuple : a list of filenames and a list of their scores
+    """
+    scores = ([], [])
+    for term in terms:
+        postings = engine.index.postings(term)
+        for doc_id, freq in zip(postings.doc_ids, postings.freqs):
+            file = engine.index.filenames[doc_id]
+            freq = engine.get_weighted_freq(freq) / engine.index.doc_lengths[doc_id]
+            if file not in scores[0]:
+                scores[0].append(file)
+                scores[1].append(freq)
+            else:
+                scores[1][scores[0].index(file)] += freq
+    return scores
+
+
+def bench_scoring(num_docs=5000, repeat=20, legacy=True):
+    """measures query latency for queries whose terms match thousands of documents
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    repeat (int) : number of times each query is run
+    legacy (bool) : also time the original list based accumulator
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        engine = SearchEngine(directory, import_stopwords("stop_words.txt", HashTableLinear()))
+    finally:
+        shutil.rmtree(directory)
+    for query in ("term0", "term1 term5", "term2 term10 term50 term200"):
+        terms = query.split()
+        matched = len(engine.get_scores(terms))
+        elapsed = timed(lambda: [engine.rank(engine.get_scores(terms), 10)
+                                 for _ in range(repeat)])
+        print("score query=%r matched=%d time=%.2fms" % (
+            query, matched, 1000 * elapsed / repeat))
+        if engine.vectorized:
+            engine.vectorized = False
+            elapsed = timed(lambda: [engine.rank(engine.get_scores(terms), 10)
+                                     for _ in range(repeat)])
+            engine.vectorized = True
+            print("score(python) query=%r matched=%d time=%.2fms" % (
+                query, matched, 1000 * elapsed / repeat))
+        if legacy:
+            elapsed = timed(lambda: list_scores(engine, terms))
+            print("score(lists) query=%r matched=%d time=%.2fms" % (query, matched, 1000 * elapsed))
+
+
+def bench_pruning(num_docs=5000, repeat=20, k=10, weighting="bm25"):
+    """compares MaxScore pruned top-k queries with exhaustive scoring
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    repeat (int) : number of times each query is run
+    k (int) : number of results per query
+    weighting (str) : the weighting scheme, pruning needs one with idf to skip common terms
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        engine = SearchEngine(directory, import_stopwords("stop_words.txt", HashTableLinear()),
+                              weighting=weighting, cache_size=0)
+    finally:
+        shutil.rmtree(directory)
+    engine.index.refresh_weights()
+    for query in ("term0 term1", "term0 term1 term2 term3", "term0 term5 term500 term5000",
+                  "term1 term2 term300 term3000"):
+        for pruned in (False, True):
+            engine.pruning = pruned
+            elapsed = timed(lambda: [engine.search_results(query, k) for _ in range(repeat)])
+            print("top%d(%s) query=%r time=%.2fms" % (
+                k, "maxscore" if pruned else "exhaustive", query, 1000 * elapsed / repeat))
+
+
+def bench_boolean(num_docs=5000, repeat=20):
+    """measures conjunctive queries of rare and common terms, evaluated by
+    galloping intersection, against scoring the union of their posting lists
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    repeat (int) : number of times each query is run
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        engine = SearchEngine(directory, import_stopwords("stop_words.txt", HashTableLinear()),
+                              cache_size=0)
+    finally:
+        shutil.rmtree(directory)
+    engine.index.refresh_weights()
+    for terms in (["term0", "term1"], ["term0", "term3000"], ["term0", "term1", "term2", "term5000"]):
+        query = " AND ".join(terms)
+        matched = len(engine.boolean_scores(query))
+        elapsed = timed(lambda: [engine.search_results(query, 10) for _ in range(repeat)])
+        print("and query=%r matched=%d time=%.2fms" % (query, matched, 1000 * elapsed / repeat))
+        elapsed = timed(lambda: [engine.rank(engine.get_scores(terms), 10)
+                                 for _ in range(repeat)])
+        print("or  query=%r time=%.2fms" % (" ".join(terms), 1000 * elapsed / repeat))
+
+
+def bench_positions(num_docs=2000, repeat=20):
+    """measures the memory a positional index adds and the latency of phrase
+    and proximity queries
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    repeat (int) : number of times each query is run
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        stopwords = import_stopwords("stop_words.txt", HashTableLinear())
+        elapsed = timed(SearchEngine, directory, stopwords)
+        print("index positional=False time=%.2fs" % elapsed)
+        start = time.perf_counter()
+        engine = SearchEngine(directory, stopwords, positional=True, cache_size=0)
+        print("index positional=True time=%.2fs" % (time.perf_counter() - start))
+    finally:
+        shutil.rmtree(directory)
+    stats = engine.index.stats()
+    print("postings=%d posting_bytes=%d weight_bytes=%d position_bytes=%d overhead=%.0f%%" % (
+        stats["postings"], stats["posting_bytes"], stats["weight_bytes"],
+        stats["position_bytes"], 100 * stats["position_overhead"]))
+    for query in ('"term0 term1"', '"term0 term1 term2"', "term0 NEAR/5 term100",
+                  '"term3 term50"'):
+        matched = len(engine.boolean_scores(query))
+        elapsed = timed(lambda: [engine.search_results(query, 10) for _ in range(repeat)])
+        print("query=%r matched=%d time=%.2fms" % (query, matched, 1000 * elapsed / repeat))
+
+
+def bench_compression(num_docs=2000, repeat=5):
+    """measures the bytes per posting of compressed and uncompressed index files,
+    how fast compressed postings decode and how query latency compares
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    repeat (int) : number of times each query is run
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        engine = SearchEngine(directory, import_stopwords("stop_words.txt", HashTableLinear()))
+        engines = {}
+        for compress in (False, True):
+            path = os.path.join(directory, "index%d.idx" % compress)
+            engine.index.compressed = compress
+            engine.save_index(path)
+            engines[compress] = SearchEngine(directory, engine.stopwords, path, update=False,
+                                             cache_size=0)
+            stats = engines[compress].index.stats()
+            print("compressed=%s file_bytes=%d postings=%d bytes/posting(ids+freqs)=%.2f" % (
+                compress, os.path.getsize(path), stats["postings"],
+                stats["posting_bytes"] / stats["postings"]))
+        lists = [postings for _, postings in engines[True].index.term_postings()]
+        elapsed = timed(lambda: [(sum(postings.doc_ids), sum(postings.freqs))
+                                 for postings in lists])
+        count = sum(len(postings) for postings in lists)
+        print("decode postings=%d time=%.2fs throughput=%.1fM postings/s" % (
+            count, elapsed, count / elapsed / 1e6))
+        for query in ("term0 term1", "term5 term500 term5000", "term0 AND term3000"):
+            for compress, searcher in engines.items():
+                elapsed = timed(lambda: [searcher.search_results(query, 10)
+                                         for _ in range(repeat)])
+                print("compressed=%s query=%r time=%.2fms" % (
+                    compress, query, 1000 * elapsed / repeat))
+        del engines, lists
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_cache(num_docs=2000, num_queries=5000, distinct=300):
+    """replays a skewed query log with and without the query result cache
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    num_queries (int) : number of queries replayed
+    distinct (int) : number of distinct queries, repeated with Zipf-like frequencies
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        engine = SearchEngine(directory, import_stopwords("stop_words.txt", HashTableLinear()))
+    finally:
+        shutil.rmtree(directory)
+    rng = random.Random(9)
+    queries = ["term%d term%d" % (rng.randrange(200), rng.randrange(5000))
+               for _ in range(distinct)]
+    log = rng.choices(queries, [1.0 / (rank + 1) for rank in range(distinct)], k=num_queries)
+    cache = engine.cache
+    for cached in (False, True):
+        engine.cache = cache if cached else None
+        elapsed = timed(lambda: [engine.search_results(query, 10) for query in log])
+        print("cached=%s queries=%d time=%.2fs per_query=%.3fms" % (
+            cached, num_queries, elapsed, 1000 * elapsed / num_queries))
+    print("cache %s" % " ".join("%s=%s" % item for item in sorted(cache.stats().items())))
+
+
+def bench_posting_cache(num_docs=2000, num_queries=2000, budget=1 << 20):
+    """replays a skewed query log against a compressed index file, decoding
+    postings on every query and with the posting cache
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    num_queries (int) : number of queries replayed
+    budget (int) : memory budget of the posting cache in bytes
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        stopwords = import_stopwords("stop_words.txt", HashTableLinear())
+        path = os.path.join(directory, "index.idx")
+        SearchEngine(directory, stopwords, path, compress=True)
+        rng = random.Random(11)
+        terms = ["term%d" % i for i in range(20000)]
+        log = [" ".join(rng.choices(terms, [1.0 / (rank + 1) for rank in range(20000)], k=3))
+               for _ in range(num_queries)]
+        for size in (0, budget):
+            engine = SearchEngine(directory, stopwords, path, update=False, cache_size=0,
+                                  posting_cache_size=size)
+            elapsed = timed(lambda: [engine.search_results(query, 10) for query in log])
+            print("posting_cache=%d queries=%d time=%.2fs per_query=%.3fms" % (
+                size, num_queries, elapsed, 1000 * elapsed / num_queries))
+            if size:
+                stats = engine.index.posting_cache.stats()
+                print("cache %s" % " ".join("%s=%s" % item for item in sorted(stats.items())))
+            del engine
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_server(num_docs=2000, clients=50, queries_per_client=20, workers=os.cpu_count()):
+    """measures the throughput of the query server under concurrent clients,
+    scoring in one thread and in worker processes
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    clients (int) : number of concurrent connections
+    queries_per_client (int) : number of queries each client sends, one at a time
+    workers (int) : number of worker processes
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        path = os.path.join(directory, "index.idx")
+        engine = SearchEngine(directory, import_stopwords("stop_words.txt", HashTableLinear()),
+                              path, cache_size=0)
+        rng = random.Random(13)
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for _ in range(queries_per_client):
+                query = "term%d term%d" % (rng.randrange(100), rng.randrange(10000))
+                await request(reader, writer, query, 10)
+            writer.close()
+            await writer.wait_closed()
+
+        async def run(server):
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            start = time.perf_counter()
+            await asyncio.gather(*[client(port) for _ in range(clients)])
+            elapsed = time.perf_counter() - start
+            await server.stop(listener)
+            return elapsed
+
+        for count in (0, workers):
+            elapsed = asyncio.run(run(QueryServer(engine, path, count)))
+            total = clients * queries_per_client
+            print("server workers=%d clients=%d queries=%d time=%.2fs qps=%.0f" % (
+                count, clients, total, elapsed, total / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_load(num_docs=2000, vocabulary=50000, repeat=5):
+    """measures how long opening a saved index takes, the memory the opened index
+    holds and the latency of the first queries against it
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    vocabulary (int) : number of distinct terms in the corpus
+    repeat (int) : number of times the index is opened
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=500, vocabulary=vocabulary)
+        path = os.path.join(directory, "index.idx")
+        stopwords = import_stopwords("stop_words.txt")
+        SearchEngine(directory, stopwords, path)
+        for compress in (False, True):
+            SearchEngine(directory, stopwords, path, update=False, compress=compress).save_index(
+                path)
+            elapsed = timed(lambda: [SearchEngine(directory, stopwords, path, update=False)
+                                     for _ in range(repeat)])
+            tracemalloc.start()
+            engine = SearchEngine(directory, stopwords, path, update=False, cache_size=0)
+            used = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            rng = random.Random(5)
+            queries = ["term%d term%d" % (rng.randrange(100), rng.randrange(vocabulary))
+                       for _ in range(100)]
+            first = timed(lambda: [engine.search_results(query, 10) for query in queries])
+            print("load compress=%s terms=%d time=%.1fms memory=%.1fMB first queries=%.2fms" % (
+                compress, len(engine.index.terms), elapsed / repeat * 1000, used / 2**20,
+                first / len(queries) * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_sharding(num_docs=4000, max_shards=os.cpu_count(), num_queries=400, clients=8,
+                   weighting="bm25"):
+    """measures build time and query throughput of one engine against the corpus
+    split into 1, 2, 4 ... max_shards shards, with clients sending queries at once
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    max_shards (int) : the largest shard count to try
+    num_queries (int) : number of queries sent
+    clients (int) : number of threads sending queries to the sharded engine
+    weighting (str) : the weighting scheme, bm25 to include sharing corpus statistics
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        stopwords = import_stopwords("stop_words.txt")
+        rng = random.Random(21)
+        queries = ["term%d term%d" % (rng.randrange(100), rng.randrange(10000))
+                   for _ in range(num_queries)]
+        start = time.perf_counter()
+        engine = SearchEngine(directory, stopwords, weighting=weighting, cache_size=0)
+        engine.index.refresh_weights()
+        built = time.perf_counter() - start
+        elapsed = timed(lambda: [engine.search_results(query, 10) for query in queries])
+        print("shards=0 docs=%d build=%.2fs qps=%.0f" % (num_docs, built, num_queries / elapsed))
+        shards = 1
+        while shards <= max_shards:
+            start = time.perf_counter()
+            sharded = ShardedSearchEngine(directory, stopwords, shards=shards,
+                                          weighting=weighting, cache_size=0)
+            built = time.perf_counter() - start
+            try:
+                with ThreadPoolExecutor(clients) as pool:
+                    elapsed = timed(lambda: list(pool.map(
+                        lambda query: sharded.search_results(query, 10), queries)))
+            finally:
+                sharded.close()
+            print("shards=%d docs=%d build=%.2fs qps=%.0f" % (
+                shards, num_docs, built, num_queries / elapsed))
+            shards *= 2
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_batch(num_docs=2000, num_queries=2000, vocabulary=300, workers=os.cpu_count()):
+    """measures scoring a batch of queries one search_results call at a time against
+    one search_batch call, on a plain and a compressed index without caches
+    Args:
+    num_docs (int) : number of documents in the synthetic corpus
+    num_queries (int) : number of queries in the batch
+    vocabulary (int) : number of distinct terms the queries are drawn from
+    workers (int) : number of processes for the parallel batch
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        make_corpus(directory, num_docs, words_per_doc=300)
+        path = os.path.join(directory, "index.idx")
+        stopwords = import_stopwords("stop_words.txt")
+        SearchEngine(directory, stopwords, path)
+        rng = random.Random(8)
+        queries = ["term%d term%d term%d" % tuple(rng.randrange(vocabulary) for _ in range(3))
+                   for _ in range(num_queries)]
+        for compress in (False, True):
+            engine = SearchEngine(directory, stopwords, path, update=False, compress=compress,
+                                  cache_size=0, posting_cache_size=0)
+            engine.save_index(path)
+            engine = SearchEngine(directory, stopwords, path, update=False, cache_size=0,
+                                  posting_cache_size=0)
+            single = timed(lambda: [engine.search_results(query, 10) for query in queries])
+            batch = timed(engine.search_batch, queries, 10)
+            parallel = timed(engine.search_batch, queries, 10, 0, workers)
+            print("batch compress=%s queries=%d one_by_one=%.0f qps batch=%.0f qps "
+                  "workers=%d %.0f qps" % (compress, num_queries, num_queries / single,
+                                           num_queries / batch, workers, num_queries / parallel))
+    finally:
+        shutil.rmtree(directory)
+
+
+def legacy_stopwords(filename, hashtable):
+    """the original import_stopwords: builds each word a character at a time and
+    drops the last word unless the file ends with a space
+    Args:
+    filename (str) : the path to a file of space separated words
+    hashtable (HashTableLinear) : an empty hash table
+    Returns:
+    HashTableLinear : the hash table
+    """
+    with open(filename, "r") as reader:
+        string_file = reader.read()
+    temp_string = ""
+    for i in string_file:
+        if i == " ":
+            hashtable.put(temp_string, temp_string)
+            temp_string = ""
+        else:
+            temp_string += i
+    return hashtable
+
+
+def stopword_text(megabytes, stopword_ratio, punctuation=(), seed=17):
+    """generates lines of text mixing stopwords with other terms
+    Args:
+    megabytes (float) : approximate size of the text
+    stopword_ratio (float) : fraction of the words that are stopwords
+    punctuation (sequence) : marks appended to words at random, '' for none
+    seed (int) : random seed
+    Returns:
+    list : the lines, each ending with a newline
+    """
+    rng = random.Random(seed)
+    words = read_stopwords("stop_words.txt")
+    terms = ["term%d" % i for i in range(10000)]
+    line = []
+    lines = []
+    size = 0
+    while size < megabytes * 2**20:
+        word = rng.choice(words) if rng.random() < stopword_ratio else rng.choice(terms)
+        line.append(word + rng.choice(punctuation) if punctuation else word)
+        if len(line) == 20:
+            lines.append(" ".join(line) + "\n")
+            size += len(lines[-1])
+            line = []
+    return lines
+
+
+def legacy_tokenize(chunks, stopwords):
+    """the tokenizer before Analyzer: checks each word against stopwords as it goes
+    Args:
+    chunks (iterable) : consecutive pieces of a text
+    stopwords (HashTableLinear) : words to leave out
+    Returns:
+    generator : lower case words that are not stopwords
+    """
+    for words in split_chunks(chunks):
+        for word in words:
+            if word not in stopwords:
+                yield word
+
+
+def bench_tokenizer(megabytes=20, stopword_ratio=0.4, repeat=20):
+    """measures tokenizer throughput with the stopwords in a HashTableLinear and in a
+    frozenset, and how long loading the stopword file takes
+    Args:
+    megabytes (int) : approximate size of the synthetic text
+    stopword_ratio (float) : fraction of the words of the text that are stopwords
+    repeat (int) : number of times the stopword file is loaded
+    """
+    text = "".join(stopword_text(megabytes, stopword_ratio))
+    size = len(text)
+    chunks = [text[start:start + CHUNK_SIZE] for start in range(0, len(text), CHUNK_SIZE)]
+    legacy = legacy_stopwords("stop_words.txt", HashTableLinear())
+    for name, stopwords in (("HashTableLinear", legacy), ("frozenset", stopword_set(legacy))):
+        count = 0
+        start = time.perf_counter()
+        for _ in legacy_tokenize(chunks, stopwords):
+            count += 1
+        elapsed = time.perf_counter() - start
+        print("tokenize stopwords=%s MB=%.1f tokens=%d time=%.2fs MB/s=%.1f tokens/s=%.0f" % (
+            name, size / 2**20, count, elapsed, size / 2**20 / elapsed, count / elapsed))
+    legacy_time = timed(lambda: [legacy_stopwords("stop_words.txt", HashTableLinear())
+                                 for _ in range(repeat)])
+    load_time = timed(lambda: [frozenset(read_stopwords("stop_words.txt"))
+                               for _ in range(repeat)])
+    print("load stopwords legacy=%.3fms frozenset=%.3fms" % (
+        legacy_time / repeat * 1000, load_time / repeat * 1000))
+
+
+def legacy_parse_words(lines, stopwords):
+    """the original SearchEngine.parse_words: lowercases and splits each line, and
+    strips newlines from each word
+    Args:
+    lines (list) : a list of strings
+    stopwords (frozenset) : words to leave out
+    Returns:
+    list : a list of words
+    """
+    return_list = []
+    for i in lines:
+        i = i.lower()
+        i = i.split()
+        for j in i:
+            j = j.replace('\n', '')
+            if j not in stopwords:
+                return_list.append(j)
+    return return_list
+
+
+def bench_analyzer(megabytes=20, stopword_ratio=0.4):
+    """measures analyzer throughput in MB/s against the original parse_words, on text
+    with punctuation attached to some words
+    Args:
+    megabytes (float) : approximate size of the synthetic text
+    stopword_ratio (float) : fraction of the words of the text that are stopwords
+    """
+    lines = stopword_text(megabytes, stopword_ratio, ("", "", "", "", ",", ".", "'s", ";"))
+    text = "".join(lines)
+    chunks = [text[start:start + CHUNK_SIZE] for start in range(0, len(text), CHUNK_SIZE)]
+    megabytes = len(text) / 2**20
+    stopwords = read_stopwords("stop_words.txt")
+    elapsed = timed(legacy_parse_words, lines, frozenset(stopwords))
+    print("analyze legacy parse_words MB=%.1f time=%.2fs MB/s=%.1f" % (
+        megabytes, elapsed, megabytes / elapsed))
+    for punctuation, stem in ((False, False), (True, False), (True, True)):
+        analyzer = Analyzer(stopwords, punctuation, stem)
+        elapsed = timed(analyzer.analyze, text)
+        streamed = timed(lambda: sum(1 for _ in analyzer.tokenize(chunks)))
+        print("analyze analyzer=%s MB=%.1f time=%.2fs MB/s=%.1f streamed MB/s=%.1f" % (
+            analyzer.name, megabytes, elapsed, megabytes / elapsed, megabytes / streamed))
+
+
+BENCHMARKS = {
+    "hashtable": lambda args: bench_hashtable([int(i) for i in args] or
+                                              (10**3, 10**4, 10**5, 10**6, 10**7)),
+    "compact": lambda args: bench_hashtable([int(i) for i in args] or
+                                            (10**3, 10**4, 10**5, 10**6, 10**7),
+                                            HashTableCompact),
+    "hashing": lambda args: bench_hashing([int(i) for i in args] or
+                                          (10**3, 10**4, 10**5, 10**6)),
+    "indexing": lambda args: bench_indexing(*[int(i) for i in args]),
+    "scoring": lambda args: bench_scoring(*[int(i) for i in args]),
+    "boolean": lambda args: bench_boolean(*[int(i) for i in args]),
+    "cache": lambda args: bench_cache(*[int(i) for i in args]),
+    "compression": lambda args: bench_compression(*[int(i) for i in args]),
+    "postingcache": lambda args: bench_posting_cache(*[int(i) for i in args]),
+    "server": lambda args: bench_server(*[int(i) for i in args]),
+    "sharding": lambda args: bench_sharding(*[int(i) for i in args[:4]], *args[4:]),
+    "batch": lambda args: bench_batch(*[int(i) for i in args]),
+    "load": lambda args: bench_load(*[int(i) for i in args]),
+    "analyzer": lambda args: bench_analyzer(*[float(i) for i in args]),
+    "tokenizer": lambda args: bench_tokenizer(*[float(i) for i in args[:2]],
+                                              *[int(i) for i in args[2:]]),
+    "positions": lambda args: bench_positions(*[int(i) for i in args]),
+    "pruning": lambda args: bench_pruning(*[int(i) for i in args[:3]], *args[3:]),
+    "memory": lambda args: bench_table_memory([int(i) for i in args] or
+                                              (10**3, 10**4, 10**5, 10**6)),
+}
+
+
+def main(argv):
+    if not argv or argv[0] not in BENCHMARKS:
+        print("usage: python benchmarks.py {%s} [args...]" % ",".join(sorted(BENCHMARKS)))
+        return 1
+    BENCHMARKS[argv[0]](argv[1:])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,420 @@
+"""
+Boolean queries: AND, OR, NOT, parentheses, phrases and proximity over the
+inverted index.
+
+A query such as
+
+    fox AND (dog OR cat) NOT red
+    "quick brown fox" OR fox NEAR/3 dog
+
+is parsed into a tree of ("and", [...]), ("or", [...]), ("not", operand),
+("phrase", [words]), ("near", k, [word, word]) and ("term", word) nodes.
+Operators must be written in capitals, anything else is a term, and adjacent
+operands are joined with AND. NOT binds tightest, then NEAR/k, then AND, then
+OR. A phrase matches documents containing its words next to each other and in
+order, and a NEAR/k b documents where a and b occur at most k words apart.
+Both are checked against the positions stored by a positional index, so the
+documents are never read again.
+
+The tree evaluates to a sorted list of doc ids. Posting lists are sorted by
+doc id, so an AND intersects its operands smallest first, galloping through
+the longer list: each doc id of the shorter list is looked for with an
+exponential then a binary search starting where the previous one stopped,
+which costs O(m log(n/m)) instead of O(m + n). A conjunction of a rare and a
+common term therefore costs about as much as the rare term's list. Lists of
+similar lengths are intersected with a set instead. AND NOT
+subtracts a list the same way; only a NOT with nothing to subtract from has
+to enumerate every document.
+"""
+import heapq
+import re
+from bisect import bisect_left
+
+from codec import BlockSequence
+from tokenizer import as_analyzer
+
+OPERATORS = ("AND", "OR", "NOT", "(", ")")
+NEAR = re.compile(r"NEAR/(\d+)")
+TOKEN = re.compile(r'"[^"]*"|"|[()]|[^\s()"]+')
+# galloping only pays off when one list is much longer than the other, lists
+# of closer lengths are matched against a set (or dict) of one of them instead
+GALLOP_RATIO = 8
+# most NOTs and parentheses an operand may be nested in, deeper queries are
+# rejected before the recursive parser (and evaluate) run out of stack
+MAX_DEPTH = 64
+
+
+class QuerySyntaxError(ValueError):
+    """raised for queries that can't be parsed, such as unbalanced parentheses"""
+
+
+def is_boolean(query):
+    """tells whether a query uses any operator, phrase or parentheses
+    Args:
+    query (str) : the query
+    Returns:
+    bool : True if the query should be parsed with parse
+    """
+    return any(token in OPERATORS or token.startswith('"') or NEAR.fullmatch(token)
+               for token in split_query(query))
+
+
+def split_query(query):
+    """splits a query into terms, quoted phrases, operators and parentheses"""
+    return TOKEN.findall(query)
+
+
+def parse(query, analyzer=()):
+    """parses a boolean query
+    Terms are analyzed like the documents of the index (see tokenizer.Analyzer), and
+    stopwords are left out: an operator whose operands are all stopwords is left out as
+    well. A term the analyzer splits in several, such as "well-known", matches
+    documents containing all of them.
+    Args:
+    query (str) : the query
+    analyzer (Analyzer) : the analyzer of the index, or the stopwords of a default one
+    Returns:
+    tuple : the root node of the query tree, None if the query has no terms
+    """
+    tokens = split_query(query)
+    parser = Parser(tokens, as_analyzer(analyzer))
+    node = parser.parse_or()
+    if parser.position < len(tokens):
+        raise QuerySyntaxError("unexpected %r in query %r" % (tokens[parser.position], query))
+    return node
+
+
+class Parser:
+    """
+    A recursive descent parser over the tokens of a query.
+    Attributes:
+        tokens (list) : the tokens, see split_query
+        position (int) : index of the next token
+        analyzer (Analyzer) : turns the words of terms and phrases into index terms
+        depth (int) : number of NOTs and parentheses around the next token
+    """
+    def __init__(self, tokens, analyzer):
+        self.tokens = tokens
+        self.position = 0
+        self.analyzer = analyzer
+        self.depth = 0
+
+    def peek(self):
+        """returns the next token, None at the end of the query"""
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def parse_or(self):
+        """or := and ("OR" and)*"""
+        operands = [self.parse_and()]
+        while self.peek() == "OR":
+            self.position += 1
+            operands.append(self.parse_and())
+        return combine("or", operands)
+
+    def parse_and(self):
+        """and := near (["AND"] near)*"""
+        operands = [self.parse_near()]
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.position += 1
+            operands.append(self.parse_near())
+        return combine("and", operands)
+
+    def parse_near(self):
+        """near := not ("NEAR/k" not)*, where both operands of NEAR/k are words"""
+        node = self.parse_not()
+        while self.peek() is not None and NEAR.fullmatch(self.peek()):
+            distance = int(NEAR.fullmatch(self.peek()).group(1))
+            self.position += 1
+            other = self.parse_not()
+            if node is None or other is None:
+                node = other if node is None else node
+            elif node[0] != "term" or other[0] != "term":
+                raise QuerySyntaxError("NEAR/%d can only join two words" % distance)
+            else:
+                node = ("near", distance, [node[1], other[1]])
+        return node
+
+    def parse_not(self):
+        """not := "NOT" not | "(" or ")" | '"' phrase '"' | term"""
+        token = self.peek()
+        if token is None or token in ("AND", "OR", ")", '"') or NEAR.fullmatch(token):
+            raise QuerySyntaxError("expected a term at %r" % (token or "end of query"))
+        self.position += 1
+        if token in ("NOT", "("):
+            return self.parse_nested(token)
+        if token.startswith('"'):
+            words = self.analyzer.analyze(token[1:-1])
+            if len(words) > 1:
+                return ("phrase", words)
+            return ("term", words[0]) if words else None
+        return combine("and", [("term", word) for word in self.analyzer.analyze(token)])
+
+    def parse_nested(self, token):
+        """parses the operand of a NOT, or the query in parentheses after a "(",
+        at most MAX_DEPTH deep"""
+        if self.depth >= MAX_DEPTH:
+            raise QuerySyntaxError("query nested more than %d deep" % MAX_DEPTH)
+        self.depth += 1
+        if token == "NOT":
+            operand = self.parse_not()
+            node = None if operand is None else ("not", operand)
+        else:
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise QuerySyntaxError("missing ) in query")
+            self.position += 1
+        self.depth -= 1
+        return node
+
+
+def combine(operator, operands):
+    """builds an AND or OR node, dropping operands left out as stopwords"""
+    operands = [operand for operand in operands if operand is not None]
+    if not operands:
+        return None
+    if len(operands) == 1:
+        return operands[0]
+    return (operator, operands)
+
+
+def evaluate(index, node):
+    """finds the documents matching a query tree
+    Args:
+    index (InvertedIndex) : the index to search
+    node (tuple) : a query tree, see parse
+    Returns:
+    list : the ids of the matching live documents in ascending order
+    """
+    if node is None:
+        return []
+    doc_norms = index.doc_norms
+    return [doc_id for doc_id in matches(index, node) if doc_norms[doc_id]]
+
+
+def matches(index, node):
+    """the sorted doc ids matching a node, removed documents included"""
+    kind = node[0]
+    if kind == "term":
+        postings = index.postings(node[1])
+        return [] if postings is None else postings.doc_ids
+    if kind == "or":
+        return union([matches(index, operand) for operand in node[1]])
+    if kind == "not":
+        return difference(range(len(index.filenames)), matches(index, node[1]))
+    if kind == "phrase":
+        return positional_matches(index, node[1])
+    if kind == "near":
+        return positional_matches(index, node[2], node[1])
+    included = [matches(index, operand) for operand in node[1] if operand[0] != "not"]
+    excluded = [matches(index, operand[1]) for operand in node[1] if operand[0] == "not"]
+    if not included:
+        included = [range(len(index.filenames))]
+    included.sort(key=len)
+    result = included[0]
+    for doc_ids in included[1:]:
+        if not result:
+            break
+        result = intersect(result, doc_ids)
+    for doc_ids in excluded:
+        if not result:
+            break
+        result = difference(result, doc_ids)
+    return result
+
+
+def positional_matches(index, terms, distance=None):
+    """finds the documents containing a phrase, or two words near each other
+    Args:
+    index (InvertedIndex) : a positional index
+    terms (list) : the words of the phrase, or the two words of a NEAR
+    distance (int) : the most words apart the two words may be, None for a phrase
+    Returns:
+    list : the sorted doc ids of the matching documents, removed documents included
+    """
+    if not index.positional:
+        raise ValueError("phrase and NEAR queries need an index built with positions")
+    lists = [index.postings(term) for term in terms]
+    if None in lists:
+        return []
+    shortest = sorted(lists, key=len)
+    doc_ids = shortest[0].doc_ids
+    for postings in shortest[1:]:
+        doc_ids = intersect(doc_ids, postings.doc_ids)
+    result = []
+    cursors = [0] * len(lists)
+    for doc_id in doc_ids:
+        positions = []
+        for i, postings in enumerate(lists):
+            cursors[i] = gallop(postings.doc_ids, doc_id, cursors[i])
+            positions.append(postings.positions_at(cursors[i]))
+        if (adjacent(positions) if distance is None
+                else within(positions[0], positions[1], distance)):
+            result.append(doc_id)
+    return result
+
+
+def adjacent(positions):
+    """tells whether consecutive words occur one after the other somewhere
+    Args:
+    positions (list) : the positions of each word of a phrase in a document
+    Returns:
+    bool : True if some position p of the first word has p + i among the positions
+        of word i
+    """
+    starts = set(positions[0])
+    for offset, word_positions in enumerate(positions[1:], 1):
+        starts.intersection_update([position - offset for position in word_positions])
+        if not starts:
+            return False
+    return True
+
+
+def within(first, second, distance):
+    """tells whether two sorted position lists have distinct positions close together
+    Args:
+    first (list) : positions of one word
+    second (list) : positions of the other word
+    distance (int) : the most words apart they may be
+    Returns:
+    bool : True if some pair of different positions is at most distance apart
+    """
+    i = j = 0
+    while i < len(first) and j < len(second):
+        gap = first[i] - second[j]
+        if gap and -distance <= gap <= distance:
+            return True
+        if gap < 0:
+            i += 1
+        else:
+            j += 1
+    return False
+
+
+def gallop(doc_ids, target, low):
+    """finds where target is or would be in doc_ids[low:] by exponential search
+    Args:
+    doc_ids (sequence) : sorted doc ids
+    target (int) : the doc id to look for
+    low (int) : position to start from, all doc ids before it are smaller than target
+    Returns:
+    int : the position of the first doc id not smaller than target
+    """
+    if isinstance(doc_ids, BlockSequence):
+        return doc_ids.bisect_left(target, low)
+    step = 1
+    high = low
+    while high < len(doc_ids) and doc_ids[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(doc_ids, target, low, min(high, len(doc_ids)))
+
+
+def intersect(short, long):
+    """the doc ids found in both sorted sequences, galloping through the longer one
+    Args:
+    short (sequence) : sorted doc ids, the shorter list
+    long (sequence) : sorted doc ids
+    Returns:
+    list : the common doc ids in ascending order
+    """
+    if len(long) < len(short) * GALLOP_RATIO:
+        members = set(long)
+        return [doc_id for doc_id in short if doc_id in members]
+    result = []
+    position = 0
+    end = len(long)
+    for doc_id in short:
+        position = gallop(long, doc_id, position)
+        if position == end:
+            break
+        if long[position] == doc_id:
+            result.append(doc_id)
+            position += 1
+    return result
+
+
+def difference(doc_ids, excluded):
+    """the doc ids of a sorted sequence not found in another one
+    Args:
+    doc_ids (sequence) : sorted doc ids
+    excluded (sequence) : sorted doc ids to leave out
+    Returns:
+    list : the remaining doc ids in ascending order
+    """
+    if len(excluded) >= len(doc_ids) * GALLOP_RATIO:
+        result = []
+        position = 0
+        end = len(excluded)
+        for doc_id in doc_ids:
+            position = gallop(excluded, doc_id, position)
+            if position == end or excluded[position] != doc_id:
+                result.append(doc_id)
+        return result
+    excluded = set(excluded)
+    return [doc_id for doc_id in doc_ids if doc_id not in excluded]
+
+
+def union(lists):
+    """the doc ids found in any of the sorted sequences, in ascending order"""
+    result = []
+    last = -1
+    for doc_id in heapq.merge(*lists):
+        if doc_id != last:
+            result.append(doc_id)
+            last = doc_id
+    return result
+
+
+def positive_terms(node):
+    """lists the terms of a query tree that aren't negated
+    Args:
+    node (tuple) : a query tree, see parse
+    Returns:
+    list : the terms, in query order, that the matching documents are ranked by
+    """
+    if node is None or node[0] == "not":
+        return []
+    if node[0] == "term":
+        return [node[1]]
+    if node[0] == "phrase":
+        return list(node[1])
+    if node[0] == "near":
+        return list(node[2])
+    return [term for operand in node[1] for term in positive_terms(operand)]
+
+
+def score_matches(index, doc_ids, terms):
+    """scores the documents matching a boolean query by the terms they contain
+    Args:
+    index (InvertedIndex) : the index, with fresh weights
+    doc_ids (list) : sorted doc ids of the matching documents
+    terms (list) : the terms to score with, see positive_terms
+    Returns:
+    dict : doc id -> relevancy score, for every doc id given
+    """
+    scores = dict.fromkeys(doc_ids, 0.0)
+    for term in terms:
+        postings = index.postings(term)
+        if postings is None:
+            continue
+        term_ids = postings.doc_ids
+        weights = postings.weights
+        scale = postings.scale
+        if len(term_ids) < len(doc_ids) * GALLOP_RATIO:
+            for doc_id, weight in zip(term_ids, weights):
+                if doc_id in scores:
+                    scores[doc_id] += weight * scale
+            continue
+        position = 0
+        end = len(term_ids)
+        for doc_id in doc_ids:
+            position = gallop(term_ids, doc_id, position)
+            if position == end:
+                break
+            if term_ids[position] == doc_id:
+                scores[doc_id] += weights[position] * scale
+    return scores
@@ -0,0 +1,228 @@
+"""
+Variable length integer coding for integer sequences.
+
+A sorted sequence such as the positions of a term in a document is stored
+as the gaps between consecutive values (delta coding), and each gap as a
+varint: seven bits per byte, low bits first, with the high bit set on every
+byte but the last. Small gaps, the common case, take a single byte instead
+of the four an int32 array spends on every value.
+
+Long sequences such as the doc ids and frequencies of a posting list are
+coded in blocks of BLOCK_SIZE values (see BlockSequence), so a reader can
+decode just the block it needs instead of the whole sequence.
+"""
+from array import array
+from bisect import bisect_left
+
+BLOCK_SIZE = 128
+
+
+def encode_deltas(values, out, previous=0):
+    """appends a sorted sequence of non-negative ints, delta and varint coded
+    Args:
+    values (iterable) : the values in ascending order
+    out (array) : an array('B') the bytes are appended to
+    previous (int) : the value the first gap is taken from
+    Returns:
+    int : number of bytes appended
+    """
+    data = bytearray()
+    for value in values:
+        gap = value - previous
+        previous = value
+        while gap > 0x7f:
+            data.append(gap & 0x7f | 0x80)
+            gap >>= 7
+        data.append(gap)
+    out.frombytes(data)
+    return len(data)
+
+
+def decode_deltas(data, start, end, value=0):
+    """decodes a sequence written by encode_deltas
+    Args:
+    data (bytes-like) : the coded bytes
+    start (int) : offset of the first byte of the sequence
+    end (int) : offset just past its last byte
+    value (int) : the value the first gap was taken from
+    Returns:
+    list : the values in ascending order
+    """
+    values = []
+    shift = gap = 0
+    for byte in data[start:end]:
+        gap |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            value += gap
+            values.append(value)
+            gap = shift = 0
+    return values
+
+
+def encode_varints(values, out):
+    """appends a sequence of non-negative ints, varint coded without deltas
+    Args:
+    values (iterable) : the values
+    out (array) : an array('B') the bytes are appended to
+    Returns:
+    int : number of bytes appended
+    """
+    data = bytearray()
+    for value in values:
+        while value > 0x7f:
+            data.append(value & 0x7f | 0x80)
+            value >>= 7
+        data.append(value)
+    out.frombytes(data)
+    return len(data)
+
+
+def decode_varints(data, start, end):
+    """decodes a sequence written by encode_varints
+    Args:
+    data (bytes-like) : the coded bytes
+    start (int) : offset of the first byte of the sequence
+    end (int) : offset just past its last byte
+    Returns:
+    list : the values
+    """
+    values = []
+    shift = value = 0
+    for byte in data[start:end]:
+        if byte < 0x80 and not shift:
+            values.append(byte)
+            continue
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def bisect(values, value, low=0):
+    """bisect.bisect_left over an array or a delta coded BlockSequence
+    Args:
+    values (sequence) : sorted values
+    value (int) : the value to look for
+    low (int) : index to start from
+    Returns:
+    int : the index of the first value not smaller than value
+    """
+    if isinstance(values, BlockSequence):
+        return values.bisect_left(value, low)
+    return bisect_left(values, value, low)
+
+
+class BlockSequence:
+    """
+    A read only sequence of ints stored as varint coded blocks of BLOCK_SIZE
+    values. Indexing decodes the block holding the value and keeps it for the
+    next lookup, and iterating decodes one block at a time, so code written
+    for arrays (zip, bisect, galloping) works on it unchanged. Sorted
+    sequences also have a bisect_left that skips straight to the block a
+    value is in.
+
+    Attributes:
+        data (array) : the coded bytes of every block
+        ends (array) : offset in data just past each block
+        bases (array) : for delta coded sorted values, the last value of the block before
+            each block (its first gaps are taken from it), None for values coded as is
+        count (int) : number of values
+    """
+    __slots__ = ('data', 'ends', 'bases', 'count', 'block', 'values')
+    format = 'i'
+    itemsize = 4
+
+    def __init__(self, data, ends, bases, count):
+        self.data = data
+        self.ends = ends
+        self.bases = bases
+        self.count = count
+        self.block = -1
+        self.values = None
+
+    @classmethod
+    def encode(cls, values, delta):
+        """codes a sequence of non-negative ints into blocks
+        Args:
+        values (sequence) : the values, ascending if delta
+        delta (bool) : code the gaps between values, for sorted sequences
+        Returns:
+        BlockSequence : the coded values
+        """
+        data = array('B')
+        ends = array('i')
+        bases = array('i') if delta else None
+        previous = 0
+        for start in range(0, len(values), BLOCK_SIZE):
+            block = values[start:start + BLOCK_SIZE]
+            if delta:
+                bases.append(previous)
+                encode_deltas(block, data, previous)
+                previous = block[-1]
+            else:
+                encode_varints(block, data)
+            ends.append(len(data))
+        return cls(data, ends, bases, len(values))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("BlockSequence index out of range")
+        block, offset = divmod(index, BLOCK_SIZE)
+        if block != self.block:
+            self.values = self.decode(block)
+            self.block = block
+        return self.values[offset]
+
+    def __iter__(self):
+        for block in range(len(self.ends)):
+            yield from self.decode(block)
+
+    def __repr__(self):
+        return "BlockSequence(%s)" % list(self)
+
+    def decode(self, block):
+        """decodes one block
+        Args:
+        block (int) : the block number
+        Returns:
+        list : the values of the block
+        """
+        start = self.ends[block - 1] if block else 0
+        if self.bases is None:
+            return decode_varints(self.data, start, self.ends[block])
+        return decode_deltas(self.data, start, self.ends[block], self.bases[block])
+
+    def bisect_left(self, value, low=0):
+        """finds where a value is or would be in a delta coded sequence, like
+        bisect.bisect_left, decoding only the block it falls in
+        Args:
+        value (int) : the value to look for
+        low (int) : index to start from, all values before it are smaller
+        Returns:
+        int : the index of the first value not smaller than value
+        """
+        if low >= self.count:
+            return self.count
+        # the block whose preceding value is the last one smaller than value
+        block = max(bisect_left(self.bases, value) - 1, low // BLOCK_SIZE)
+        if block != self.block:
+            self.values = self.decode(block)
+            self.block = block
+        start = block * BLOCK_SIZE
+        return start + bisect_left(self.values, value, max(low - start, 0))
+
+    @property
+    def nbytes(self):
+        """bytes taken by the coded blocks and their offsets"""
+        size = len(self.data) + 4 * len(self.ends)
+        return size if self.bases is None else size + 4 * len(self.bases)
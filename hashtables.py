@@ -2,10 +2,35 @@
 Module implements three types of hashtables and collisions: Seperate chaining,
 and quadratic and linear probing.
 
-All 3 are implemented as different classes.
+All 3 are implemented as different classes. HashTableCompact is a linear
+probing table that keeps its entries in parallel arrays instead of Nodes.
+
+Every table hashes a key once with its hash_func (the built-in hash by
+default), stores that value next to the entry and reuses it when probing and
+resizing.
 """
+from array import array
+
 from linked_list import Node
 
+# Marks a slot whose Node was removed from an open addressing table, so
+# lookups keep probing past it instead of stopping early.
+DELETED = Node()
+
+
+def polynomial_hash(string):
+    """
+    The original per-character string hash, kept so tables can be compared
+    against it. Much slower than the built-in hash since it loops in Python.
+    :param string: String put into function
+    :return: hash(int): 63 bit hash value of said String, non-negative so it fits the
+        signed hash arrays of HashTableCompact
+    """
+    hash = 0
+    for c in string:
+        hash = (hash * 31 + ord(c)) & 0x7FFFFFFFFFFFFFFF
+    return hash
+
 class HashTableSepchain:
     """
     Implementation of Hash Table using Seperate chaining
@@ -14,17 +39,20 @@ class HashTableSepchain:
         self.hash_table(list): List of nodes containing key data and next values
         num_items(int): number of key/data pairs in the hash table.
         num_collisions(int): number of collisions that have occurred
-        size(int): size of the hash_table (including null values)
+        table_size(int): size of the hash_table (including null values)
+        hash_func(function): hashes a key to an int
     """
-    def __init__(self, table_size=11):
+    def __init__(self, table_size=11, hash_func=hash):
         """
         Initiates object
         :param table_size: initial size of table
+        :param hash_func: function hashing a key, the built-in hash by default
         """
         self.hash_table = [None] * table_size
         self.num_items = 0
         self.num_collisions = 0
-        self.num_items = table_size
+        self.table_size = table_size
+        self.hash_func = hash_func
 
     def __eq__(self, other):
         """
@@ -49,44 +77,66 @@ class HashTableSepchain:
 
     def hash_string(self, string):
         """
-        Takes a string and returns its hash value
+        Takes a string and returns the index of its chain
         :param string(String): String put into function
-        :return: hash(int): Hash value of the string
+        :return: hash(int): Hash value of the string reduced to the table size
+        """
+        return self.hash_func(string) % self.table_size
+
+    def find_node(self, key, hash_value):
+        """
+        Walks the chain a key hashes to
+        :param key(String): key the function looks for
+        :param hash_value(int): hash of the key
+        :return: Node holding the key, or None if it is not in the table
         """
-        hash_int = 0
-        for letter in string:
-            hash_int = (hash_int * 31 + ord(letter)) % self.num_items
-        return hash_int
+        node = self.hash_table[hash_value % self.table_size]
+        while node is not None:
+            if node.hash_value == hash_value and node.key == key:
+                return node
+            node = node.next
+        return None
 
     def put(self, key, data):
         """
-        Puts a new key/data Node into the table
+        Puts a new key/data Node into the table, or replaces the data of the
+        Node already stored under key
         :param key: the key
         :param data: the data value
         :return: None
         """
+        hash_value = self.hash_func(key)
+        node = self.find_node(key, hash_value)
+        if node is not None:
+            node.data = data
+            return
+        index = hash_value % self.table_size
+        if self.hash_table[index] is not None:
+            self.num_collisions += 1
+        node = Node(key, data, hash_value)
+        node.next = self.hash_table[index]
+        self.hash_table[index] = node
         self.num_items += 1
-        if self.num_items/self.num_items > 1.5:
+        if self.load_factor() > 1.5:
             new_hash = self.resize()
             self.hash_table = new_hash.hash_table
-            self.num_items = new_hash.size
-        index = self.hash_string(key)
-        if self.hash_table[index] is None:
-            self.hash_table[index] = Node(key, data)
-        else:
-            self.hash_table[index].next = Node(key, data)
-            self.num_collisions += 1
+            self.table_size = new_hash.table_size
 
     def resize(self):
         """
-        Creates a new table with twice the size of the old one, and fills it up
-        with the old tables values, sets hash table to the new table
-        :return:
-        """
-        new_hash = HashTableSepchain(self.num_items*2 + 1)
-        for i in self.hash_table:
-            if i is not None:
-                new_hash.put(i.key, i.data)
+        Creates a new table with twice the size of the old one, and relinks the
+        old tables Nodes into it using their cached hashes
+        :return: the new table
+        """
+        new_hash = HashTableSepchain(self.table_size*2 + 1, self.hash_func)
+        for node in self.hash_table:
+            while node is not None:
+                following = node.next
+                index = node.hash_value % new_hash.table_size
+                node.next = new_hash.hash_table[index]
+                new_hash.hash_table[index] = node
+                new_hash.num_items += 1
+                node = following
         return new_hash
 
     def get(self, key):
@@ -95,11 +145,10 @@ class HashTableSepchain:
         :param key(String): key
         :return: data value (String)
         """
-        for i in self.hash_table:
-            if i is not None:
-                if i.key == key:
-                    return i.data
-        raise LookupError
+        node = self.find_node(key, self.hash_func(key))
+        if node is None:
+            raise LookupError
+        return node.data
 
     def contains(self, key):
         """
@@ -107,11 +156,7 @@ class HashTableSepchain:
         :param key(String): key the function looks for
         :return: True if key is found, False if not.
         """
-        found = False
-        for i in self.hash_table:
-            if i.key == key:
-                found = True
-        return found
+        return self.find_node(key, self.hash_func(key)) is not None
 
     def remove(self, key):
         """
@@ -119,14 +164,22 @@ class HashTableSepchain:
         :param key: (String) key the function searches for
         :return: key/data pair that the function removed.
         """
-        if not self.contains(key):
-            raise LookupError
-        else:
-            for i in range(len(self.hash_table)):
-                if self.hash_table[i] is not None:
-                    if self.hash_table[i].key == key:
-                        self.num_items -= 1
-                        return self.hash_table.pop(i)
+        hash_value = self.hash_func(key)
+        index = hash_value % self.table_size
+        previous = None
+        node = self.hash_table[index]
+        while node is not None:
+            if node.hash_value == hash_value and node.key == key:
+                if previous is None:
+                    self.hash_table[index] = node.next
+                else:
+                    previous.next = node.next
+                node.next = None
+                self.num_items -= 1
+                return node
+            previous = node
+            node = node.next
+        raise LookupError
 
     def size(self):
         """
@@ -140,7 +193,7 @@ class HashTableSepchain:
         Returns load factor.
         :return: load_factor(int)
         """
-        return self.num_items/self.num_items()
+        return self.num_items/self.table_size
 
     def collisions(self):
         """
@@ -186,17 +239,22 @@ class HashTableQuadratic:
         self.hash_table(list): List of nodes containing key data and next values
         num_items(int): number of key/data pairs in the hash table.
         num_collisions(int): number of collisions that have occurred
-        size(int): size of the hash_table (including null values)
+        num_deleted(int): number of tombstoned slots left behind by remove()
+        table_size(int): size of the hash_table (including null values)
+        hash_func(function): hashes a key to an int
     """
-    def __init__(self, table_size=11):
+    def __init__(self, table_size=11, hash_func=hash):
         """
         Initializes object
         :param table_size:
+        :param hash_func: function hashing a key, the built-in hash by default
         """
         self.hash_table = [None] * table_size
         self.num_items = 0
+        self.num_deleted = 0
         self.num_collisions = 0
-        self.num_items = table_size
+        self.table_size = table_size
+        self.hash_func = hash_func
 
     def __eq__(self, other):
         """
@@ -220,49 +278,102 @@ class HashTableQuadratic:
 
     def hash_string(self, string):
         """
-        takes a string and returns its hash value.
+        takes a string and returns the index it starts probing from.
         :param string: the string mentioned
-        :return: hash(int): the hash value of said string.
+        :return: hash(int): the hash value of said string reduced to the table size.
         """
-        hash = 0
-        for c in string:
-            hash = (hash * 31 + ord(c)) % self.num_items
-        return hash
+        return self.hash_func(string) % self.table_size
+
+    def find_slot(self, key, hash_value):
+        """
+        Walks the quadratic probe sequence of a key
+        :param key(String): key the function looks for
+        :param hash_value(int): hash of the key
+        :return: index(int): slot holding the key, or None if it is not in the table
+        """
+        index = hash_value % self.table_size
+        for count in range(1, self.table_size + 1):
+            slot = self.hash_table[index]
+            if slot is None:
+                return None
+            if slot is not DELETED and slot.hash_value == hash_value and slot.key == key:
+                return index
+            index = (index + count**2) % self.table_size
+        return None
+
+    def insert_node(self, node):
+        """
+        Places a Node in the first free slot of its probe sequence without
+        rehashing its key
+        :param node: Node with a cached hash_value
+        :return: True if a free slot was found, False if the probe sequence is full
+        """
+        index = node.hash_value % self.table_size
+        for count in range(1, self.table_size + 1):
+            if self.hash_table[index] is None:
+                if count > 1:
+                    self.num_collisions += 1
+                self.hash_table[index] = node
+                self.num_items += 1
+                return True
+            index = (index + count**2) % self.table_size
+        return False
 
     def put(self, key, data):
         """
-                Puts a new key/data Node into the table
+                Puts a new key/data Node into the table, or replaces the data
+                of the Node already stored under key
                 :param key: the key
                 :param data: the data value
                 :return: None
         """
-        self.num_items += 1
-        if self.load_factor() > .75:
+        hash_value = self.hash_func(key)
+        index = self.find_slot(key, hash_value)
+        if index is not None:
+            self.hash_table[index].data = data
+            return
+        node = Node(key, data, hash_value)
+        index = hash_value % self.table_size
+        for count in range(1, self.table_size + 1):
+            if self.hash_table[index] is DELETED:
+                self.hash_table[index] = node
+                self.num_items += 1
+                self.num_deleted -= 1
+                break
+            if self.hash_table[index] is None:
+                self.hash_table[index] = node
+                self.num_items += 1
+                break
+            index = (index + count**2) % self.table_size
+        else:
+            # the probe sequence never reached a free slot, grow and try again
             new_hash = self.resize()
             self.hash_table = new_hash.hash_table
-            self.num_items = new_hash.size
-        index = self.hash_string(key)
-        if self.hash_table[index] is None:
-            self.hash_table[index] = {key: data}
-        else:
-            count = 1
-            while self.hash_table[index] % self.num_items is not None:
-                index = (index + count**2) % self.num_items
-                count += 1
-            self.hash_table[index] = {key: data}
+            self.table_size = new_hash.table_size
+            self.num_deleted = 0
+            self.put(key, data)
+            return
+        if index != hash_value % self.table_size:
             self.num_collisions += 1
+        if (self.num_items + self.num_deleted) / self.table_size > .5:
+            new_hash = self.resize()
+            self.hash_table = new_hash.hash_table
+            self.table_size = new_hash.table_size
+            self.num_deleted = 0
 
     def resize(self):
         """
         Creates a new table with twice the size of the old one, and fills it up
-        with the old tables values, sets hash table to the new table
-        :return:
+        with the old tables Nodes using their cached hashes
+        :return: the new table
         """
-        new_hash = HashTableSepchain(self.num_items*2 + 1)
-        for i in self.hash_table:
-            if i is not None:
-                new_hash.put(i.key, i.data)
-        return new_hash
+        size = self.table_size*2 + 1
+        while True:
+            new_hash = HashTableQuadratic(size, self.hash_func)
+            if all(new_hash.insert_node(i) for i in self.hash_table
+                   if i is not None and i is not DELETED):
+                return new_hash
+            size = size*2 + 1
 
     def get(self, key):
         """
@@ -270,11 +381,10 @@ class HashTableQuadratic:
         :param key(String): key
         :return: data value (String)
         """
-        for i in self.hash_table:
-            if i is not None:
-                if i.key == key:
-                    return i.data
-        raise LookupError
+        index = self.find_slot(key, self.hash_func(key))
+        if index is None:
+            raise LookupError
+        return self.hash_table[index].data
 
     def contains(self, key):
         """
@@ -282,11 +392,7 @@ class HashTableQuadratic:
         :param key(String): key the function looks for
         :return: True if key is found, False if not.
         """
-        found = False
-        for i in self.hash_table:
-            if i.key == key:
-                found = True
-        return found
+        return self.find_slot(key, self.hash_func(key)) is not None
 
     def remove(self, key):
         """
@@ -294,14 +400,14 @@ class HashTableQuadratic:
         :param key: (String) key the function searches for
         :return: key/data pair that the function removed.
         """
-        if not self.contains(key):
+        index = self.find_slot(key, self.hash_func(key))
+        if index is None:
             raise LookupError
-        else:
-            for i in range(len(self.hash_table)):
-                if self.hash_table[i] is not None:
-                    if self.hash_table[i].key == key:
-                        self.num_items -= 1
-                        return self.hash_table.pop(i)
+        node = self.hash_table[index]
+        self.hash_table[index] = DELETED
+        self.num_items -= 1
+        self.num_deleted += 1
+        return node
 
     def size(self):
         """
@@ -315,7 +421,7 @@ class HashTableQuadratic:
         Returns load factor.
         :return: load_factor(int)
         """
-        return self.num_items/self.num_items()
+        return self.num_items/self.table_size
 
     def collisions(self):
         """
@@ -355,23 +461,28 @@ class HashTableQuadratic:
 
 class HashTableLinear:
     """
-    Implementation of Hash Table using Seperate chaining
+    Implementation of Hash Table using Linear probing
 
     Attributes:
         self.hash_table(list): List of nodes containing key data and next values
         num_items(int): number of key/data pairs in the hash table.
+        num_deleted(int): number of tombstoned slots left behind by remove()
         num_collisions(int): number of collisions that have occurred
-        size(int): size of the hash_table (including null values)
+        table_size(int): size of the hash_table (including null values)
+        hash_func(function): hashes a key to an int
     """
-    def __init__(self, table_size=2):
+    def __init__(self, table_size=2, hash_func=hash):
         """
         initializes object
-        :param table_size: default table size is 11
+        :param table_size: default table size is 2
+        :param hash_func: function hashing a key, the built-in hash by default
         """
         self.hash_table = [None] * table_size
         self.num_items = 0
+        self.num_deleted = 0
         self.num_collisions = 0
         self.table_size = table_size
+        self.hash_func = hash_func
 
     def __eq__(self, other):
         """
@@ -400,59 +511,99 @@ class HashTableLinear:
 
     def hash_string(self, string):
         """
-        Takes a String and finds its hash value
+        Takes a String and finds the index it starts probing from
         :param string: String put into function
-        :return: hash(int): hash value of said String
+        :return: hash(int): hash value of said String reduced to the table size
         """
-        hash = 0
-        for c in string:
-            hash = (hash * 31 + ord(c)) % self.num_items
-        return hash
+        return self.hash_func(string) % self.table_size
+
+    def find_slot(self, key, hash_value):
+        """
+        Walks the probe sequence of a key starting at its home slot.
+        :param key(String): key the function looks for
+        :param hash_value(int): hash of the key
+        :return: index(int): slot holding the key, or None if it is not in the table
+        """
+        index = hash_value % self.table_size
+        for _ in range(self.table_size):
+            slot = self.hash_table[index]
+            if slot is None:
+                return None
+            if slot is not DELETED and slot.hash_value == hash_value and slot.key == key:
+                return index
+            index = (index + 1) % self.table_size
+        return None
+
+    def insert_node(self, node):
+        """
+        Places a Node in the first empty slot of its probe sequence without
+        rehashing its key
+        :param node: Node with a cached hash_value
+        :return: None
+        """
+        index = node.hash_value % self.table_size
+        if self.hash_table[index] is not None:
+            self.num_collisions += 1
+            while self.hash_table[index] is not None:
+                index = (index + 1) % self.table_size
+        self.hash_table[index] = node
+        self.num_items += 1
 
     def put(self, key, data):
         """
-                Puts a new key/data Node into the table
+                Puts a new key/data Node into the table, or replaces the data
+                of the Node already stored under key.
                 :param key: the key
                 :param data: the data value
                 :return: None
         """
+        hash_value = self.hash_func(key)
+        home = hash_value % self.table_size
+        index = home
+        free = None
+        while self.hash_table[index] is not None:
+            slot = self.hash_table[index]
+            if slot is DELETED:
+                if free is None:
+                    free = index
+            elif slot.hash_value == hash_value and slot.key == key:
+                slot.data = data
+                return
+            index = (index + 1) % self.table_size
+        if free is not None:
+            index = free
+            self.num_deleted -= 1
+        if index != home:
+            self.num_collisions += 1
+        self.hash_table[index] = Node(key, data, hash_value)
         self.num_items += 1
-        if self.load_factor() > .75:
+        if (self.num_items + self.num_deleted) / self.table_size > .75:
             new_hash = self.resize()
             self.hash_table = new_hash.hash_table
             self.table_size = new_hash.table_size
-        index = self.hash_string(key)
-        if self.hash_table[index] is None:
-            self.hash_table[index] = Node(key, data)
-        else:
-            count = 1
-            while self.hash_table[index] is not None:
-                index = (index + 1) % self.num_items
-                count += 1
-            self.hash_table[index] = Node(key, data)
-            self.num_collisions += 1
+            self.num_deleted = 0
 
     def resize(self):
         """
         Creates a new table with twice the size of the old one, and fills it up
-        with the old tables values, sets hash table to the new table
-        :return:
+        with the old tables Nodes using their cached hashes
+        :return: the new table
         """
-        new_hash = HashTableLinear(self.num_items*2 + 1)
+        new_hash = HashTableLinear(self.table_size*2 + 1, self.hash_func)
         for i in self.hash_table:
-            if i is not None:
-                new_hash.put(i.key, i.data)
+            if i is not None and i is not DELETED:
+                new_hash.insert_node(i)
         return new_hash
 
     def get(self, key):
         """
         Finds the data value of a Node given its key
         :param key(String): key
-        :return: data value (String)
+        :return: data value (String), None if the key is not in the table
         """
-        for i in self.hash_table:
-            if i and i.key == key:
-                return i.data
+        index = self.find_slot(key, self.hash_func(key))
+        if index is not None:
+            return self.hash_table[index].data
 
 
     def contains(self, key):
@@ -461,27 +612,24 @@ class HashTableLinear:
         :param key(String): key the function looks for
         :return: True if key is found, False if not.
         """
-        found = False
-        for i in self.hash_table:
-            if i:
-                if i.key == key:
-                    found = True
-        return found
+        return self.find_slot(key, self.hash_func(key)) is not None
 
     def remove(self, key):
         """
-        Removes a key/data pair from the table given its key
+        Removes a key/data pair from the table given its key. The slot is
+        tombstoned rather than emptied so later keys in the same probe
+        sequence stay reachable.
         :param key: (String) key the function searches for
         :return: key/data pair that the function removed.
         """
-        if not self.contains(key):
+        index = self.find_slot(key, self.hash_func(key))
+        if index is None:
             raise LookupError
-        else:
-            for i in range(len(self.hash_table)):
-                if self.hash_table[i] is not None:
-                    if self.hash_table[i].key == key:
-                        self.num_items -= 1
-                        return self.hash_table.pop(i)
+        node = self.hash_table[index]
+        self.hash_table[index] = DELETED
+        self.num_items -= 1
+        self.num_deleted += 1
+        return node
 
     def size(self):
         """
@@ -521,13 +669,7 @@ class HashTableLinear:
         :param data:
         :return:
         """
-        for i in self.hash_table:
-            if i and i.key == key:
-                ind = self.hash_table.index(i)
-        if ind is not None and self.hash_table[ind]:
-            self.hash_table[ind].data = data
-        else:
-            raise ValueError
+        self.put(key, data)
 
     def __contains__(self, key):
         """
@@ -542,8 +684,264 @@ class HashTableLinear:
     def key_list(self):
         key_list = []
         for i in self.hash_table:
-            if i:
+            if i is not None and i is not DELETED:
                 key_list.append(i.data)
         return key_list
 
+    def items(self):
+        """
+        Iterates over the stored key/data pairs
+        :return: generator of (key, data) tuples
+        """
+        for i in self.hash_table:
+            if i is not None and i is not DELETED:
+                yield i.key, i.data
+
+    def __reduce__(self):
+        """
+        Pickles the table as its items, see rebuild_table
+        """
+        return rebuild_table, (HashTableLinear, {'hash_func': self.hash_func},
+                               list(self.items()))
+
+
+EMPTY = -1
+DUMMY = -2
+
+
+class HashTableCompact:
+    """
+    Implementation of Hash Table using Linear probing over compact arrays.
+
+    Entries are appended to parallel hashes/keys/values arrays in insertion
+    order and the probe table only stores the position of an entry in those
+    arrays, so there is no Node object per entry and resizing just rebuilds
+    the small index array from the cached hashes.
+
+    Attributes:
+        indices(array): probe table of entry positions, EMPTY or DUMMY
+        hashes(array): cached hash of each entry's key
+        keys(list): key of each entry, DELETED once removed
+        values(list or array): data of each entry, an array when typecode is given
+        num_items(int): number of key/data pairs in the hash table.
+        num_collisions(int): number of collisions that have occurred
+        table_size(int): size of the probe table, always a power of two
+        hash_func(function): hashes a key to an int
+    """
+    def __init__(self, table_size=8, typecode=None, hash_func=hash):
+        """
+        initializes object
+        :param table_size: initial size of the probe table, rounded up to a power of two
+        :param typecode: array typecode for the values (e.g. 'i'), None to store any object
+        :param hash_func: function hashing a key, the built-in hash by default
+        """
+        self.hash_func = hash_func
+        size = 8
+        while size < table_size:
+            size *= 2
+        self.table_size = size
+        self.indices = array('i', [EMPTY]) * size
+        self.hashes = array('q')
+        self.keys = []
+        self.typecode = typecode
+        self.values = [] if typecode is None else array(typecode)
+        self.num_items = 0
+        self.num_collisions = 0
+
+    def __repr__(self):
+        """
+        Creates a string representation of the hash table
+        :return: str(String): see above
+        """
+        return "HashTableCompact(%s)" % list(self.items())
+
+    def __len__(self):
+        return self.num_items
+
+    def find_slot(self, key, hash_value):
+        """
+        Walks the probe sequence of a key.
+        :param key: key the function looks for
+        :param hash_value: hash of the key
+        :return: index(int): slot in indices holding the key, or None
+        """
+        mask = self.table_size - 1
+        index = hash_value & mask
+        while True:
+            entry = self.indices[index]
+            if entry == EMPTY:
+                return None
+            if entry >= 0 and self.hashes[entry] == hash_value:
+                found = self.keys[entry]
+                if found is key or found == key:
+                    return index
+            index = (index + 1) & mask
 
+    def put(self, key, data):
+        """
+        Puts a new key/data entry into the table, or replaces the data of the
+        entry already stored under key.
+        :param key: the key
+        :param data: the data value
+        :return: None
+        """
+        hash_value = self.hash_func(key)
+        mask = self.table_size - 1
+        index = hash_value & mask
+        free = None
+        while True:
+            entry = self.indices[index]
+            if entry == EMPTY:
+                break
+            if entry == DUMMY:
+                if free is None:
+                    free = index
+            elif self.hashes[entry] == hash_value:
+                found = self.keys[entry]
+                if found is key or found == key:
+                    self.values[entry] = data
+                    return
+            index = (index + 1) & mask
+        if free is not None:
+            index = free
+        if index != hash_value & mask:
+            self.num_collisions += 1
+        self.indices[index] = len(self.keys)
+        self.hashes.append(hash_value)
+        self.keys.append(key)
+        self.values.append(data)
+        self.num_items += 1
+        if len(self.keys) * 3 >= self.table_size * 2:
+            self.resize()
+
+    def resize(self):
+        """
+        Drops removed entries from the arrays and rebuilds the probe table,
+        doubling it when the table is more than half full. Uses the cached
+        hashes, so no key is hashed again.
+        :return: None
+        """
+        if self.num_items != len(self.keys):
+            live = [i for i in range(len(self.keys)) if self.keys[i] is not DELETED]
+            self.hashes = array('q', [self.hashes[i] for i in live])
+            self.keys = [self.keys[i] for i in live]
+            if self.typecode is None:
+                self.values = [self.values[i] for i in live]
+            else:
+                self.values = array(self.typecode, [self.values[i] for i in live])
+        size = self.table_size
+        while self.num_items * 2 >= size:
+            size *= 2
+        mask = size - 1
+        indices = array('i', [EMPTY]) * size
+        for entry, hash_value in enumerate(self.hashes):
+            index = hash_value & mask
+            while indices[index] != EMPTY:
+                index = (index + 1) & mask
+            indices[index] = entry
+        self.indices = indices
+        self.table_size = size
+
+    def get(self, key, default=None):
+        """
+        Finds the data value of an entry given its key
+        :param key(String): key
+        :param default: returned when the key is not in the table
+        :return: data value, default if the key is not in the table
+        """
+        index = self.find_slot(key, self.hash_func(key))
+        if index is not None:
+            return self.values[self.indices[index]]
+        return default
+
+    def contains(self, key):
+        """
+        Tests to see if a table has an entry with a certain key in it
+        :param key(String): key the function looks for
+        :return: True if key is found, False if not.
+        """
+        return self.find_slot(key, self.hash_func(key)) is not None
+
+    def remove(self, key):
+        """
+        Removes a key/data pair from the table given its key
+        :param key: (String) key the function searches for
+        :return: data value of the removed entry
+        """
+        index = self.find_slot(key, self.hash_func(key))
+        if index is None:
+            raise LookupError
+        entry = self.indices[index]
+        self.indices[index] = DUMMY
+        self.keys[entry] = DELETED
+        self.num_items -= 1
+        return self.values[entry]
+
+    def items(self):
+        """
+        Iterates over the stored key/data pairs in insertion order
+        :return: generator of (key, data) tuples
+        """
+        for key, data in zip(self.keys, self.values):
+            if key is not DELETED:
+                yield key, data
+
+    def size(self):
+        """
+        Returns the number of items that the hash table has stored.
+        :return:  num_items(int): see above.
+        """
+        return self.num_items
+
+    def load_factor(self):
+        """
+        Returns load factor.
+        :return: load_factor(float)
+        """
+        return self.num_items/self.table_size
+
+    def collisions(self):
+        """
+        Returns number of collisions that the hash table has
+        experienced.
+        :return:  num_collisions(int)
+        """
+        return self.num_collisions
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __setitem__(self, key, data):
+        self.put(key, data)
+
+    def __contains__(self, key):
+        return self.contains(key)
+
+    def __iter__(self):
+        for key in self.keys:
+            if key is not DELETED:
+                yield key
+
+    def __reduce__(self):
+        """
+        Pickles the table as its items, see rebuild_table
+        """
+        return rebuild_table, (HashTableCompact, {'typecode': self.typecode,
+                                                  'hash_func': self.hash_func},
+                               list(self.items()))
+
+
+def rebuild_table(table, options, items):
+    """
+    Unpickles a table. The built-in hash of a str is salted differently in
+    every process, so cached hashes can't be sent to another process and the
+    keys are put into a fresh table instead.
+    :param table: the hash table class
+    :param options: keyword arguments for the class
+    :param items: list of (key, data) pairs
+    :return: the new table
+    """
+    hash_table = table(**options)
+    for key, data in items:
+        hash_table.put(key, data)
+    return hash_table
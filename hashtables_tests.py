@@ -42,6 +42,78 @@ class TestList(unittest.TestCase):
         self.assertEqual(hash.hash_table[hash.hash_string("please")].key, "please")
         self.assertEqual(hash.num_items, length)
 
+    def test_linear_lookup(self):
+        hash = HashTableLinear()
+        for i in range(100):
+            hash.put("word%d" % i, i)
+        self.assertEqual(hash.num_items, 100)
+        self.assertEqual(hash.get("word42"), 42)
+        self.assertIsNone(hash.get("missing"))
+        hash["word42"] = 0
+        self.assertEqual(hash["word42"], 0)
+        self.assertEqual(hash.num_items, 100)
+        self.assertTrue("word99" in hash)
+        self.assertFalse("word100" in hash)
+
+    def test_linear_remove(self):
+        hash = HashTableLinear()
+        for i in range(50):
+            hash.put("word%d" % i, i)
+        for i in range(0, 50, 2):
+            self.assertEqual(hash.remove("word%d" % i).data, i)
+        self.assertEqual(hash.num_items, 25)
+        for i in range(50):
+            self.assertEqual("word%d" % i in hash, i % 2 == 1)
+        self.assertRaises(LookupError, hash.remove, "word0")
+        hash.put("word0", 7)
+        self.assertEqual(hash.get("word0"), 7)
+
+    def test_compact(self):
+        hash = HashTableCompact(typecode='i')
+        for i in range(1000):
+            hash.put("word%d" % i, i)
+        self.assertEqual(len(hash), 1000)
+        self.assertEqual(hash.get("word500"), 500)
+        self.assertIsNone(hash.get("missing"))
+        self.assertEqual(hash.get("missing", 0), 0)
+        hash["word500"] += 1
+        self.assertEqual(hash["word500"], 501)
+        for i in range(0, 1000, 3):
+            self.assertEqual(hash.remove("word%d" % i), i)
+        for i in range(1000):
+            self.assertEqual("word%d" % i in hash, i % 3 != 0)
+        for i in range(1000, 2000):
+            hash.put("word%d" % i, i)
+        self.assertEqual(len(list(hash.items())), len(hash))
+        self.assertEqual(hash.get("word1999"), 1999)
+        self.assertFalse("word3" in hash)
+
+    def test_cached_hashes(self):
+        for table in (HashTableSepchain, HashTableQuadratic, HashTableLinear):
+            for hash_func in (hash, polynomial_hash):
+                hash_table = table(hash_func=hash_func)
+                for i in range(500):
+                    hash_table.put("word%d" % i, i)
+                self.assertEqual(hash_table.num_items, 500)
+                for i in range(500):
+                    self.assertEqual(hash_table.get("word%d" % i), i)
+                    node = hash_table.remove("word%d" % i) if i % 2 else None
+                    if node is not None:
+                        self.assertEqual(node.hash_value, hash_func("word%d" % i))
+                for i in range(500):
+                    self.assertEqual("word%d" % i in hash_table, i % 2 == 0)
+                self.assertEqual(hash_table.num_items, 250)
+
+    def test_long_keys(self):
+        keys = ["ZggPXApoYIcFQfUiJwhw"] + ["long key number %d " % i * 5 for i in range(300)]
+        for table in (HashTableCompact, HashTableLinear):
+            hash_table = table(hash_func=polynomial_hash)
+            for i, key in enumerate(keys):
+                hash_table.put(key, i)
+            for i, key in enumerate(keys):
+                self.assertEqual(hash_table.get(key), i)
+        self.assertLess(polynomial_hash(keys[0]), 2 ** 63)
+
 
 
 if __name__ == '__main__':
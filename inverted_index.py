@@ -0,0 +1,874 @@
+"""
+Inverted index used by the SearchEngine.
+
+Each term maps to a PostingList holding the ids of the documents it occurs
+in, its frequency in each of them and the weight each of those postings
+adds to a document's score, stored in typed arrays and sorted by document
+id. Documents are numbered in the order they are added, so adding a
+document only ever appends to the end of a posting list.
+
+Weights are computed by the index's weighting scheme (see weighting.py) as
+documents are added. Schemes that depend on statistics of the whole corpus,
+or an index that quantizes its weights to one byte each, instead mark the
+weights stale and refresh_weights recomputes them before the next query.
+
+Removing a document only marks its id as deleted (its filename becomes None)
+and scoring skips it; its postings are dropped, and the remaining documents
+renumbered, the next time the index is saved. A changed document is removed
+and added again under a new id.
+
+A positional index also keeps where in each document a term occurs, for
+phrase and proximity queries. The positions of a posting are counted in
+indexed words (stopwords are not counted), delta and varint coded (see
+codec.py) and appended to one byte array per term, with the offset each
+posting's positions end at kept alongside.
+
+A compressed index saves the doc ids and frequencies of its posting lists
+as varint coded blocks (codec.BlockSequence), doc ids as gaps, instead of
+int32 arrays. Loaded from the file they stay coded in the page cache and
+are decoded a block at a time as queries read them, unless a PostingCache
+(see posting_cache.py) keeps the popular ones decoded.
+
+An index can be saved to a single binary file and opened again with
+InvertedIndex.load, which memory maps the file so the posting arrays are
+read straight from the page cache and shared by every process opening it.
+
+File layout (native byte order, all offsets in bytes from the start):
+    header      MAGIC, then struct HEADER: byte order tag, num_docs, num_terms, the
+                offsets of the docs, lengths, terms, postings, weights, ends
+                and positions sections, the weighting scheme name, whether
+                weights are quantized, whether positions are stored, whether
+                postings are compressed and the name of the analyzer the
+                documents were split into terms with
+    docs        per document: u32 byte length + utf-8 filename, then struct
+                DOC_INFO: mtime, size and sha1 digest of the file
+    lengths     int32 doc_lengths array
+    terms       per term: u32 byte length + utf-8 term, then struct TERM_ENTRY:
+                offset of its postings, number of postings, offset of its
+                weights, the scale its weights are multiplied by, its
+                largest scaled weight and the offsets of its ends and
+                positions
+    postings    per term: int32 doc_ids followed by int32 freqs, or when compressed
+                int32 block ends and bases of the doc ids, int32 block ends
+                of the freqs, the coded doc ids and the coded freqs, padded
+                to 4 bytes
+    weights     per term: float32 weights, or uint8 codes when quantized
+    ends        per term: int32 end offset of each posting's positions, empty
+                unless positional
+    positions   per term: the coded positions of its postings
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import count
+
+import codec
+from codec import BLOCK_SIZE, BlockSequence
+from hashtables import HashTableCompact
+from weighting import get_weighting, quantize
+
+MAGIC = b"SEIDX007"
+HEADER = struct.Struct("<4sIIQQQQQQQ16s???16s")
+LENGTH = struct.Struct("<I")
+DOC_INFO = struct.Struct("<dq20s")
+NO_INFO = (0.0, -1, bytes(20))
+TERM_ENTRY = struct.Struct("<QIQddQQ")
+BYTE_ORDER = b"LE  " if sys.byteorder == "little" else b"BE  "
+# index versions are drawn from one counter, so no two indexes share one
+VERSIONS = count()
+
+
+class IndexFormatError(ValueError):
+    """raised by InvertedIndex.load for a file it can't read, such as one saved by
+    another version of the index format, which has to be rebuilt from the documents"""
+
+
+class PostingList:
+    """
+    The documents a term occurs in.
+
+    Attributes:
+        doc_ids (array) : ids of the documents containing the term, ascending
+        freqs (array) : frequency of the term in each of those documents
+        weights (array) : score each posting adds to its document, float32, or uint8 codes
+            when quantized
+        scale (float) : factor the stored weights are multiplied by, 1 unless quantized
+        max_weight (float) : upper bound of the scaled weights, used to prune top-k queries
+        positions (array) : the coded positions of every posting, in order, see codec.py.
+            Empty unless the index is positional
+        ends (array) : offset in positions just past each posting's positions
+    """
+    __slots__ = ('doc_ids', 'freqs', 'weights', 'scale', 'max_weight', 'positions', 'ends')
+
+    def __init__(self, doc_ids=None, freqs=None, weights=None, scale=1.0, max_weight=None,
+                 positions=None, ends=None):
+        self.doc_ids = array('i') if doc_ids is None else doc_ids
+        self.freqs = array('i') if freqs is None else freqs
+        self.weights = array('f') if weights is None else weights
+        self.scale = scale
+        if max_weight is None:
+            max_weight = max(self.weights, default=0) * scale
+        self.max_weight = max_weight
+        self.positions = array('B') if positions is None else positions
+        self.ends = array('i') if ends is None else ends
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __iter__(self):
+        return zip(self.doc_ids, self.freqs)
+
+    def __repr__(self):
+        return "PostingList(%s)" % list(self)
+
+    def add(self, doc_id, freq, weight=0, positions=None):
+        """appends a posting, doc_id must be larger than every id already stored
+        Args:
+        doc_id (int) : the document id
+        freq (int) : frequency of the term in the document
+        weight (float) : weight of the posting
+        positions (sequence) : ascending positions of the term in the document, None
+            unless the index is positional
+        """
+        self.make_writable()
+        self.doc_ids.append(doc_id)
+        self.freqs.append(freq)
+        self.weights.append(weight)
+        self.max_weight = max(self.max_weight, self.weights[-1] * self.scale)
+        if positions is not None:
+            codec.encode_deltas(positions, self.positions)
+            self.ends.append(len(self.positions))
+
+    def positions_at(self, index):
+        """decodes the positions of one posting
+        Args:
+        index (int) : the posting's index in the list, not its doc id
+        Returns:
+        list : the positions of the term in the posting's document, ascending
+        """
+        start = self.ends[index - 1] if index else 0
+        return codec.decode_deltas(self.positions, start, self.ends[index])
+
+    def make_writable(self):
+        """memory mapped postings are read only, copies them into arrays before
+        the first write
+        """
+        if not isinstance(self.doc_ids, array):
+            self.doc_ids = to_array(self.doc_ids)
+            self.freqs = to_array(self.freqs)
+            self.weights = to_array(self.weights)
+            self.positions = to_array(self.positions)
+            self.ends = to_array(self.ends)
+
+    def decoded(self):
+        """copies the postings with compressed doc ids and frequencies decoded
+        into arrays. Weights and positions are shared, not copied.
+        Returns:
+        PostingList : the decoded postings
+        """
+        return PostingList(array('i', self.doc_ids), array('i', self.freqs), self.weights,
+                           self.scale, self.max_weight, self.positions, self.ends)
+
+    def set_weights(self, weights, quantized=False):
+        """replaces the weights of every posting
+        Args:
+        weights (list) : the new weight of each posting, in order
+        quantized (bool) : store them as one byte codes, see weighting.quantize
+        """
+        if quantized:
+            self.weights, self.scale = quantize(weights)
+        else:
+            self.weights, self.scale = array('f', weights), 1.0
+        self.max_weight = max(self.weights, default=0) * self.scale
+
+    def remapped(self, remap):
+        """copies the postings with every doc id translated through remap,
+        leaving out documents remap sends to -1
+        Args:
+        remap (array) : the new id of each old doc id
+        Returns:
+        PostingList : the translated postings
+        """
+        doc_ids = array('i')
+        freqs = array('i')
+        weights = array(self.weights.format if isinstance(self.weights, memoryview)
+                        else self.weights.typecode)
+        positions = array('B')
+        ends = array('i')
+        start = 0
+        for doc_id, freq, weight, end in zip(self.doc_ids, self.freqs, self.weights,
+                                             self.ends or [0] * len(self.doc_ids)):
+            if remap[doc_id] >= 0:
+                doc_ids.append(remap[doc_id])
+                freqs.append(freq)
+                weights.append(weight)
+                if self.ends:
+                    positions.frombytes(self.positions[start:end])
+                    ends.append(len(positions))
+            start = end
+        return PostingList(doc_ids, freqs, weights, self.scale, self.max_weight,
+                           positions, ends)
+
+
+class CorpusStats:
+    """
+    Statistics of a corpus split over several indexes, which weighting schemes
+    depending on the whole corpus need.
+
+    Attributes:
+        num_docs (int) : number of live documents
+        total_length (int) : sum of their lengths
+        doc_freqs (dict) : term -> number of live documents containing it
+    """
+    def __init__(self, num_docs=0, total_length=0, doc_freqs=None):
+        self.num_docs = num_docs
+        self.total_length = total_length
+        self.doc_freqs = {} if doc_freqs is None else doc_freqs
+
+    @classmethod
+    def combine(cls, parts):
+        """adds up the statistics of the parts of a corpus
+        Args:
+        parts (iterable) : CorpusStats of each part, see InvertedIndex.corpus_stats
+        Returns:
+        CorpusStats : the statistics of the whole corpus
+        """
+        combined = cls()
+        doc_freqs = combined.doc_freqs
+        for part in parts:
+            combined.num_docs += part.num_docs
+            combined.total_length += part.total_length
+            for term, doc_freq in part.doc_freqs.items():
+                doc_freqs[term] = doc_freqs.get(term, 0) + doc_freq
+        return combined
+
+    def avg_length(self):
+        """the average length of the documents
+        Returns:
+        float : average number of indexed words per document, 0 for an empty corpus
+        """
+        return self.total_length / self.num_docs if self.num_docs else 0.0
+
+
+class InvertedIndex:
+    """
+    Maps terms to the posting lists of the documents containing them.
+
+    Terms are interned: the first time a term is seen it gets the next dense term id,
+    and its posting list is kept at that position of lists, so the only string lookup
+    a term costs is the one finding its id. The posting lists of a loaded index are
+    read from the mapped file the first time their term id is asked for.
+
+    Attributes:
+        terms (HashTableCompact) : term -> term id, in term id order
+        lists (list) : the PostingList of each term id, None for a term of a loaded index
+            whose postings haven't been read yet
+        entries (array) : offset in the mapped file of each term id's TERM_ENTRY, empty
+            unless the index was loaded
+        filenames (list) : the filename of each document, indexed by doc id. None once the
+            document is removed
+        doc_ids (HashTableCompact) : filename -> doc id of every live document
+        doc_lengths (array) : number of indexed words in each document, indexed by doc id
+        doc_norms (array) : 1 / length of each document, 0 for removed and empty documents
+        doc_info (list) : (mtime, size, sha1 digest) of each document's file, indexed by doc id
+        total_length (int) : sum of the lengths of the live documents
+        num_deleted (int) : number of removed documents whose postings are still stored
+        weighting (Weighting) : the scheme posting weights are computed with
+        quantized (bool) : whether posting weights are stored as one byte codes
+        stale (bool) : whether posting weights need recomputing, see refresh_weights
+        positional (bool) : whether the positions of every posting are stored
+        compressed (bool) : whether save() compresses doc ids and frequencies
+        analyzer (str) : the name of the tokenizer.Analyzer the terms come from, queries
+            must be analyzed the same way
+        mapping (mmap) : the file a loaded index is mapped from, None if built in memory
+        layout (tuple) : offsets of the postings, weights, ends and positions sections of
+            the mapped file, and whether its postings are compressed and its weights
+            quantized
+        version (int) : changes whenever documents are added or removed or the weights
+            are recomputed, so results computed against another version are out of date
+        posting_cache (PostingCache) : decoded posting lists of popular terms by term id,
+            used by postings() when the postings are compressed, None to always decode
+        corpus (CorpusStats) : statistics of the whole corpus when the index is one shard
+            of it, so weights match an index of the whole corpus. None to weigh with the
+            index's own statistics
+    """
+    def __init__(self, weighting="log", quantized=False, positional=False, compressed=False,
+                 analyzer="punct"):
+        self.weighting = get_weighting(weighting)
+        self.quantized = quantized
+        self.positional = positional
+        self.compressed = compressed
+        self.analyzer = analyzer
+        self.stale = False
+        self.terms = HashTableCompact(typecode='i')
+        self.lists = []
+        self.entries = array('Q')
+        self.filenames = []
+        self.doc_ids = HashTableCompact(typecode='i')
+        self.doc_lengths = array('i')
+        self.doc_norms = array('d')
+        self.doc_info = []
+        self.total_length = 0
+        self.num_deleted = 0
+        self.mapping = None
+        self.layout = None
+        self.version = next(VERSIONS)
+        self.posting_cache = None
+        self.corpus = None
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, term):
+        return term in self.terms
+
+    def add_document(self, filename, counts, length, info=NO_INFO, positions=None):
+        """adds a document and its term frequencies to the index
+        Args:
+        filename (str) : the file name, must not already be in the index
+        counts (iterable) : (term, frequency) pairs of the document
+        length (int) : total number of indexed words in the document
+        info (tuple) : (mtime, size, sha1 digest) of the file the document was read from
+        positions (HashTableCompact) : term -> ascending positions of the term in the
+            document, required by a positional index
+        Returns:
+        int : the id given to the document
+        """
+        if filename in self.doc_ids:
+            raise ValueError("%s is already indexed" % filename)
+        doc_id = len(self.filenames)
+        if not isinstance(self.doc_lengths, array):
+            self.doc_lengths = to_array(self.doc_lengths)
+        self.version = next(VERSIONS)
+        self.filenames.append(filename)
+        self.doc_ids.put(filename, doc_id)
+        self.doc_lengths.append(length)
+        self.doc_norms.append(norm(length))
+        self.doc_info.append(info)
+        self.total_length += length
+        weigh = self.weighting.local and not self.quantized
+        self.stale = self.stale or not weigh
+        for term, freq in counts:
+            postings = self.stored(self.intern(term))
+            postings.add(doc_id, freq, self.weighting.weigh(doc_id, freq, self) if weigh else 0,
+                         positions.get(term) if self.positional else None)
+        return doc_id
+
+    def merge(self, other):
+        """appends the documents of another index, e.g. one built by another process.
+        Their doc ids are shifted past the ids already in use, so every posting list
+        stays sorted.
+        Args:
+        other (InvertedIndex) : the index to merge in, it is left unchanged
+        """
+        offset = len(self.filenames)
+        if other.positional != self.positional:
+            raise ValueError("can't merge a positional index with one without positions")
+        if other.analyzer != self.analyzer:
+            raise ValueError("can't merge indexes whose terms come from different analyzers")
+        if not isinstance(self.doc_lengths, array):
+            self.doc_lengths = to_array(self.doc_lengths)
+        for filename in other.doc_ids:
+            if filename in self.doc_ids:
+                raise ValueError("%s is already indexed" % filename)
+        self.version = next(VERSIONS)
+        self.filenames.extend(other.filenames)
+        for filename, doc_id in other.doc_ids.items():
+            self.doc_ids.put(filename, doc_id + offset)
+        self.doc_lengths.extend(other.doc_lengths)
+        self.doc_norms.extend(other.doc_norms)
+        self.doc_info.extend(other.doc_info)
+        self.total_length += other.total_length
+        self.num_deleted += other.num_deleted
+        # weights can be carried over as they are only if they were computed the
+        # same way and don't depend on the rest of the corpus
+        keep = (self.weighting.name == other.weighting.name and self.weighting.local and
+                not self.quantized and not other.quantized and not other.stale)
+        self.stale = self.stale or not keep
+        for term, postings in other.term_postings():
+            mine = self.stored(self.intern(term))
+            mine.make_writable()
+            mine.doc_ids.extend(doc_id + offset for doc_id in postings.doc_ids)
+            mine.freqs.extend(postings.freqs)
+            start = len(mine.positions)
+            mine.positions.extend(postings.positions)
+            mine.ends.extend(end + start for end in postings.ends)
+            if keep:
+                mine.weights.extend(postings.weights)
+                mine.max_weight = max(mine.max_weight, postings.max_weight)
+            else:
+                mine.weights = array('f', bytes(4 * len(mine.doc_ids)))
+
+    def remove_document(self, filename):
+        """removes a document from the index. Its postings stay in place, skipped by
+        scoring, until the index is saved.
+        Args:
+        filename (str) : the file name
+        Returns:
+        int : the id the document had
+        """
+        doc_id = self.doc_ids.remove(filename)
+        if not isinstance(self.doc_lengths, array):
+            self.doc_lengths = to_array(self.doc_lengths)
+        self.version = next(VERSIONS)
+        self.filenames[doc_id] = None
+        self.total_length -= self.doc_lengths[doc_id]
+        self.doc_lengths[doc_id] = 0
+        self.doc_norms[doc_id] = 0.0
+        self.doc_info[doc_id] = NO_INFO
+        self.num_deleted += 1
+        self.stale = self.stale or not self.weighting.local
+        return doc_id
+
+    def set_weighting(self, weighting, quantized=False):
+        """changes how posting weights are computed, recomputing them if needed
+        Args:
+        weighting (str) : name of the weighting scheme, see weighting.get_weighting
+        quantized (bool) : store weights as one byte codes
+        """
+        scheme = get_weighting(weighting)
+        if scheme is not self.weighting or quantized != self.quantized:
+            self.weighting = scheme
+            self.quantized = quantized
+            self.stale = True
+        self.refresh_weights()
+
+    def refresh_weights(self):
+        """recomputes every posting weight if they are stale"""
+        if not self.stale:
+            return
+        for term, postings in self.term_postings():
+            postings.set_weights(self.weighting.weights(postings, self,
+                                                        self.term_stats(term, postings)),
+                                 self.quantized)
+        self.stale = False
+        self.version = next(VERSIONS)
+
+    def intern(self, term):
+        """finds the id of a term, giving it the next id and an empty posting list if
+        the index doesn't have it yet
+        Args:
+        term (str) : the term
+        Returns:
+        int : the term id
+        """
+        term_id = self.terms.get(term)
+        if term_id is None:
+            term_id = len(self.lists)
+            self.terms.put(term, term_id)
+            self.lists.append(PostingList(weights=array('B')) if self.quantized else
+                              PostingList())
+        return term_id
+
+    def stored(self, term_id):
+        """the posting list of a term id as it is stored, compressed or not
+        Args:
+        term_id (int) : the term id, see terms
+        Returns:
+        PostingList : the postings of the term
+        """
+        postings = self.lists[term_id]
+        if postings is None:
+            postings = self.lists[term_id] = self.read_postings(term_id)
+        return postings
+
+    def term_postings(self):
+        """iterates over every term and its stored posting list, in term id order
+        Returns:
+        generator : (term, PostingList) pairs
+        """
+        for term, term_id in self.terms.items():
+            yield term, self.stored(term_id)
+
+    def postings(self, term):
+        """finds the posting list of a term
+        Args:
+        term (str) : the term
+        Returns:
+        PostingList : the postings of the term, None if no document contains it
+        """
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return None
+        return self.postings_by_id(term_id)
+
+    def postings_by_id(self, term_id):
+        """the posting list of a term id, with compressed doc ids and frequencies
+        decoded (and maybe cached, see posting_cache)
+        Args:
+        term_id (int) : the term id, see terms
+        Returns:
+        PostingList : the postings of the term
+        """
+        postings = self.stored(term_id)
+        if self.posting_cache is not None and isinstance(postings.doc_ids, BlockSequence):
+            return self.posting_cache.get(term_id, postings, self.version)
+        return postings
+
+    def doc_freq(self, term):
+        """counts the live documents containing a term
+        Args:
+        term (str) : the term
+        Returns:
+        int : the document frequency of the term
+        """
+        term_id = self.terms.get(term)
+        return 0 if term_id is None else self.live_count(self.stored(term_id))
+
+    def term_stats(self, term, postings):
+        """the corpus statistics a term's weights are computed from
+        Args:
+        term (str) : the term
+        postings (PostingList) : its postings
+        Returns:
+        tuple : number of live documents, number of them containing the term and
+            their average length, over the whole corpus if corpus is set
+        """
+        corpus = self.corpus
+        if corpus is None:
+            return len(self), self.live_count(postings), self.avg_length()
+        doc_freq = corpus.doc_freqs.get(term)
+        if doc_freq is None:
+            doc_freq = self.live_count(postings)
+        return corpus.num_docs, doc_freq, corpus.avg_length()
+
+    def corpus_stats(self):
+        """collects the statistics of this index, to be combined with those of the
+        other shards of a corpus, see CorpusStats.combine
+        Returns:
+        CorpusStats : the live document count, total length and document frequencies
+        """
+        return CorpusStats(len(self), self.total_length,
+                           {term: self.live_count(postings)
+                            for term, postings in self.term_postings()})
+
+    def set_corpus(self, corpus):
+        """makes weights use statistics of a larger corpus, recomputing them if they
+        depend on it. Only the document frequencies of this index's own terms are
+        kept, so a shard doesn't hold the vocabulary of the whole corpus.
+        Args:
+        corpus (CorpusStats) : the statistics, None for the index's own
+        """
+        if corpus is not None:
+            doc_freqs = corpus.doc_freqs
+            corpus = CorpusStats(corpus.num_docs, corpus.total_length,
+                                 {term: doc_freqs[term] for term in self.terms
+                                  if term in doc_freqs})
+        self.corpus = corpus
+        if not self.weighting.local:
+            self.stale = True
+        self.refresh_weights()
+
+    def live_count(self, postings):
+        """counts the postings of live documents in a posting list
+        Args:
+        postings (PostingList) : the postings
+        Returns:
+        int : number of postings not belonging to removed documents
+        """
+        if not self.num_deleted:
+            return len(postings)
+        doc_norms = self.doc_norms
+        return sum(1 for doc_id in postings.doc_ids if doc_norms[doc_id])
+
+    def avg_length(self):
+        """the average length of the live documents
+        Returns:
+        float : average number of indexed words per document, 0 for an empty index
+        """
+        return self.total_length / len(self) if len(self) else 0.0
+
+    def num_postings(self):
+        """counts the postings stored over all terms
+        Returns:
+        int : number of (term, document) pairs in the index
+        """
+        return sum(len(postings) for _, postings in self.term_postings())
+
+    def stats(self):
+        """measures the size of the index
+        Returns:
+        dict : the number of documents, terms and postings, and the bytes taken by
+            doc ids and frequencies ("posting_bytes"), weights ("weight_bytes") and
+            positions ("position_bytes", 0 unless positional). "position_overhead" is
+            position_bytes relative to the bytes of the postings and weights.
+        """
+        posting_bytes = weight_bytes = position_bytes = 0
+        for _, postings in self.term_postings():
+            posting_bytes += nbytes(postings.doc_ids) + nbytes(postings.freqs)
+            weight_bytes += nbytes(postings.weights)
+            position_bytes += nbytes(postings.positions) + nbytes(postings.ends)
+        base = posting_bytes + weight_bytes
+        return {"documents": len(self), "terms": len(self.terms),
+                "postings": self.num_postings(), "posting_bytes": posting_bytes,
+                "weight_bytes": weight_bytes, "position_bytes": position_bytes,
+                "position_overhead": position_bytes / base if base else 0.0}
+
+    def save(self, path):
+        """writes the index to a binary file that load() can memory map
+        Args:
+        path (str) : the path of the index file
+        """
+        self.refresh_weights()
+        terms = list(self.term_postings())
+        live = [doc_id for doc_id in range(len(self.filenames))
+                if self.filenames[doc_id] is not None]
+        doc_lengths = self.doc_lengths
+        if self.num_deleted:
+            remap = array('i', [-1]) * len(self.filenames)
+            for new_id, doc_id in enumerate(live):
+                remap[doc_id] = new_id
+            doc_lengths = array('i', [self.doc_lengths[doc_id] for doc_id in live])
+            terms = [(term, postings.remapped(remap)) for term, postings in terms]
+            terms = [(term, postings) for term, postings in terms if len(postings)]
+        # write next to the old file and swap it in, so processes that have
+        # the old file mapped keep reading a complete index
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as writer:
+            writer.write(MAGIC)
+            writer.write(HEADER.pack(BYTE_ORDER, 0, 0, 0, 0, 0, 0, 0, 0, 0, b"", False, False,
+                                     False, b""))
+            docs_offset = writer.tell()
+            for doc_id in live:
+                write_string(writer, self.filenames[doc_id])
+                writer.write(DOC_INFO.pack(*self.doc_info[doc_id]))
+            lengths_offset = align(writer)
+            writer.write(doc_lengths)
+            terms_offset = writer.tell()
+            offset = weights = ends = positions = 0
+            weight_size = 1 if self.quantized else 4
+            if self.compressed:
+                blocks = [compress(postings) for _, postings in terms]
+            for i, (term, postings) in enumerate(terms):
+                write_string(writer, term)
+                writer.write(TERM_ENTRY.pack(offset, len(postings), weights, postings.scale,
+                                             postings.max_weight, ends, positions))
+                if self.compressed:
+                    offset += sum(nbytes(values) for values in blocks[i])
+                    offset += -offset % 4
+                else:
+                    offset += 8 * len(postings)
+                weights += weight_size * len(postings)
+                ends += 4 * len(postings.ends)
+                positions += len(postings.positions)
+            postings_offset = align(writer)
+            if self.compressed:
+                for values in blocks:
+                    for part in values:
+                        writer.write(part)
+                    align(writer, 4)
+            else:
+                for _, postings in terms:
+                    writer.write(postings.doc_ids)
+                    writer.write(postings.freqs)
+            weights_offset = align(writer)
+            for _, postings in terms:
+                writer.write(postings.weights)
+            ends_offset = align(writer)
+            for _, postings in terms:
+                writer.write(postings.ends)
+            positions_offset = writer.tell()
+            for _, postings in terms:
+                writer.write(postings.positions)
+            writer.seek(len(MAGIC))
+            writer.write(HEADER.pack(BYTE_ORDER, len(live), len(terms), docs_offset,
+                                     lengths_offset, terms_offset, postings_offset,
+                                     weights_offset, ends_offset, positions_offset,
+                                     self.weighting.name.encode("ascii"), self.quantized,
+                                     self.positional, self.compressed,
+                                     self.analyzer.encode("ascii")))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """opens an index written by save(). Posting lists and document lengths
+        are views into the memory mapped file rather than copies.
+        Args:
+        path (str) : the path of the index file
+        Returns:
+        InvertedIndex : the loaded index
+        Raises:
+        IndexFormatError : if the file isn't an index of this format and byte order
+        """
+        with open(path, "rb") as reader:
+            if os.fstat(reader.fileno()).st_size < len(MAGIC) + HEADER.size:
+                raise IndexFormatError("%s is not an index file" % path)
+            mapping = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapping[:len(MAGIC)] != MAGIC:
+            old = mapping[:len(MAGIC) - 3] == MAGIC[:-3]
+            mapping.close()
+            if old:
+                raise IndexFormatError("%s was saved by another version of the index" % path)
+            raise IndexFormatError("%s is not an index file" % path)
+        (byte_order, num_docs, num_terms, docs_offset, lengths_offset, terms_offset,
+         postings_offset, weights_offset, ends_offset, positions_offset, weighting, quantized,
+         positional, compressed, analyzer) = HEADER.unpack_from(mapping, len(MAGIC))
+        if byte_order != BYTE_ORDER:
+            mapping.close()
+            raise IndexFormatError("%s was written on a machine with another byte order" % path)
+        view = memoryview(mapping)
+        index = cls(weighting.rstrip(b"\0").decode("ascii"), quantized, positional, compressed,
+                    analyzer.rstrip(b"\0").decode("ascii"))
+        index.mapping = mapping
+        position = docs_offset
+        for doc_id in range(num_docs):
+            filename, position = read_string(mapping, position)
+            index.filenames.append(filename)
+            index.doc_ids.put(filename, doc_id)
+            index.doc_info.append(DOC_INFO.unpack_from(mapping, position))
+            position += DOC_INFO.size
+        index.doc_lengths = view[lengths_offset:lengths_offset + 4 * num_docs].cast('i')
+        index.doc_norms = array('d', map(norm, index.doc_lengths))
+        index.total_length = sum(index.doc_lengths)
+        index.layout = (postings_offset, weights_offset, ends_offset, positions_offset,
+                        compressed, quantized)
+        index.terms = HashTableCompact(num_terms * 2, 'i')
+        index.lists = [None] * num_terms
+        position = terms_offset
+        for term_id in range(num_terms):
+            term, position = read_string(mapping, position)
+            index.terms.put(term, term_id)
+            index.entries.append(position)
+            position += TERM_ENTRY.size
+        return index
+
+    def read_postings(self, term_id):
+        """reads the posting list of a term id from the mapped file. The arrays of
+        the list are views into the file rather than copies.
+        Args:
+        term_id (int) : the term id
+        Returns:
+        PostingList : the postings of the term
+        """
+        view = memoryview(self.mapping)
+        (postings_offset, weights_offset, ends_offset, positions_offset, compressed,
+         quantized) = self.layout
+        (offset, count, weights, scale, max_weight, ends,
+         positions) = TERM_ENTRY.unpack_from(self.mapping, self.entries[term_id])
+        start = postings_offset + offset
+        if compressed:
+            doc_ids, freqs = decompress(view, start, count)
+        else:
+            middle = start + 4 * count
+            doc_ids = view[start:middle].cast('i')
+            freqs = view[middle:middle + 4 * count].cast('i')
+        weight_format, weight_size = ('B', 1) if quantized else ('f', 4)
+        weights += weights_offset
+        ends = view[ends_offset + ends:ends_offset + ends + (4 * count if self.positional else 0)]
+        ends = ends.cast('i')
+        positions += positions_offset
+        positions = view[positions:positions + (ends[-1] if len(ends) else 0)].cast('B')
+        return PostingList(doc_ids, freqs,
+                           view[weights:weights + weight_size * count].cast(weight_format),
+                           scale, max_weight, positions, ends)
+
+
+def write_string(writer, string):
+    """writes a length prefixed utf-8 string
+    Args:
+    writer (file) : a binary file open for writing
+    string (str) : the string
+    """
+    data = string.encode("utf-8")
+    writer.write(LENGTH.pack(len(data)))
+    writer.write(data)
+
+
+def read_string(buffer, position):
+    """reads a string written by write_string
+    Args:
+    buffer (bytes-like) : the buffer to read from
+    position (int) : offset of the length prefix
+    Returns:
+    tuple : the string and the offset just past it
+    """
+    (size,) = LENGTH.unpack_from(buffer, position)
+    position += LENGTH.size
+    return str(buffer[position:position + size], "utf-8"), position + size
+
+
+def align(writer, size=8):
+    """pads a binary file with zero bytes so the next write starts on a
+    multiple of size, which memoryview.cast needs for typed access
+    Args:
+    writer (file) : a binary file open for writing
+    size (int) : the alignment in bytes
+    Returns:
+    int : the aligned offset
+    """
+    padding = -writer.tell() % size
+    writer.write(b"\0" * padding)
+    return writer.tell()
+
+
+def norm(length):
+    """the factor a document's term weights are multiplied by
+    Args:
+    length (int) : number of indexed words in the document
+    Returns:
+    float : 1 / length, 0 for an empty document
+    """
+    return 1.0 / length if length else 0.0
+
+
+def compress(postings):
+    """codes the doc ids and frequencies of a posting list in blocks
+    Args:
+    postings (PostingList) : the postings
+    Returns:
+    tuple : the arrays save() writes for the postings when compressed: block ends and
+        bases of the doc ids, block ends of the freqs, coded doc ids and coded freqs
+    """
+    doc_ids = postings.doc_ids
+    freqs = postings.freqs
+    if not isinstance(doc_ids, BlockSequence):
+        doc_ids = BlockSequence.encode(doc_ids, True)
+    if not isinstance(freqs, BlockSequence):
+        freqs = BlockSequence.encode(freqs, False)
+    return doc_ids.ends, doc_ids.bases, freqs.ends, doc_ids.data, freqs.data
+
+
+def decompress(view, start, count):
+    """maps the compressed doc ids and frequencies of a posting list written by save()
+    Args:
+    view (memoryview) : the mapped index file
+    start (int) : offset of the postings
+    count (int) : number of postings
+    Returns:
+    tuple : the doc ids and the freqs, as BlockSequences over the mapped bytes
+    """
+    size = 4 * -(-count // BLOCK_SIZE)
+    id_ends = view[start:start + size].cast('i')
+    id_bases = view[start + size:start + 2 * size].cast('i')
+    freq_ends = view[start + 2 * size:start + 3 * size].cast('i')
+    start += 3 * size
+    id_size = id_ends[-1] if count else 0
+    freq_size = freq_ends[-1] if count else 0
+    doc_ids = BlockSequence(view[start:start + id_size], id_ends, id_bases, count)
+    start += id_size
+    freqs = BlockSequence(view[start:start + freq_size], freq_ends, None, count)
+    return doc_ids, freqs
+
+
+def nbytes(values):
+    """the size of the data of an array, memory mapped view or BlockSequence
+    Args:
+    values (array) : the values
+    Returns:
+    int : number of bytes the values take
+    """
+    if isinstance(values, BlockSequence):
+        return values.nbytes
+    return len(values) * values.itemsize
+
+
+def to_array(values):
+    """copies a read only memory mapped view or BlockSequence into a growable array
+    Args:
+    values (memoryview) : the values
+    Returns:
+    array : an array of the same type holding the same values
+    """
+    return array(values.format, values)
@@ -8,11 +8,14 @@ class Node:
         creates:
             Node object: a variable that stores a data variable and a next variable.
     '''
+    __slots__ = ('key', 'data', 'next', 'hash_value')
 
-    def __init__(self, key =None, data= None):
-        '''Initializes a Node object'''
+    def __init__(self, key =None, data= None, hash_value=None):
+        '''Initializes a Node object, hash_value caches the hash of key'''
         self.key = key
         self.data = data
+        self.next = None
+        self.hash_value = hash_value
 
 
     def __repr__(self):
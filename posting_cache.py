@@ -0,0 +1,176 @@
+"""
+Cache of decoded posting lists for compressed indexes.
+
+The posting lists of a compressed index (see codec.py) are decoded block by
+block every time a query reads them. A PostingCache keeps the decoded doc
+ids and frequencies of the most popular terms within a memory budget, so
+they are decoded once, while the long tail stays compressed in the page
+cache.
+
+Which terms are kept is decided by TinyLFU: a count-min sketch estimates
+how often each term was looked up recently, whether it was cached or not.
+When a newly decoded list doesn't fit, the least recently used cached lists
+are evicted only while the new term is looked up more often than them;
+otherwise the new list isn't admitted. A burst of one-off terms therefore
+can't flush the hot vocabulary. The sketch halves its counters after every
+SAMPLE_FACTOR * width lookups, so popularity ages out.
+"""
+from array import array
+from collections import OrderedDict
+
+SKETCH_ROWS = 4
+SAMPLE_FACTOR = 10
+# odd multipliers picking a different counter in each row of the sketch
+SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+
+
+class FrequencySketch:
+    """
+    Approximate lookup counts, a count-min sketch of four-bit counters.
+
+    Attributes:
+        width (int) : counters per row, a power of two
+        counters (array) : SKETCH_ROWS rows of width counters, capped at 15
+        additions (int) : increments since the counters were last halved
+    """
+    def __init__(self, width=4096):
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self.counters = array('B', bytes(SKETCH_ROWS * self.width))
+        self.additions = 0
+
+    def slots(self, key):
+        """the counter of a key in each row"""
+        value = hash(key) & 0xFFFFFFFFFFFFFFFF
+        mask = self.width - 1
+        return [row * self.width + ((value * seed) >> 40 & mask)
+                for row, seed in enumerate(SEEDS)]
+
+    def increment(self, key):
+        """counts one lookup of a key
+        Args:
+        key (hashable) : the key
+        """
+        counters = self.counters
+        for slot in self.slots(key):
+            if counters[slot] < 15:
+                counters[slot] += 1
+        self.additions += 1
+        if self.additions >= SAMPLE_FACTOR * self.width:
+            self.counters = array('B', (count >> 1 for count in counters))
+            self.additions //= 2
+
+    def estimate(self, key):
+        """estimates how often a key was looked up recently
+        Args:
+        key (hashable) : the key
+        Returns:
+        int : the smallest of the key's counters
+        """
+        counters = self.counters
+        return min(counters[slot] for slot in self.slots(key))
+
+
+class PostingCache:
+    """
+    Decoded posting lists of popular terms, within a memory budget.
+
+    Attributes:
+        budget (int) : the most bytes of decoded doc ids and frequencies kept
+        size (int) : bytes currently kept
+        entries (OrderedDict) : term id -> decoded PostingList, least recently used first
+        sketch (FrequencySketch) : recent lookup counts of every term
+        version (int) : the index version the entries were decoded from
+        hits (int) : lookups answered from the cache
+        misses (int) : lookups that had to decode
+        admissions (int) : decoded lists added to the cache
+        rejections (int) : decoded lists not added because they were less popular than
+            the lists they would have replaced
+        evictions (int) : lists dropped to make room
+    """
+    def __init__(self, budget=64 << 20, sketch_width=None):
+        self.budget = budget
+        self.size = 0
+        self.entries = OrderedDict()
+        if sketch_width is None:
+            # about one counter per cached list of a hundred postings
+            sketch_width = max(budget // 800, 256)
+        self.sketch = FrequencySketch(sketch_width)
+        self.version = None
+        self.hits = self.misses = self.admissions = self.rejections = self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, term, postings, version):
+        """returns the decoded postings of a term, decoding and maybe caching them
+        Args:
+        term (int) : the term id, see InvertedIndex.terms
+        postings (PostingList) : its compressed postings
+        version (int) : the current version of the index
+        Returns:
+        PostingList : the postings with doc ids and frequencies decoded into arrays
+        """
+        if version != self.version:
+            self.clear()
+            self.version = version
+        self.sketch.increment(term)
+        decoded = self.entries.get(term)
+        if decoded is not None:
+            self.entries.move_to_end(term)
+            self.hits += 1
+            return decoded
+        self.misses += 1
+        decoded = postings.decoded()
+        self.admit(term, decoded)
+        return decoded
+
+    def admit(self, term, decoded):
+        """adds a decoded list if it is worth the lists it has to evict
+        Args:
+        term (int) : the term id, see InvertedIndex.terms
+        decoded (PostingList) : its decoded postings
+        """
+        cost = entry_size(decoded)
+        if cost > self.budget:
+            self.rejections += 1
+            return
+        frequency = self.sketch.estimate(term)
+        victims = []
+        free = self.budget - self.size
+        for victim in self.entries:
+            if free >= cost:
+                break
+            if self.sketch.estimate(victim) >= frequency:
+                self.rejections += 1
+                return
+            victims.append(victim)
+            free += entry_size(self.entries[victim])
+        for victim in victims:
+            self.size -= entry_size(self.entries.pop(victim))
+            self.evictions += 1
+        self.entries[term] = decoded
+        self.size += cost
+        self.admissions += 1
+
+    def clear(self):
+        """drops every decoded list"""
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        """reports how well the cache is doing
+        Returns:
+        dict : entries, bytes, budget, hits, misses, hit_rate, admissions, rejections
+            and evictions
+        """
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "bytes": self.size, "budget": self.budget,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "admissions": self.admissions, "rejections": self.rejections,
+                "evictions": self.evictions}
+
+
+def entry_size(postings):
+    """bytes taken by the decoded doc ids and frequencies of a posting list"""
+    return 8 * len(postings)
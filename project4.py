@@ -5,7 +5,32 @@ By: Zach Gold
 """
 import os
 import math
-from hashtables import HashTableLinear
+import asyncio
+import multiprocessing
+import hashlib
+import heapq
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from hashtables import HashTableCompact
+from codec import BlockSequence
+from inverted_index import IndexFormatError, InvertedIndex, NO_INFO
+from tokenizer import CHUNK_SIZE, Analyzer, read_chunks, tokenize
+import boolean_query
+import pruning
+from posting_cache import PostingCache, entry_size
+from query_cache import QueryCache
+from server import QueryServer
+from stopwords import load_stopwords, read_stopwords
+import vectorized
+
+
+# the engine forked batch workers score with, see SearchEngine.search_batch
+# the engine of a forked search_batch worker process, set by init_batch_worker
+BATCH_ENGINE = None
+# bytes of decoded posting lists a batch shares between its queries when the index
+# has no posting cache, see BatchPostings
+BATCH_BUDGET = 64 << 20
 
 
 class SearchEngine:
@@ -14,22 +39,94 @@ class SearchEngine:
         provides a functionality to search documents with query terms.
     Attributes:
         directory (str) : a directory name
-        stopwords (HashTableLinear) : a hash table containing stopwords
-        doc_length (HashTableLinear) : a hash table containing the total number of words in each
-            document
-        doc_freqs (HashTableLinear) : a hash table containing the number of documents containing the
-            term for each term
-        term_freqs (HashTableLinear) : a hash table of hash tables for each term. Each hash table
-            contains the frequency of the term in documents (document names are the keys and the
-            frequencies are the values)
+        stopwords (frozenset) : words left out of the index and of queries
+        analyzer (Analyzer) : turns documents and queries into terms, see tokenizer.py
+        index (InvertedIndex) : maps each term to the posting list of the documents containing it,
+            and each document id to its filename and total number of words
+        chunk_size (int) : number of characters read from a document at a time while indexing
+        vectorized (bool) : score with NumPy (see vectorized.py), on by default when it is installed
+        pruning (bool) : answer searches for the top k results with MaxScore pruning (see
+            pruning.py) instead of scoring every posting. None, the default, prunes only when
+            the weighting scheme is not local, as without idf common terms can't be skipped.
+        cache (QueryCache) : the results of recent queries, None when caching is off
     """
-    def __init__(self, directory, stopwords=[]):
-        self.doc_length = HashTableLinear()  # Replace HashTableLinear() with your hash table.
-        self.doc_freqs = HashTableLinear()  # this will not be used in this assignment
-        self.term_freqs = HashTableLinear()
-        self.stopwords = stopwords
-        self.index_files(directory)
+    def __init__(self, directory, stopwords=[], index_path=None, update=True, workers=1,
+                 weighting="log", quantize=False, positional=False, compress=None,
+                 cache_size=1024, posting_cache_size=64 << 20, analyzer=None, names=None):
+        """
+        Args:
+        directory (str) : the directory of documents to search, None to start with an empty index
+        stopwords (iterable) : words left out of the index and of queries, a frozenset such as
+            load_stopwords returns or a hash table such as import_stopwords fills, which is
+            copied into one
+        index_path (str) : optional index file. If it exists the index is memory mapped from it
+            instead of reading the documents, otherwise the documents are indexed and saved there.
+        update (bool) : when the index is loaded from index_path, bring it up to date with the
+            documents in directory (see update_files) and save it again if anything changed
+        workers (int) : number of processes used to index the documents, see index_files
+        weighting (str) : the scheme the index weights postings with, see weighting.py. A loaded
+            index saved with another scheme is reweighted in memory.
+        quantize (bool) : store posting weights in one byte each instead of four
+        positional (bool) : also index where each word occurs, for phrase and NEAR queries.
+            A loaded index saved without positions is rebuilt from the documents.
+        compress (bool) : save the doc ids and frequencies of the index varint coded in
+            blocks, see codec.py. None keeps the choice a loaded index was saved with, and
+            doesn't compress a new one.
+        cache_size (int) : number of queries whose results are cached, 0 to turn caching off
+        posting_cache_size (int) : bytes of decoded posting lists kept for popular terms when
+            the index is compressed (see posting_cache.py), 0 to decode them on every query
+        analyzer (Analyzer) : how documents and queries are split into terms, by default
+            lowercased with punctuation stripped and stopwords left out. Its stopwords are
+            used instead of the stopwords argument. A loaded index whose terms come from
+            another analyzer is rebuilt from the documents.
+        names (list) : the files of directory the index holds, e.g. those of one shard (see
+            sharding.py), None for all of its text files
+
+        An index_path saved by another version of the index format is rebuilt from the
+        documents and saved again as well.
+        """
+        self.analyzer = Analyzer(stopwords) if analyzer is None else analyzer
+        self.stopwords = self.analyzer.stopwords
         self.directory = directory
+        self.chunk_size = CHUNK_SIZE
+        self.vectorized = vectorized.numpy is not None
+        self.pruning = None
+        self.cache = QueryCache(cache_size) if cache_size else None
+        self.index = None
+        if index_path is not None and os.path.exists(index_path):
+            try:
+                self.index = InvertedIndex.load(index_path)
+            except IndexFormatError:
+                # saved by another version of the format, rebuilt below
+                pass
+            else:
+                if ((positional and not self.index.positional) or
+                        self.index.analyzer != self.analyzer.name):
+                    self.index = None
+        if self.index is not None:
+            self.index.set_weighting(weighting, quantize)
+            if compress is not None:
+                self.index.compressed = compress
+            if update and any(self.update_files(directory, names)):
+                self.save_index(index_path)
+        else:
+            self.index = InvertedIndex(weighting, quantize, positional, bool(compress),
+                                       self.analyzer.name)
+            if names is not None:
+                self.index_names(directory, names)
+            elif directory is not None:
+                self.index_files(directory, workers)
+            if index_path is not None:
+                self.save_index(index_path)
+        if posting_cache_size:
+            self.index.posting_cache = PostingCache(posting_cache_size)
+
+    def save_index(self, path):
+        """saves the index so a later SearchEngine can open it without re-reading the documents
+        Args:
+        path (str) : the path of the index file
+        """
+        self.index.save(path)
 
     def read_file(self, infile):
         """A helper function to read a file
@@ -44,58 +141,131 @@ class SearchEngine:
 
     def parse_words(self, lines):
         """split strings into words
-        Convert words to lower cases and remove new line chars.
-        Exclude stopwords.
+        The lines are joined and analyzed in one pass, see Analyzer.analyze:
+        lower case, punctuation stripped, stopwords excluded.
         Args:
         lines (list) : a list of strings
         Returns:
         list : a list of words
         """
-        return_list = []
-        for i in lines:
-            i = i.lower()
-            i = i.split()
-            for j in i:
-                j = j.replace('\n', '')
-                if j not in self.stopwords:
-                    return_list.append(j)
-        return return_list
+        return self.analyzer.analyze(" ".join(lines))
 
-    def count_words(self, filename, words):
-        """count words in a file and store the frequency of each
-        word in the term_freqs hash table. Words should not contain stopwords.
+    def count_words(self, filename, words, info=NO_INFO):
+        """count words in a file and add the frequency of each
+        word to the index as a new document. Words should not contain stopwords.
         Also store the total count of words contained in the file
-        in the doc_length hash table.
+        as the length of the document.
         Args:
         filename (str) : the file name
-        words (list) : a list of words
+        words (iterable) : the words of the file, a list or a generator such as tokenize()
+        info (tuple) : (mtime, size, sha1 digest) of the file, used by update_files
         """
-        #file_lines = self.read_file(filename)
-        #str_list = self.parse_words(file_lines)
-        for i in words:
-            self.term_freqs.put(i, HashTableLinear())
-        self.doc_freqs.put(filename, 0)
+        counts = HashTableCompact(typecode='i')
+        positions = HashTableCompact() if self.index.positional else None
+        length = 0
         for i in words:
-            if i in self.term_freqs and filename in self.term_freqs[i]:
-                self.term_freqs[i][filename] = self.term_freqs[i][filename] + 1
-            elif i and i in self.term_freqs:
-                self.term_freqs[i].put(filename, 1)
-            elif i:
-                self.term_freqs.put(i, HashTableLinear())
-                self.term_freqs[i].put(filename, 1)
-        self.doc_freqs[filename] = len(words)
+            count = counts.get(i, 0)
+            counts.put(i, count + 1)
+            if positions is not None:
+                if not count:
+                    positions.put(i, array('i'))
+                positions.get(i).append(length)
+            length += 1
+        self.index.add_document(filename, counts.items(), length, info, positions)
 
+    def index_file(self, directory, filename, info=None):
+        """streams a file through the tokenizer into the index, so only one chunk
+        of it is in memory at a time
+        Args:
+        directory (str) : the path of a directory
+        filename (str) : name of the file in the directory
+        info (tuple) : (mtime, size, sha1 digest) of the file, computed if not given
+        """
+        path = os.path.join(directory, filename)
+        if info is None:
+            info = file_info(path)
+        words = tokenize(read_chunks(path, self.chunk_size), self.analyzer)
+        self.count_words(filename, words, info)
 
-    def index_files(self, directory):
+
+    def index_files(self, directory, workers=1):
         """index all text files in a given directory
+        Files are indexed in name order, so doc ids (and the order of files with equal
+        scores) don't depend on the order the file system lists them in.
+        With more than one worker the files are split into contiguous partitions,
+        each indexed by index_partition in its own process, and the partial indexes
+        are merged in order.
+        Args:
+        directory (str) : the path of a directory
+        workers (int) : number of processes to index with
+        """
+        txt_list = sorted(i for i in os.listdir(directory) if ".txt" in i)
+        if workers <= 1 or len(txt_list) < 2:
+            self.index_names(directory, txt_list)
+            return
+        step = -(-len(txt_list) // workers)
+        partitions = [txt_list[i:i + step] for i in range(0, len(txt_list), step)]
+        with ProcessPoolExecutor(len(partitions)) as pool:
+            futures = [pool.submit(index_partition, directory, names, self.analyzer,
+                                   self.index.weighting.name, self.index.quantized,
+                                   self.index.positional)
+                       for names in partitions]
+            for future in futures:
+                self.index.merge(future.result())
+        self.index.refresh_weights()
+
+    def index_names(self, directory, txt_list):
+        """index the given files of a directory
         Args:
         directory (str) : the path of a directory
+        txt_list (list) : names of the files to index
         """
-        txt_list = os.listdir(directory)
         for i in txt_list:
             if ".txt" in i:
-                j = self.parse_words(self.read_file(os.path.join(directory, i)))
-                self.count_words(i, j)
+                self.index_file(directory, i)
+
+    def update_files(self, directory, names=None):
+        """brings the index up to date with the text files in a directory.
+        Only files whose size or modification time changed are read again, and
+        of those only the ones whose content hash changed are re-indexed; the
+        others only have their recorded modification time refreshed, so the index
+        should still be saved or they are hashed again next time.
+        Documents whose file is gone are removed.
+        Args:
+        directory (str) : the path of a directory
+        names (list) : the files of the directory the index should hold, e.g. those of
+            one shard (see sharding.py), None for all of them
+        Returns:
+        tuple : the number of documents added, updated, removed and refreshed
+        """
+        added = updated = removed = refreshed = 0
+        present = set()
+        for i in sorted(os.listdir(directory)) if names is None else names:
+            if ".txt" not in i:
+                continue
+            present.add(i)
+            path = os.path.join(directory, i)
+            doc_id = self.index.doc_ids.get(i)
+            if doc_id is not None:
+                stat = os.stat(path)
+                mtime, size, digest = self.index.doc_info[doc_id]
+                if stat.st_mtime == mtime and stat.st_size == size:
+                    continue
+                info = file_info(path)
+                if info[2] == digest:
+                    self.index.doc_info[doc_id] = info
+                    refreshed += 1
+                    continue
+                self.index.remove_document(i)
+                updated += 1
+            else:
+                info = file_info(path)
+                added += 1
+            self.index_file(directory, i, info)
+        for i in [name for name in self.index.doc_ids if name not in present]:
+            self.index.remove_document(i)
+            removed += 1
+        return added, updated, removed, refreshed
 
     def get_weighted_freq(self, total_freq):
         """comptes the weighted frequency
@@ -110,104 +280,335 @@ class SearchEngine:
             weighted_freq = 0
         return weighted_freq
 
-    def get_scores(self, terms):
-        """creates a list of scores for each file in corpus
+    def get_scores(self, terms, postings=None):
+        """scores each file in corpus containing one of the terms
         The score = weighted frequency / the total word count in the file.
         Compute this score for each term in a query and sum all the scores.
+        The index stores this weight for each posting (see weighting.py), so
+        scoring only sums stored weights into a dict keyed by doc id.
         Args:
-        terms (list) : a list of str
+        terms (list) : a list of str, terms missing from the index match nothing
+        postings (callable) : finds the posting list of a term, index.postings by default
         Returns:
-        list : a list of tuples, each containing the filename and its relevancy score
+        dict : doc id -> relevancy score, in the order the files were first matched
+            (ascending doc id when vectorized)
         """
-        scores = ([], [])
+        self.index.refresh_weights()
+        if self.vectorized:
+            return vectorized.score_terms(self.index, terms, postings)
+        lookup = self.index.postings if postings is None else postings
+        scores = {}
+        get = scores.get
+        doc_norms = self.index.doc_norms
         for term in terms:
-            if term not in self.term_freqs:
-                raise ValueError
-            for i in self.term_freqs[term].hash_table:
-                if i and i.key not in scores[0]:
-                    file = i.key
-                    freq = i.data
-                    scores[0].append(file)
-                    freq = self.get_weighted_freq(freq) / self.doc_freqs[file]
-                    scores[1].append(freq)
-                elif i and i.key in scores[0]:
-                    file = i.key
-                    freq = i.data
-                    freq = self.get_weighted_freq(freq) / self.doc_freqs[file]
-                    ind = scores[0].index(i.key)
-                    scores[1][ind] += freq
+            postings = lookup(term)
+            if postings is None:
+                continue
+            scale = postings.scale
+            for doc_id, weight in zip(postings.doc_ids, postings.weights):
+                if doc_norms[doc_id]:
+                    scores[doc_id] = get(doc_id, 0.0) + weight * scale
         return scores
 
-    def rank(self, scores):
+    def rank(self, scores, k=None):
         """ranks files in the descending order of relevancy
+        With k only the k best files are kept, selected with a bounded heap in
+        O(n log k) instead of sorting every match. Files with equal scores are
+        ordered by doc id, i.e. the order they were indexed in.
         Args:
-        scores(list) : a list of tuples: (filename, score)
+        scores(dict) : doc id -> score, see get_scores
+        k (int) : number of files to return, None for all of them
         Returns:
         list : a list of tuples: (filename, score) sorted in descending order of relevancy
         """
-        for i in range(len(scores[0])-1, 0, -1): # extra credit implementation of sorting algorithm.
-            for j in range(len(scores[0])-1):
-                if scores[1][j] < scores[1][j+1]:
-                    temp = scores[0][j]
-                    temp2 = scores[1][j]
-                    scores[0][j] = scores[0][j+1]
-                    scores[1][j] = scores[1][j+1]
-                    scores[0][j+1] = temp
-                    scores[1][j+1] = temp2
-        return scores
+        pairs = scores.items()
+        if k is None:
+            ranked = sorted(pairs, key=rank_key, reverse=True)
+        else:
+            ranked = heapq.nlargest(k, pairs, key=rank_key)
+        filenames = self.index.filenames
+        return [(filenames[doc_id], score) for doc_id, score in ranked]
 
-    def search(self, query):
+    def boolean_scores(self, query):
+        """scores the files matching a boolean query, see boolean_query.py
+        The matches are found by intersecting posting lists, then scored by the
+        terms of the query that aren't negated.
+        Args:
+        query (str) : the query, e.g. "fox AND (dog OR cat) NOT red"
+        Returns:
+        dict : doc id -> relevancy score, in ascending doc id order
         """
-        Searches query and returns stuff.
-        :param query:
-        :return:
+        self.index.refresh_weights()
+        node = boolean_query.parse(query, self.analyzer)
+        doc_ids = boolean_query.evaluate(self.index, node)
+        return boolean_query.score_matches(self.index, doc_ids,
+                                           boolean_query.positive_terms(node))
+
+    def query_key(self, query):
+        """normalizes a query, so queries with the same results share cached results
+        Args:
+        query (str) : the query
+        Returns:
+        tuple : ("boolean", the tokens of the query) for a boolean query, otherwise
+            ("terms", its terms, sorted)
+        """
+        if boolean_query.is_boolean(query):
+            return "boolean", tuple(boolean_query.split_query(query))
+        return "terms", tuple(sorted(self.analyzer.analyze(query)))
+
+    def search_results(self, query, k=None, offset=0):
+        """scores the files matching a query
+        A query using AND, OR, NOT or parentheses is a boolean query (see
+        boolean_scores), any other query matches files containing any of its words.
+        Results are cached (see query_cache.py) until the index changes.
+        Args:
+        query (str) : the query
+        k (int) : number of results to return, None for all of them
+        offset (int) : number of best results to skip, for paging through results
+        Returns:
+        list : a list of tuples: (filename, score) sorted in descending order of relevancy
+        """
+        key = self.query_key(query)
+        depth = None if k is None else offset + k
+        if self.cache is not None:
+            ranked_scores = self.cache.get(key, depth, self.index.version)
+            if ranked_scores is not None:
+                return ranked_scores[offset:depth]
+        ranked_scores = self.ranked_results(key, depth)
+        if self.cache is not None:
+            self.cache.put(key, depth, ranked_scores, self.index.version)
+        return ranked_scores[offset:]
+
+    def search_batch(self, queries, k=None, offset=0, workers=1):
+        """scores many queries at once, e.g. for offline evaluation
+        Repeated queries are ranked once, and the posting list of a term shared
+        by several plain queries is looked up (and decoded, when compressed)
+        once for the whole batch, see rank_batch. Results are cached like those
+        of search_results.
+        Args:
+        queries (iterable) : the queries
+        k (int) : number of results to return per query, None for all of them
+        offset (int) : number of best results to skip
+        workers (int) : number of processes ranking the queries not cached yet. Workers
+            are forked so they share the index with this process; where processes
+            can't be forked, or other threads are running (forking them isn't safe), the
+            batch is ranked here
+        Returns:
+        list : the results of each query in order, a list of tuples: (filename, score)
+            sorted in descending order of relevancy, see search_results
+        """
+        keys = [self.query_key(query) for query in queries]
+        depth = None if k is None else offset + k
+        self.index.refresh_weights()
+        version = self.index.version
+        ranked = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            ranked_scores = None
+            if self.cache is not None:
+                ranked_scores = self.cache.get(key, depth, version)
+            if ranked_scores is None:
+                pending.append(key)
+            else:
+                ranked[key] = ranked_scores
+        if (workers > 1 and len(pending) > 1 and threading.active_count() == 1 and
+                "fork" in multiprocessing.get_all_start_methods()):
+            step = -(-len(pending) // workers)
+            parts = [pending[i:i + step] for i in range(0, len(pending), step)]
+            with ProcessPoolExecutor(len(parts), mp_context=multiprocessing.get_context("fork"),
+                                     initializer=init_batch_worker, initargs=(self,)) as pool:
+                results = [ranked_scores for part in pool.map(batch_worker, parts,
+                                                              [depth] * len(parts))
+                           for ranked_scores in part]
+        else:
+            results = self.rank_batch(pending, depth)
+        for key, ranked_scores in zip(pending, results):
+            ranked[key] = ranked_scores
+            if self.cache is not None:
+                self.cache.put(key, depth, ranked_scores, version)
+        return [ranked[key][offset:depth] for key in keys]
+
+    def rank_batch(self, keys, depth=None):
+        """ranks normalized queries, bypassing the cache. The plain queries share the
+        posting lists they look up (see BatchPostings), within the budget of the posting
+        cache, or BATCH_BUDGET without one. Queries are ranked in sorted order, so those
+        sharing terms tend to be ranked together.
+        Args:
+        keys (list) : the queries, see query_key
+        depth (int) : number of best results to rank per query, None for all of them
+        Returns:
+        list : the ranked results of each query, see ranked_results
+        """
+        cache = self.index.posting_cache
+        shared = BatchPostings(self.index, BATCH_BUDGET if cache is None else cache.budget)
+        results = [None] * len(keys)
+        for i in sorted(range(len(keys)), key=keys.__getitem__):
+            results[i] = self.ranked_results(keys[i], depth, shared.get)
+        return results
+
+    def ranked_results(self, key, depth=None, postings=None):
+        """ranks the files matching a normalized query, bypassing the cache
+        Args:
+        key (tuple) : the query, see query_key
+        depth (int) : number of best results to rank, None for all of them
+        postings (callable) : finds the posting list of a term of a plain query,
+            index.postings by default
+        Returns:
+        list : a list of tuples: (filename, score) sorted in descending order of relevancy
+        """
+        kind, words = key
+        if kind == "boolean":
+            return self.rank(self.boolean_scores(" ".join(words)), depth)
+        pruned = self.pruning
+        if pruned is None:
+            pruned = not self.index.weighting.local
+        if depth is not None and pruned:
+            self.index.refresh_weights()
+            filenames = self.index.filenames
+            return [(filenames[doc_id], score) for doc_id, score in
+                    pruning.top_k(self.index, list(words), depth, postings)]
+        return self.rank(self.get_scores(list(words), postings), depth)
+
+    def search(self, query, k=None, offset=0):
+        """
+        Searches query and returns the paths of the matching files, best match first,
+        one per line.
+        :param query: the query
+        :param k: number of results to return, None for all of them
+        :param offset: number of best results to skip, for paging through results
+        :return: str
         """
-        temp_list = query.lower()
-        temp_list = temp_list.split()
-        query_list = self.parse_words(temp_list)
-        scores_tuple = self.get_scores(query_list)
-        ranked_scores = self.rank(scores_tuple)
         str = ""
-        for i in ranked_scores[0]:
-            if i:
-                str += "%s/%s \n" % (self.directory, i)
+        for i, _ in self.search_results(query, k, offset):
+            str += "%s/%s \n" % (self.directory, i)
         return str
 
 
-def import_stopwords(filename, hashtable):
+class BatchPostings:
+    """
+    The posting lists looked up by a batch of queries, so each is looked up (and
+    decoded, when compressed) once while the queries sharing it are ranked. When
+    the decoded lists would take more than the budget, those kept so far are
+    dropped, so a batch of any size holds at most the budget plus the lists of
+    the query being ranked.
+
+    Attributes:
+        index (InvertedIndex) : the index the lists come from
+        budget (int) : the most bytes of decoded doc ids and frequencies kept
+        size (int) : bytes currently kept
+        lists (dict) : term -> its PostingList, None for terms no document contains
+    """
+    def __init__(self, index, budget=BATCH_BUDGET):
+        self.index = index
+        self.budget = budget
+        self.size = 0
+        self.lists = {}
+
+    def get(self, term):
+        """finds the posting list of a term, see InvertedIndex.postings"""
+        if term in self.lists:
+            return self.lists[term]
+        postings = self.index.postings(term)
+        cost = 0
+        if postings is not None:
+            stored = self.index.stored(self.index.terms.get(term))
+            if isinstance(stored.doc_ids, BlockSequence):
+                cost = entry_size(postings)
+        if self.size + cost > self.budget:
+            self.lists.clear()
+            self.size = 0
+        self.lists[term] = postings
+        self.size += cost
+        return postings
+
+
+def init_batch_worker(engine):
+    """keeps the engine of a forked search_batch worker process"""
+    global BATCH_ENGINE
+    BATCH_ENGINE = engine
+
+
+def batch_worker(keys, depth):
+    """ranks part of a batch in a forked worker process, see SearchEngine.search_batch"""
+    return BATCH_ENGINE.rank_batch(keys, depth)
+
+
+def rank_key(pair):
+    """sort key of a (doc id, score) pair: higher scores first, then lower doc ids"""
+    return pair[1], -pair[0]
+
+
+def index_partition(directory, txt_list, analyzer, weighting="log", quantize=False,
+                    positional=False):
+    """builds the index of part of a directory, run in a worker process by index_files
+    Args:
+    directory (str) : the path of a directory
+    txt_list (list) : names of the files to index
+    analyzer (Analyzer) : splits the files into terms
+    weighting (str) : the weighting scheme of the index
+    quantize (bool) : whether the index quantizes its weights
+    positional (bool) : whether the index stores positions
+    Returns:
+    InvertedIndex : the partial index, with doc ids starting at 0
+    """
+    engine = SearchEngine(None, weighting=weighting, quantize=quantize,
+                          positional=positional, analyzer=analyzer)
+    engine.index_names(directory, txt_list)
+    return engine.index
+
+
+def file_info(path):
+    """stats and hashes a file so later runs can tell whether it changed
+    Args:
+    path (str) : the path to a file
+    Returns:
+    tuple : (mtime, size, sha1 digest) of the file
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    with open(path, 'rb') as reader:
+        for block in iter(lambda: reader.read(1 << 16), b''):
+            digest.update(block)
+    return stat.st_mtime, stat.st_size, digest.digest()
+
+
+def import_stopwords(filename, hashtable=None):
     """
     Takes a file of words and returns a hash table containing each word.
+    Without a hash table the words are returned as the frozenset shared by every
+    engine, see load_stopwords.
     :param filename: String referring to file mentioned
-    :param hashtable: empty hashtable object (one of the 3 above)
+    :param hashtable: empty hashtable object (one of the 3 above), or None
     :return:
     hashtable
     """
-    file = open(filename, "r")
-    string_file = file.read()
-    file.close()
-
-    temp_string = ""
-    for i in string_file:
-        if i == " ":
-            hashtable.put(temp_string, temp_string)
-            temp_string = ""
-        else:
-            temp_string += i
+    if hashtable is None:
+        return load_stopwords(filename)
+    for word in read_stopwords(filename):
+        hashtable.put(word, word)
     return hashtable
 
 
-def main(directory): #Set the location of the files you want the engine to search through as the directory parameter.
-    hash = HashTableLinear()
-    hash = import_stopwords("stop_words.txt", hash)
-    search = SearchEngine(directory, hash)
-    while True:
-        inp = input("Search here:")
-        if inp == "q":
-            break
-        elif inp == "s:":
-            inp = input("Search multiple things:")
-            print(search.search(inp))
+def main(directory, index_path=None, host="127.0.0.1", port=8765, workers=None): #Set the location of the files you want the engine to search through as the directory parameter.
+    """indexes a directory and serves queries over TCP until interrupted, see server.py
+    Args:
+    directory (str) : the directory of documents to search
+    index_path (str) : the index file, which worker processes open
+    host (str) : the address to listen on
+    port (int) : the TCP port to listen on
+    workers (int) : number of worker processes scoring queries, by default one per CPU
+        with an index file and none without
+    """
+    search = SearchEngine(directory, load_stopwords("stop_words.txt"), index_path)
+    if workers is None:
+        workers = os.cpu_count() if index_path is not None else 0
+    server = QueryServer(search, index_path, workers)
+    print("Serving %s on %s:%d" % (directory, host, port))
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == '__main__':
         # execute main() function
-        main("docs")
+        main("docs", "docs.idx")
@@ -0,0 +1,877 @@
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from array import array
+from bisect import bisect_left
+from unittest import mock
+import boolean_query
+import codec
+from hashtables import HashTableLinear
+from inverted_index import CorpusStats, IndexFormatError, InvertedIndex, PostingList
+from posting_cache import FrequencySketch, PostingCache, entry_size
+from project4 import BatchPostings, SearchEngine, import_stopwords
+from query_cache import QueryCache
+from stopwords import load_stopwords
+from server import QueryServer, request
+from sharding import ShardedSearchEngine, shard_of
+from tokenizer import Analyzer, read_chunks, split_chunks, stem, tokenize
+import vectorized
+from weighting import get_weighting
+
+DOCS = {
+    "fox1.txt": "the quick brown fox jumps over the lazy dog\nfox\n",
+    "fox2.txt": "a fox and a dog\n",
+    "cat.txt": "cats and dogs living together\ncat cat\n",
+    "notes.md": "fox fox fox\n",
+}
+
+
+def doc_weights(index, term):
+    """the stored weight of a term in each document, by file name"""
+    postings = index.postings(term)
+    return dict(zip((index.filenames[doc_id] for doc_id in postings.doc_ids), postings.weights))
+
+
+class TestSearchEngine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name, text in DOCS.items():
+            with open(os.path.join(self.directory, name), "w") as writer:
+                writer.write(text)
+        self.stopwords = import_stopwords("stop_words.txt", HashTableLinear())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_index(self):
+        engine = SearchEngine(self.directory, self.stopwords)
+        self.assertEqual(len(engine.index), 3)
+        self.assertNotIn("notes.md", engine.index.filenames)
+        postings = engine.index.postings("fox")
+        self.assertEqual(len(postings), 2)
+        self.assertEqual(list(postings.doc_ids), sorted(postings.doc_ids))
+        counts = {engine.index.filenames[doc_id]: freq for doc_id, freq in postings}
+        self.assertEqual(counts, {"fox1.txt": 2, "fox2.txt": 1})
+        self.assertIsNone(engine.index.postings("the"))
+
+    def test_stopwords(self):
+        stopwords = load_stopwords("stop_words.txt")
+        self.assertIs(load_stopwords(os.path.abspath("stop_words.txt")), stopwords)
+        self.assertIn("on", stopwords)
+        self.assertEqual(stopwords, set(self.stopwords.key_list()))
+        engine = SearchEngine(self.directory, stopwords)
+        self.assertIs(engine.stopwords, stopwords)
+        self.assertIs(import_stopwords("stop_words.txt"), stopwords)
+        self.assertEqual(SearchEngine(self.directory, self.stopwords).stopwords, stopwords)
+        self.assertEqual(engine.parse_words(["The quick\n", "fox on A log"]),
+                         ["quick", "fox", "log"])
+
+    def test_search(self):
+        engine = SearchEngine(self.directory, self.stopwords)
+        result = engine.search("fox dog").split()
+        self.assertEqual(result, ["%s/fox2.txt" % self.directory,
+                                  "%s/fox1.txt" % self.directory])
+
+    def test_boolean_search(self):
+        engine = SearchEngine(self.directory, self.stopwords)
+        def names(query):
+            return sorted(name for name, _ in engine.search_results(query))
+        self.assertEqual(names("fox AND dog"), ["fox1.txt", "fox2.txt"])
+        self.assertEqual(names("fox AND quick"), ["fox1.txt"])
+        self.assertEqual(names("fox quick"), ["fox1.txt", "fox2.txt"])
+        self.assertEqual(names("(fox AND quick) OR cat"), ["cat.txt", "fox1.txt"])
+        self.assertEqual(names("dog NOT quick"), ["fox2.txt"])
+        self.assertEqual(names("NOT fox"), ["cat.txt"])
+        self.assertEqual(names("fox AND unicorn"), [])
+        self.assertEqual(names("fox OR unicorn"), ["fox1.txt", "fox2.txt"])
+        self.assertEqual(names("the AND fox"), ["fox1.txt", "fox2.txt"])
+        self.assertEqual(engine.search("fox AND dog", 1), engine.search("fox dog", 1))
+        engine.index.remove_document("fox2.txt")
+        self.assertEqual(names("dog OR cat"), ["cat.txt", "fox1.txt"])
+        self.assertEqual(names("NOT cat"), ["fox1.txt"])
+        self.assertRaises(ValueError, engine.search, "(fox AND dog")
+        self.assertRaises(ValueError, engine.search, "fox AND")
+
+    def test_phrase_search(self):
+        engine = SearchEngine(self.directory, self.stopwords, positional=True)
+        postings = engine.index.postings("fox")
+        self.assertEqual([postings.positions_at(i) for i in range(len(postings))], [[2, 6], [0]])
+        def names(query):
+            return sorted(name for name, _ in engine.search_results(query))
+        self.assertEqual(names('"quick brown fox"'), ["fox1.txt"])
+        self.assertEqual(names('"fox dog"'), ["fox2.txt"])
+        self.assertEqual(names('"fox and dog"'), ["fox2.txt"])
+        self.assertEqual(names('"dog fox"'), ["fox1.txt"])
+        self.assertEqual(names('"brown quick"'), [])
+        self.assertEqual(names('"fox" cat'), [])
+        self.assertEqual(names("fox NEAR/1 dog"), ["fox1.txt", "fox2.txt"])
+        self.assertEqual(names("quick NEAR/1 fox"), [])
+        self.assertEqual(names("quick NEAR/2 fox"), ["fox1.txt"])
+        self.assertEqual(names("fox NEAR/3 fox"), [])
+        self.assertEqual(names("fox NEAR/4 fox"), ["fox1.txt"])
+        self.assertEqual(names('"lazy dog" OR cat NEAR/1 living'), ["cat.txt", "fox1.txt"])
+        self.assertRaises(ValueError, engine.search, '"fox dog')
+        self.assertRaises(ValueError, engine.search, '"fox dog" NEAR/2 cat')
+        stats = engine.index.stats()
+        self.assertGreater(stats["position_bytes"], 0)
+        self.assertEqual(stats["position_overhead"], stats["position_bytes"] /
+                         (stats["posting_bytes"] + stats["weight_bytes"]))
+        self.assertEqual(SearchEngine(self.directory, self.stopwords).index.stats()
+                         ["position_bytes"], 0)
+        self.assertRaises(ValueError, SearchEngine(self.directory, self.stopwords).search,
+                          '"quick brown"')
+        index_path = os.path.join(self.directory, "docs.idx")
+        engine.save_index(index_path)
+        loaded = SearchEngine(self.directory, self.stopwords, index_path)
+        self.assertTrue(loaded.index.positional)
+        self.assertEqual(loaded.search('"fox dog" OR "brown fox"'),
+                         engine.search('"fox dog" OR "brown fox"'))
+        loaded.index.remove_document("fox1.txt")
+        loaded.save_index(index_path)
+        loaded = SearchEngine(self.directory, self.stopwords, index_path, update=False)
+        self.assertEqual([name for name, _ in loaded.search_results('"fox dog"')], ["fox2.txt"])
+        self.assertEqual([name for name, _ in loaded.search_results('"living cat"')],
+                         ["cat.txt"])
+        parallel = SearchEngine(self.directory, self.stopwords, workers=2, positional=True)
+        self.assertEqual(parallel.search('"dog fox" OR living NEAR/2 cat'),
+                         engine.search('"dog fox" OR living NEAR/2 cat'))
+
+    def test_search_batch(self):
+        for i in range(20):
+            with open(os.path.join(self.directory, "extra%02d.txt" % i), "w") as writer:
+                writer.write("fox " * (i % 4 + 1) + "dog " * (i % 3) + "cat " * (i % 5) +
+                             "filler " * i)
+        queries = ["fox dog", "cat", "dog fox", "fox AND cat NOT dog", "unicorn", "cat",
+                   "the", "fox dog cat"]
+        for weighting in ("log", "bm25"):
+            engine = SearchEngine(self.directory, self.stopwords, weighting=weighting,
+                                  cache_size=0)
+            for k, offset in ((None, 0), (3, 0), (2, 3)):
+                expected = [engine.search_results(query, k, offset) for query in queries]
+                self.assertEqual(engine.search_batch(queries, k, offset), expected)
+                self.assertEqual(engine.search_batch(queries, k, offset, workers=2), expected)
+        lookups = []
+        postings = engine.index.postings
+        engine.index.postings = lambda term: lookups.append(term) or postings(term)
+        engine.search_batch([query for query in queries if "AND" not in query])
+        self.assertEqual(sorted(lookups), ["cat", "dog", "fox", "unicorn"])
+        cached = SearchEngine(self.directory, self.stopwords)
+        self.assertEqual(cached.search_batch(queries, 3), cached.search_batch(queries, 3))
+        self.assertEqual(cached.cache.stats()["hits"], 6)
+        self.assertEqual(cached.search_batch([]), [])
+        compressed = SearchEngine(self.directory, self.stopwords, cache_size=0, compress=True)
+        path = os.path.join(self.directory, "index.idx")
+        compressed.save_index(path)
+        compressed = SearchEngine(self.directory, self.stopwords, path, cache_size=0,
+                                  posting_cache_size=40)
+        expected = [compressed.search_results(query, 3) for query in queries]
+        self.assertEqual(compressed.search_batch(queries, 3), expected)
+        shared = BatchPostings(compressed.index, 100)
+        for term in ["fox", "dog", "cat", "unicorn", "fox"]:
+            postings = shared.get(term)
+            self.assertEqual(list(postings or ()), list(compressed.index.postings(term) or ()))
+            self.assertLessEqual(shared.size, max(100, entry_size(postings or ())))
+        self.assertNotIn("dog", shared.lists)
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        try:
+            self.assertEqual(compressed.search_batch(queries, 3, workers=2), expected)
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_query_cache(self):
+        engine = SearchEngine(self.directory, self.stopwords, cache_size=2)
+        cache = engine.cache
+        first = engine.search_results("fox dog", 1)
+        self.assertEqual(engine.search_results("the dog fox", 1), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        second = engine.search_results("dog fox", 1, offset=1)
+        self.assertEqual(engine.search_results("fox dog", 2), first + second)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        everything = engine.search_results("dog fox", 5)
+        self.assertEqual(everything, first + second)
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(engine.search_results("fox dog"), everything)
+        self.assertEqual(cache.hits, 3)
+        engine.search_results("cat")
+        engine.search_results("fox AND dog")
+        self.assertEqual((len(cache), cache.evictions), (2, 1))
+        self.assertIsNone(cache.get(("terms", ("dog", "fox")), None, engine.index.version))
+        engine.count_words("extra.txt", ["cat"] * 3)
+        self.assertEqual([name for name, _ in engine.search_results("cat")],
+                         ["extra.txt", "cat.txt"])
+        self.assertEqual(cache.invalidations, 1)
+        engine.index.remove_document("extra.txt")
+        self.assertEqual([name for name, _ in engine.search_results("cat")], ["cat.txt"])
+        stats = cache.stats()
+        self.assertEqual(stats["hit_rate"], stats["hits"] / (stats["hits"] + stats["misses"]))
+        bounded = QueryCache(max_entries=10, max_results=3)
+        bounded.put("a", None, [("a.txt", 1.0)] * 2, 0)
+        bounded.put("b", None, [("b.txt", 1.0)] * 2, 0)
+        self.assertEqual(list(bounded.entries), ["b"])
+        bounded.put("c", None, [("c.txt", 1.0)] * 4, 0)
+        self.assertEqual(list(bounded.entries), ["b"])
+        self.assertIsNone(SearchEngine(self.directory, self.stopwords, cache_size=0).cache)
+
+    def test_compressed_index(self):
+        for i in range(300):
+            with open(os.path.join(self.directory, "extra%03d.txt" % i), "w") as writer:
+                writer.write("fox " * (i % 7 + 1) + "filler " * (i % 300 + 1) + "dog")
+        index_path = os.path.join(self.directory, "docs.idx")
+        engine = SearchEngine(self.directory, self.stopwords, positional=True)
+        compressed = SearchEngine(self.directory, self.stopwords, index_path, positional=True,
+                                  compress=True)
+        compressed = SearchEngine(self.directory, self.stopwords, index_path)
+        self.assertTrue(compressed.index.compressed)
+        postings = compressed.index.stored(compressed.index.terms.get("fox"))
+        self.assertIsInstance(postings.doc_ids, codec.BlockSequence)
+        expected = engine.index.postings("fox")
+        self.assertEqual(list(postings), list(expected))
+        self.assertEqual([postings.doc_ids[i] for i in (0, 130, 128, 301, -1)],
+                         [expected.doc_ids[i] for i in (0, 130, 128, 301, -1)])
+        self.assertLess(compressed.index.stats()["posting_bytes"],
+                        engine.index.stats()["posting_bytes"] / 2)
+        for query in ("fox", "fox dog cat", "fox AND filler NOT cat", '"filler dog"'):
+            self.assertEqual(compressed.search_results(query), engine.search_results(query))
+            self.assertEqual(compressed.search_results(query, 3), engine.search_results(query, 3))
+        cache = compressed.index.posting_cache
+        self.assertGreater(cache.hits, 0)
+        self.assertIs(compressed.index.postings("fox"), compressed.index.postings("fox"))
+        self.assertIsInstance(compressed.index.postings("fox").doc_ids, array)
+        compressed.index.remove_document("extra005.txt")
+        compressed.count_words("extra.txt", ["fox", "dog"])
+        compressed.save_index(index_path)
+        compressed = SearchEngine(self.directory, self.stopwords, index_path, update=False)
+        self.assertEqual(len(compressed.index.postings("fox")), 302)
+
+    def test_top_k(self):
+        for i in range(20):
+            with open(os.path.join(self.directory, "extra%02d.txt" % i), "w") as writer:
+                writer.write("fox " * (i + 1) + "filler " * 10)
+        engine = SearchEngine(self.directory, self.stopwords)
+        everything = engine.search_results("fox")
+        self.assertEqual(len(everything), 22)
+        self.assertEqual([score for _, score in everything],
+                         sorted((score for _, score in everything), reverse=True))
+        self.assertEqual(engine.search_results("fox", k=5), everything[:5])
+        self.assertEqual(engine.search_results("fox", k=5, offset=5), everything[5:10])
+        self.assertEqual(engine.search_results("fox", k=5, offset=20), everything[20:])
+        self.assertEqual(engine.search("fox", 2).split(),
+                         ["%s/%s" % (self.directory, name) for name, _ in everything[:2]])
+
+    @unittest.skipIf(vectorized.numpy is None, "NumPy is not installed")
+    def test_vectorized_scores(self):
+        engine = SearchEngine(self.directory, self.stopwords)
+        engine.count_words("extra.txt", ["fox", "fox", "cat"])
+        engine.index.remove_document("fox2.txt")
+        for query in (["fox"], ["fox", "dog", "cat"], ["cat", "cat"]):
+            engine.vectorized = False
+            expected = engine.get_scores(query)
+            engine.vectorized = True
+            scores = engine.get_scores(query)
+            self.assertEqual(sorted(scores), sorted(expected))
+            for doc_id, score in expected.items():
+                self.assertAlmostEqual(scores[doc_id], score)
+        self.assertEqual(engine.get_scores(["unicorn"]), {})
+
+    def test_weighting(self):
+        engine = SearchEngine(self.directory, self.stopwords)
+        postings = engine.index.postings("fox")
+        for doc_id, freq, weight in zip(postings.doc_ids, postings.freqs, postings.weights):
+            expected = engine.get_weighted_freq(freq) / engine.index.doc_lengths[doc_id]
+            self.assertAlmostEqual(weight, expected, places=6)
+        raw = SearchEngine(self.directory, self.stopwords, weighting="raw")
+        self.assertEqual(doc_weights(raw.index, "fox"),
+                         dict(zip(["fox1.txt", "fox2.txt"], array('f', [2 / 7, 1 / 2]))))
+        quantized = SearchEngine(self.directory, self.stopwords, quantize=True)
+        self.assertEqual(quantized.index.postings("fox").weights.typecode, 'B')
+        expected = engine.get_scores(["fox", "dog", "cat"])
+        scores = quantized.get_scores(["fox", "dog", "cat"])
+        for doc_id, score in expected.items():
+            self.assertAlmostEqual(scores[doc_id], score, places=2)
+        self.assertEqual(quantized.search("fox dog cat"), engine.search("fox dog cat"))
+        self.assertRaises(ValueError, SearchEngine, self.directory, self.stopwords,
+                          weighting="unknown")
+        weights = get_weighting("log").weights(postings, engine.index,
+                                               engine.index.term_stats("fox", postings))
+        self.assertEqual(list(array('f', weights)), list(postings.weights))
+        for name in ("tfidf", "bm25"):
+            self.assertFalse(get_weighting(name).local)
+            self.assertFalse(hasattr(get_weighting(name), "weigh"))
+
+    def test_ranking_models(self):
+        engine = SearchEngine(self.directory, self.stopwords, weighting="bm25")
+        index = engine.index
+        self.assertEqual(index.doc_freq("fox"), 2)
+        self.assertEqual(index.doc_freq("unicorn"), 0)
+        self.assertAlmostEqual(index.avg_length(), (7 + 2 + 5) / 3)
+        fox1 = index.doc_ids["fox1.txt"]
+        idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+        expected = idf * 2 * 2.2 / (2 + 1.2 * (1 - 0.75 + 0.75 * 7 / index.avg_length()))
+        self.assertAlmostEqual(engine.get_scores(["fox"])[fox1], expected, places=6)
+        index.remove_document("fox2.txt")
+        self.assertEqual(index.doc_freq("fox"), 1)
+        self.assertAlmostEqual(index.avg_length(), (7 + 5) / 2)
+        self.assertEqual(list(engine.get_scores(["fox"])), [fox1])
+        tfidf = SearchEngine(self.directory, self.stopwords, weighting="tfidf")
+        scores = tfidf.get_scores(["dog", "cat"])
+        cat = tfidf.index.doc_ids["cat.txt"]
+        self.assertAlmostEqual(scores[cat], (1 + math.log(2)) * math.log(1 + 3 / 1) / 5,
+                               places=6)
+        self.assertEqual(tfidf.search("cat dog").split()[0], "%s/cat.txt" % self.directory)
+
+    def test_saved_weights(self):
+        path = os.path.join(self.directory, "index.idx")
+        built = SearchEngine(self.directory, self.stopwords, path, quantize=True)
+        loaded = SearchEngine(self.directory, self.stopwords, path, quantize=True)
+        self.assertEqual(list(loaded.index.postings("fox").weights),
+                         list(built.index.postings("fox").weights))
+        self.assertEqual(loaded.index.postings("fox").scale, built.index.postings("fox").scale)
+        reweighted = SearchEngine(self.directory, self.stopwords, path, weighting="raw")
+        self.assertFalse(reweighted.index.quantized)
+        self.assertEqual(doc_weights(reweighted.index, "fox"),
+                         dict(zip(["fox1.txt", "fox2.txt"], array('f', [2 / 7, 1 / 2]))))
+
+    def test_pruned_top_k(self):
+        rng = random.Random(7)
+        vocabulary = ["w%d" % i for i in range(40)]
+        for i in range(200):
+            words = rng.choices(vocabulary, [1 / (rank + 1) for rank in range(40)],
+                                k=rng.randint(1, 60))
+            with open(os.path.join(self.directory, "rand%03d.txt" % i), "w") as writer:
+                writer.write(" ".join(words))
+        for weighting in ("log", "bm25"):
+            engine = SearchEngine(self.directory, self.stopwords, weighting=weighting,
+                                  cache_size=0)
+            engine.index.remove_document("rand005.txt")
+            for query in ("w0", "w0 w1 w2", "w0 w39 w20", "w3 w3 w0 fox"):
+                for k in (1, 5, 30, 500):
+                    engine.pruning = False
+                    expected = engine.search_results(query, k)
+                    engine.pruning = True
+                    results = engine.search_results(query, k)
+                    self.assertEqual([name for name, _ in results],
+                                     [name for name, _ in expected])
+                    for (_, score), (_, want) in zip(results, expected):
+                        self.assertAlmostEqual(score, want)
+            self.assertEqual(engine.search_results("w0 w1", 3, offset=2),
+                             engine.search_results("w0 w1", 5)[2:])
+
+    def test_saved_index(self):
+        path = os.path.join(self.directory, "index.idx")
+        built = SearchEngine(self.directory, self.stopwords, path)
+        self.assertTrue(os.path.exists(path))
+        with open(os.path.join(self.directory, "fox3.txt"), "w") as writer:
+            writer.write("fox")
+        loaded = SearchEngine(self.directory, self.stopwords, path, update=False)
+        self.assertIsNotNone(loaded.index.mapping)
+        self.assertEqual(loaded.index.filenames, built.index.filenames)
+        self.assertEqual(list(loaded.index.doc_lengths), list(built.index.doc_lengths))
+        self.assertEqual(list(loaded.index.postings("fox")), list(built.index.postings("fox")))
+        self.assertEqual(loaded.search("fox dog"), built.search("fox dog"))
+        loaded.count_words("fox3.txt", ["fox"])
+        self.assertEqual(len(loaded.index.postings("fox")), 3)
+
+    def test_old_index_format(self):
+        path = os.path.join(self.directory, "index.idx")
+        with open(path, "wb") as writer:
+            writer.write(b"SEIDX006" + bytes(256))
+        self.assertRaises(IndexFormatError, InvertedIndex.load, path)
+        engine = SearchEngine(self.directory, self.stopwords, path)
+        self.assertEqual(len(engine.index), 3)
+        loaded = SearchEngine(self.directory, self.stopwords, path, update=False)
+        self.assertIsNotNone(loaded.index.mapping)
+        self.assertEqual(loaded.search("fox dog"), engine.search("fox dog"))
+        with open(path, "wb") as writer:
+            writer.write(b"not an index")
+        self.assertRaises(IndexFormatError, InvertedIndex.load, path)
+        self.assertEqual(SearchEngine(self.directory, self.stopwords, path).search("fox"),
+                         engine.search("fox"))
+
+    def test_update_files(self):
+        path = os.path.join(self.directory, "index.idx")
+        SearchEngine(self.directory, self.stopwords, path)
+        os.remove(os.path.join(self.directory, "cat.txt"))
+        with open(os.path.join(self.directory, "fox2.txt"), "w") as writer:
+            writer.write("no foxes here, only a dog and a cat")
+        with open(os.path.join(self.directory, "fox3.txt"), "w") as writer:
+            writer.write("fox")
+        engine = SearchEngine(self.directory, self.stopwords, path, update=False)
+        self.assertEqual(engine.update_files(self.directory), (1, 1, 1, 0))
+        self.assertEqual(engine.update_files(self.directory), (0, 0, 0, 0))
+        self.assertEqual(sorted(engine.index.doc_ids), ["fox1.txt", "fox2.txt", "fox3.txt"])
+        self.assertEqual(engine.search("fox").split(), ["%s/fox3.txt" % self.directory,
+                                                        "%s/fox1.txt" % self.directory])
+        engine.save_index(path)
+        reloaded = SearchEngine(self.directory, self.stopwords, path, update=False)
+        self.assertEqual(len(reloaded.index.filenames), 3)
+        self.assertEqual(reloaded.search("fox cat"), engine.search("fox cat"))
+        touched = os.path.join(self.directory, "fox1.txt")
+        os.utime(touched, (os.stat(touched).st_atime, os.stat(touched).st_mtime + 10))
+        SearchEngine(self.directory, self.stopwords, path)
+        reloaded = SearchEngine(self.directory, self.stopwords, path, update=False)
+        self.assertEqual(reloaded.update_files(self.directory), (0, 0, 0, 0))
+        os.utime(touched, (os.stat(touched).st_atime, os.stat(touched).st_mtime + 10))
+        self.assertEqual(reloaded.update_files(self.directory), (0, 0, 0, 1))
+
+    def test_parallel_index(self):
+        for i in range(10):
+            with open(os.path.join(self.directory, "extra%d.txt" % i), "w") as writer:
+                writer.write("fox %s cat\n" % ("dog " * i))
+        serial = SearchEngine(self.directory, self.stopwords)
+        parallel = SearchEngine(self.directory, self.stopwords, workers=3)
+        self.assertEqual(parallel.index.filenames, serial.index.filenames)
+        self.assertEqual(list(parallel.index.doc_lengths), list(serial.index.doc_lengths))
+        for term in ("fox", "dog", "cat", "quick"):
+            self.assertEqual(list(parallel.index.postings(term)), list(serial.index.postings(term)))
+        self.assertEqual(parallel.search("fox dog cat"), serial.search("fox dog cat"))
+
+    def test_posting_lists(self):
+        index = InvertedIndex()
+        index.add_document("a.txt", [("x", 2), ("y", 1)], 3)
+        index.add_document("b.txt", [("y", 4)], 4)
+        self.assertEqual(list(index.postings("y")), [(0, 1), (1, 4)])
+        self.assertEqual(index.doc_ids["b.txt"], 1)
+        self.assertEqual(index.num_postings(), 3)
+
+    def test_term_ids(self):
+        index = InvertedIndex()
+        index.add_document("a.txt", [("x", 2), ("y", 1)], 3)
+        index.add_document("b.txt", [("z", 1), ("y", 4)], 5)
+        self.assertEqual(list(index.terms.items()), [("x", 0), ("y", 1), ("z", 2)])
+        self.assertEqual(index.intern("y"), 1)
+        self.assertIs(index.postings_by_id(1), index.postings("y"))
+        self.assertEqual([term for term, _ in index.term_postings()], ["x", "y", "z"])
+        path = os.path.join(self.directory, "index.idx")
+        engine = SearchEngine(self.directory, self.stopwords, path)
+        loaded = SearchEngine(self.directory, self.stopwords, path, update=False)
+        self.assertEqual(list(loaded.index.terms), list(engine.index.terms))
+        self.assertEqual(loaded.index.lists.count(None), len(loaded.index.terms))
+        fox = loaded.index.terms.get("fox")
+        self.assertEqual(list(loaded.index.postings("fox")), list(engine.index.postings("fox")))
+        self.assertIsNotNone(loaded.index.lists[fox])
+        self.assertEqual(loaded.index.lists.count(None), len(loaded.index.terms) - 1)
+        self.assertEqual(loaded.index.stats(), engine.index.stats())
+        self.assertNotIn(None, loaded.index.lists)
+
+
+class TestQueryServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name, text in DOCS.items():
+            with open(os.path.join(self.directory, name), "w") as writer:
+                writer.write(text)
+        self.stopwords = import_stopwords("stop_words.txt", HashTableLinear())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def serve(self, server, clients):
+        async def run():
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            async def client(queries):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                responses = [await request(reader, writer, *query) for query in queries]
+                writer.write(b"not json\n")
+                responses.append(json.loads(await reader.readline()))
+                writer.close()
+                await writer.wait_closed()
+                return responses
+            try:
+                return await asyncio.gather(*[client(queries) for queries in clients])
+            finally:
+                await server.stop(listener)
+        return asyncio.run(run())
+
+    def check(self, engine, server):
+        clients = [[("fox dog", None, 0), ("fox", 1, 1), ("fox AND (dog", None, 0)],
+                   [("cat", 5, 0), ("fox NOT quick", None, 0)]] * 5
+        answers = self.serve(server, clients)
+        for queries, responses in zip(clients, answers):
+            for (query, k, offset), response in zip(queries, responses):
+                self.assertEqual(response["query"], query)
+                if "AND (" in query:
+                    self.assertIn("error", response)
+                    continue
+                expected = engine.search_results(query, k, offset)
+                self.assertEqual([(result["file"], result["score"])
+                                  for result in response["results"]], expected)
+                self.assertEqual([result["path"] for result in response["results"]],
+                                 engine.search(query, k, offset).split())
+            self.assertTrue(responses[-1]["error"].startswith("invalid request"))
+        self.assertEqual(server.requests, 35)
+        self.assertEqual(server.errors, 15)
+
+    def test_thread(self):
+        engine = SearchEngine(self.directory, self.stopwords)
+        self.check(engine, QueryServer(engine))
+
+    def test_workers(self):
+        index_path = os.path.join(self.directory, "docs.idx")
+        engine = SearchEngine(self.directory, self.stopwords, index_path)
+        self.check(engine, QueryServer(engine, index_path, workers=2))
+        self.assertRaises(ValueError, QueryServer, engine, workers=2)
+
+    def test_sharded(self):
+        sharded = ShardedSearchEngine(self.directory, self.stopwords, shards=2)
+        try:
+            self.check(sharded, QueryServer(sharded))
+            index_path = os.path.join(self.directory, "docs.idx")
+            self.assertRaises(ValueError, QueryServer, sharded, index_path, workers=2)
+        finally:
+            sharded.close()
+
+    def test_bad_requests(self):
+        engine = SearchEngine(self.directory, self.stopwords)
+        server = QueryServer(engine)
+        queries = [("fox", True, 0), ("fox", -1, 0), ("fox", None, -1), ("fox", 1.5, 0),
+                   ("NOT " * 3000 + "fox", None, 0), ("(" * 3000 + "fox" + ")" * 3000, None, 0),
+                   ("fox", 1, 0)]
+        responses = self.serve(server, [queries])[0]
+        for response in responses[:4]:
+            self.assertTrue(response["error"].startswith("invalid request"))
+        self.assertIn("nested", responses[4]["error"])
+        self.assertIn("nested", responses[5]["error"])
+        self.assertEqual([result["file"] for result in responses[6]["results"]],
+                         [name for name, _ in engine.search_results("fox", 1)])
+        self.assertEqual(server.errors, 7)
+
+    def test_long_line(self):
+        server = QueryServer(SearchEngine(self.directory, self.stopwords))
+        async def run():
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                answered = await request(reader, writer, "fox")
+                writer.write(json.dumps({"query": "fox " * 30000}).encode("utf-8") + b"\n")
+                too_long = json.loads(await reader.readline())
+                return answered, too_long, await reader.read()
+            finally:
+                writer.close()
+                await writer.wait_closed()
+                await server.stop(listener)
+        answered, too_long, rest = asyncio.run(run())
+        self.assertIn("results", answered)
+        self.assertEqual(too_long["error"], "invalid request: line too long")
+        self.assertEqual(rest, b"")
+        self.assertEqual((server.requests, server.errors), (2, 1))
+
+    def test_dead_worker(self):
+        index_path = os.path.join(self.directory, "docs.idx")
+        engine = SearchEngine(self.directory, self.stopwords, index_path)
+        server = QueryServer(engine, index_path, workers=1)
+        pools = []
+        start_workers = server.start_workers
+        server.start_workers = lambda: pools.append(start_workers()) or pools[-1]
+        async def run():
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            connections = [await asyncio.open_connection("127.0.0.1", port) for _ in range(3)]
+            try:
+                first = await request(*connections[0], "fox")
+                for process in list(server.pool._processes.values()):
+                    process.kill()
+                    process.join()
+                # requests in flight when the worker died all fail with the same pool
+                during = await asyncio.gather(*[request(reader, writer, "fox")
+                                                for reader, writer in connections])
+                again = await request(*connections[0], "fox")
+                return first, during, again
+            finally:
+                for _, writer in connections:
+                    writer.close()
+                    await writer.wait_closed()
+                await server.stop(listener)
+        first, during, again = asyncio.run(run())
+        self.assertIn("error", during[0])
+        self.assertEqual(len(pools), 1)
+        self.assertEqual(again["results"], first["results"])
+        self.assertEqual(server.errors, sum("error" in response for response in during))
+
+
+class TestShardedSearch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for i in range(30):
+            with open(os.path.join(self.directory, "doc%02d.txt" % i), "w") as writer:
+                writer.write("fox " * (i % 7 + 1) + "dog " * (i % 3) + "cat " * (i % 5) +
+                             "quick brown fox " * (i % 2) + "filler " * i)
+        self.stopwords = load_stopwords("stop_words.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, sharded, engine):
+        queries = ["fox", "fox dog", "cat AND fox NOT dog", "unicorn"]
+        if engine.index.positional:
+            queries.append('"brown fox"')
+        for query in queries:
+            for k, offset in ((None, 0), (3, 0), (4, 5)):
+                results = sharded.search_results(query, k, offset)
+                expected = engine.search_results(query, k, offset)
+                self.assertEqual([name for name, _ in results], [name for name, _ in expected])
+                for (_, score), (_, want) in zip(results, expected):
+                    self.assertAlmostEqual(score, want)
+        self.assertEqual(sharded.search("fox", 2), engine.search("fox", 2))
+
+    def test_global_stats(self):
+        engine = SearchEngine(self.directory, self.stopwords, weighting="bm25", positional=True)
+        sharded = ShardedSearchEngine(self.directory, self.stopwords, shards=3,
+                                      weighting="bm25", positional=True)
+        try:
+            self.assertEqual(len(sharded), 30)
+            self.assertEqual(sharded.corpus.num_docs, 30)
+            self.assertEqual(sharded.corpus.doc_freqs["fox"], 30)
+            self.assertEqual(sharded.corpus.total_length, engine.index.total_length)
+            self.check(sharded, engine)
+            self.assertRaises(ValueError, sharded.search_results, "fox AND (dog")
+            engine.index.set_corpus(CorpusStats(60, 600, {"fox": 50, "unicorn": 3}))
+            self.assertEqual(engine.index.corpus.doc_freqs, {"fox": 50})
+            self.assertEqual(engine.index.term_stats("fox", engine.index.postings("fox")),
+                             (60, 50, 10.0))
+        finally:
+            sharded.close()
+
+    def test_saved_shards(self):
+        index_path = os.path.join(self.directory, "index.idx")
+        sharded = ShardedSearchEngine(self.directory, self.stopwords, index_path, shards=2)
+        sharded.close()
+        self.assertTrue(os.path.exists(index_path + ".0"))
+        self.assertTrue(os.path.exists(index_path + ".1"))
+        os.remove(os.path.join(self.directory, "doc07.txt"))
+        self.assertEqual(shard_of("doc07.txt", 2), shard_of("doc07.txt", 2))
+        engine = SearchEngine(self.directory, self.stopwords)
+        sharded = ShardedSearchEngine(self.directory, self.stopwords, index_path, shards=2)
+        try:
+            self.assertEqual(len(sharded), 29)
+            self.assertIsNone(sharded.corpus)
+            self.check(sharded, engine)
+        finally:
+            sharded.close()
+        self.assertRaises(ValueError, ShardedSearchEngine, self.directory, shards=0)
+        with mock.patch("os.cpu_count", return_value=None):
+            sharded = ShardedSearchEngine(self.directory, self.stopwords)
+        try:
+            self.assertEqual(len(sharded.shards), 1)
+            self.check(sharded, engine)
+        finally:
+            sharded.close()
+
+    def test_ties(self):
+        index_path = os.path.join(self.directory, "index.idx")
+        names = ["tie%02d.txt" % i for i in range(12)]
+        for name in names:
+            with open(os.path.join(self.directory, name), "w") as writer:
+                writer.write("tie")
+        ShardedSearchEngine(self.directory, self.stopwords, index_path, shards=3).close()
+        # indexed after the others, so its doc id in its shard comes after theirs
+        with open(os.path.join(self.directory, "tie.txt"), "w") as writer:
+            writer.write("tie")
+        names.insert(0, "tie.txt")
+        sharded = ShardedSearchEngine(self.directory, self.stopwords, index_path, shards=3)
+        try:
+            for k, offset in ((None, 0), (1, 0), (3, 2), (5, 10)):
+                self.assertEqual([name for name, _ in sharded.search_results("tie", k, offset)],
+                                 names[offset:None if k is None else offset + k])
+        finally:
+            sharded.close()
+
+
+class TestBooleanQuery(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(boolean_query.parse("a b OR NOT c"),
+                         ("or", [("and", [("term", "a"), ("term", "b")]),
+                                 ("not", ("term", "c"))]))
+        self.assertEqual(boolean_query.parse("A AND (B OR c)"),
+                         ("and", [("term", "a"), ("or", [("term", "b"), ("term", "c")])]))
+        self.assertIsNone(boolean_query.parse("the AND a", ["the", "a"]))
+        self.assertRaises(boolean_query.QuerySyntaxError, boolean_query.parse, "a )")
+        self.assertEqual(boolean_query.parse('"The fox" NEAR/2 dog b NEAR/1 c', ["the"]),
+                         ("and", [("near", 2, ["fox", "dog"]), ("near", 1, ["b", "c"])]))
+        self.assertEqual(boolean_query.parse('"a b c" OR "d"'),
+                         ("or", [("phrase", ["a", "b", "c"]), ("term", "d")]))
+        self.assertTrue(boolean_query.is_boolean('"fox dog"'))
+        self.assertTrue(boolean_query.is_boolean("fox NEAR/2 dog"))
+        self.assertTrue(boolean_query.is_boolean("(fox)"))
+        self.assertFalse(boolean_query.is_boolean("fox and dog"))
+        depth = boolean_query.MAX_DEPTH
+        self.assertEqual(boolean_query.parse("NOT " * depth + "a")[0], "not")
+        self.assertEqual(boolean_query.parse("(" * depth + "a" + ")" * depth), ("term", "a"))
+        self.assertRaises(boolean_query.QuerySyntaxError, boolean_query.parse,
+                          "NOT " * (depth + 1) + "a")
+        self.assertRaises(boolean_query.QuerySyntaxError, boolean_query.parse,
+                          "(" * (depth + 1) + "a" + ")" * (depth + 1))
+
+    def test_intersect(self):
+        rng = random.Random(3)
+        for _ in range(50):
+            short = sorted(rng.sample(range(1000), rng.randint(0, 30)))
+            long = sorted(rng.sample(range(1000), rng.randint(0, 600)))
+            expected = sorted(set(short) & set(long))
+            self.assertEqual(boolean_query.intersect(short, long), expected)
+            self.assertEqual(boolean_query.intersect(long, short), expected)
+            self.assertEqual(boolean_query.difference(short, long),
+                             sorted(set(short) - set(long)))
+            self.assertEqual(boolean_query.difference(long, short),
+                             sorted(set(long) - set(short)))
+            self.assertEqual(boolean_query.union([short, long, short]),
+                             sorted(set(short) | set(long)))
+
+
+class TestCodec(unittest.TestCase):
+    def test_deltas(self):
+        values = [0, 1, 127, 128, 300, 16384, 2 ** 31 - 1]
+        out = array('B')
+        size = codec.encode_deltas(values, out)
+        self.assertEqual(size, len(out))
+        self.assertEqual(codec.decode_deltas(out, 0, size), values)
+        codec.encode_varints(values, out)
+        self.assertEqual(codec.decode_varints(out, size, len(out)), values)
+
+    def test_blocks(self):
+        rng = random.Random(5)
+        values = sorted(rng.sample(range(10 ** 6), 1000))
+        doc_ids = codec.BlockSequence.encode(array('i', values), True)
+        freqs = codec.BlockSequence.encode([value % 300 for value in values], False)
+        self.assertEqual(len(doc_ids), 1000)
+        self.assertEqual(list(doc_ids), values)
+        self.assertEqual(list(freqs), [value % 300 for value in values])
+        for index in (999, 0, 128, 127, 500, -1):
+            self.assertEqual(doc_ids[index], values[index])
+        self.assertRaises(IndexError, doc_ids.__getitem__, 1000)
+        self.assertEqual(boolean_query.intersect(values[::7], doc_ids), values[::7])
+        for value in (-1, 0, values[0], values[127], values[128] - 1, values[500] + 1, 10 ** 7):
+            for low in (0, 127, 600):
+                self.assertEqual(doc_ids.bisect_left(value, low),
+                                 bisect_left(values, value, low))
+
+
+class TestPostingCache(unittest.TestCase):
+    def test_admission(self):
+        lists = {}
+        for term, count in (("hot", 40), ("warm", 30), ("cold", 40)):
+            doc_ids = codec.BlockSequence.encode(list(range(count)), True)
+            freqs = codec.BlockSequence.encode([1] * count, False)
+            lists[term] = PostingList(doc_ids, freqs, array('f', [0.5] * count))
+        cache = PostingCache(budget=8 * 70)
+        for _ in range(5):
+            decoded = cache.get("hot", lists["hot"], 1)
+        self.assertEqual(list(decoded.doc_ids), list(range(40)))
+        self.assertIs(decoded.weights, lists["hot"].weights)
+        self.assertEqual((cache.hits, cache.misses, cache.admissions), (4, 1, 1))
+        cache.get("warm", lists["warm"], 1)
+        self.assertEqual(set(cache.entries), {"hot", "warm"})
+        self.assertEqual(cache.size, 8 * 70)
+        cache.get("cold", lists["cold"], 1)
+        self.assertEqual(set(cache.entries), {"hot", "warm"})
+        self.assertEqual(cache.rejections, 1)
+        for _ in range(3):
+            cache.get("warm", lists["warm"], 1)
+        for _ in range(10):
+            cache.get("cold", lists["cold"], 1)
+        self.assertEqual(set(cache.entries), {"warm", "cold"})
+        self.assertEqual(cache.evictions, 1)
+        cache.get("warm", lists["warm"], 2)
+        self.assertEqual(list(cache.entries), ["warm"])
+        self.assertEqual(cache.stats()["hit_rate"], cache.hits / (cache.hits + cache.misses))
+        self.assertEqual(len(cache.get("huge", PostingList(
+            codec.BlockSequence.encode(list(range(100)), True),
+            codec.BlockSequence.encode([1] * 100, False)), 2)), 100)
+        self.assertNotIn("huge", cache.entries)
+
+    def test_sketch(self):
+        sketch = FrequencySketch(64)
+        for _ in range(7):
+            sketch.increment("a")
+        self.assertEqual(sketch.estimate("a"), 7)
+        self.assertEqual(sketch.estimate("b"), 0)
+        for _ in range(20):
+            sketch.increment("b")
+        self.assertEqual(sketch.estimate("b"), 15)
+        for _ in range(640):
+            sketch.increment("c")
+        self.assertEqual(sketch.estimate("a"), 3)
+
+
+class TestTokenizer(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        text = "The quick  brown fox\njumps over\tthe LAZY dog"
+        expected = text.lower().split()
+        for size in range(1, len(text) + 1):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            words = [word for batch in split_chunks(chunks) for word in batch]
+            self.assertEqual(words, expected)
+
+    def test_tokenize_file(self):
+        stopwords = import_stopwords("stop_words.txt", HashTableLinear())
+        engine = SearchEngine(None, stopwords)
+        lines = engine.read_file("stop_words.txt") + ["Search engines index Words\n"]
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as writer:
+            writer.writelines(lines)
+        try:
+            words = list(tokenize(read_chunks(writer.name, 7), stopwords))
+        finally:
+            os.remove(writer.name)
+        self.assertEqual(words, engine.parse_words(lines))
+
+    def test_analyzer(self):
+        analyzer = Analyzer(["the", "don't"])
+        self.assertEqual(analyzer.stopwords, {"the", "dont"})
+        self.assertEqual(analyzer.analyze("The fox's well-known (lazy) dogs, don't!"),
+                         ["foxs", "well", "known", "lazy", "dogs"])
+        self.assertEqual(Analyzer(punctuation=False).analyze("Fox, dog"), ["fox,", "dog"])
+        stemmer = Analyzer(["the"], stem=True)
+        self.assertEqual(stemmer.name, "punct+stem")
+        self.assertEqual(stemmer.analyze("The cities, buses and glass cars"),
+                         ["city", "buse", "and", "glass", "car"])
+        self.assertEqual([stem(word) for word in ("is", "bus", "eies", "toes", "fox")],
+                         ["is", "bus", "eie", "toe", "fox"])
+        text = "Fox, dogs; the-end... (Cats) don't stop"
+        expected = stemmer.analyze(text)
+        for size in range(1, len(text) + 1):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(list(stemmer.tokenize(chunks)), expected)
+
+    def test_engine_analyzer(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name, text in {"a.txt": "Foxes, and dogs.", "b.txt": "a fox-hunt"}.items():
+                with open(os.path.join(directory, name), "w") as writer:
+                    writer.write(text)
+            stopwords = load_stopwords("stop_words.txt")
+            engine = SearchEngine(directory, stopwords)
+            self.assertEqual(engine.search_results("dogs"), [("a.txt", 0.5)])
+            self.assertEqual(engine.search_results("FOX AND hunt"), [("b.txt", 1.0)])
+            self.assertEqual(engine.search_results("fox-hunt"),
+                             engine.search_results("hunt fox"))
+            index_path = os.path.join(directory, "index.idx")
+            analyzer = Analyzer(stopwords, stem=True)
+            stemmed = SearchEngine(directory, index_path=index_path, analyzer=analyzer)
+            self.assertEqual(stemmed.index.analyzer, "punct+stem")
+            self.assertEqual([name for name, _ in stemmed.search_results("fox")],
+                             ["b.txt"])
+            self.assertEqual(sorted(name for name, _ in stemmed.search_results("dog")),
+                             ["a.txt"])
+            loaded = SearchEngine(directory, index_path=index_path, update=False,
+                                  analyzer=analyzer)
+            self.assertIsNotNone(loaded.index.mapping)
+            rebuilt = SearchEngine(directory, stopwords, index_path, update=False)
+            self.assertIsNone(rebuilt.index.mapping)
+            self.assertEqual(rebuilt.index.analyzer, "punct")
+            self.assertRaises(ValueError, rebuilt.index.merge, stemmed.index)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+MaxScore dynamic pruning for top-k queries.
+
+Every posting list knows the largest weight it holds (PostingList.max_weight),
+which bounds how much the term can add to any document's score. The lists of
+a query are scored term at a time, shortest (rarest) first, into a dict of
+partial scores. Weights are never negative, so the k-th best partial score is
+a lower bound on the final k-th score. As soon as the bounds of the lists
+left add up to less than it, no document that isn't already a candidate can
+make the top k: the remaining lists, usually the long ones of common terms,
+are then only probed for the candidates, by binary search while there are
+few of them, and candidates
+that can no longer reach the k-th score are dropped along the way. The top k
+is the same as with exhaustive scoring.
+"""
+import heapq
+from itertools import accumulate
+
+from codec import bisect
+
+# scores are sums of floats added in a different order than the bounds, so a
+# bound is only trusted to prune when it is below the threshold by this much
+SLACK = 1e-9
+# the candidates are looked up in a list by binary search while there are
+# fewer than 1/PROBE_RATIO of its postings, otherwise the list is scanned
+PROBE_RATIO = 8
+
+
+def top_k(index, terms, k, postings=None):
+    """finds the k best scoring documents for the terms without scoring every posting
+    Args:
+    index (InvertedIndex) : the index to search, with fresh weights
+    terms (list) : a list of str, repeated terms count once per occurrence and terms
+        missing from the index match nothing
+    k (int) : number of documents to return
+    postings (callable) : finds the posting list of a term, index.postings by default
+    Returns:
+    list : (doc id, score) tuples, best first, ties broken by ascending doc id
+    """
+    lookup = index.postings if postings is None else postings
+    lists = []
+    for term in terms:
+        postings = lookup(term)
+        if postings is not None:
+            lists.append(postings)
+    if k <= 0 or not lists:
+        return []
+    lists.sort(key=len)
+    # bounds[i] is the most lists i.. can add to a score together
+    bounds = list(accumulate(postings.max_weight for postings in reversed(lists)))[::-1]
+    bounds.append(0.0)
+    doc_norms = index.doc_norms
+    scores = {}
+    get = scores.get
+    start = len(lists)
+    for i, postings in enumerate(lists):
+        if len(scores) >= k and kth_score(scores, k) - SLACK > bounds[i]:
+            start = i
+            break
+        scale = postings.scale
+        for doc_id, weight in zip(postings.doc_ids, postings.weights):
+            if doc_norms[doc_id]:
+                scores[doc_id] = get(doc_id, 0.0) + weight * scale
+    for i in range(start, len(lists)):
+        threshold = kth_score(scores, k) - SLACK
+        scores = {doc_id: score for doc_id, score in scores.items()
+                  if score + bounds[i] >= threshold}
+        postings = lists[i]
+        doc_ids = postings.doc_ids
+        weights = postings.weights
+        scale = postings.scale
+        if len(scores) * PROBE_RATIO < len(doc_ids):
+            position = 0
+            for doc_id in sorted(scores):
+                position = bisect(doc_ids, doc_id, position)
+                if position == len(doc_ids):
+                    break
+                if doc_ids[position] == doc_id:
+                    scores[doc_id] += weights[position] * scale
+        else:
+            for doc_id, weight in zip(doc_ids, weights):
+                if doc_id in scores:
+                    scores[doc_id] += weight * scale
+    ranked = heapq.nlargest(k, [(score, -doc_id) for doc_id, score in scores.items()])
+    return [(-doc_id, score) for score, doc_id in ranked]
+
+
+def kth_score(scores, k):
+    """the k-th best of the scores, which must hold at least k of them"""
+    return heapq.nlargest(k, scores.values())[-1]
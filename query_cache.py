@@ -0,0 +1,111 @@
+"""
+LRU cache of ranked query results.
+
+Results are keyed by the normalized query (see SearchEngine.query_key) and
+remember how deep they were ranked, so a cached top 20 also answers a
+request for the top 10, or for the second page of 10. Entries are evicted
+least recently used first once there are more than max_entries of them or
+they hold more than max_results results between them.
+
+Every change to an InvertedIndex gives it a new version, unique across all
+indexes. The cache remembers the version its entries were computed against
+and drops them all when it sees another one.
+"""
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    A bounded cache of ranked results.
+
+    Attributes:
+        max_entries (int) : the most queries kept
+        max_results (int) : the most (filename, score) results kept over all queries
+        entries (OrderedDict) : key -> (depth, results), least recently used first
+        num_results (int) : number of results currently kept
+        version (int) : the index version the entries were computed against
+        hits (int) : lookups answered from the cache
+        misses (int) : lookups that were not
+        evictions (int) : entries dropped to stay within the bounds
+        invalidations (int) : times every entry was dropped because the index changed
+    """
+    def __init__(self, max_entries=1024, max_results=100000):
+        self.max_entries = max_entries
+        self.max_results = max_results
+        self.entries = OrderedDict()
+        self.num_results = 0
+        self.version = None
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, depth, version):
+        """looks up the results of a query
+        Args:
+        key (tuple) : the normalized query
+        depth (int) : number of best results needed, None for all of them
+        version (int) : the current version of the index
+        Returns:
+        list : the cached results, at least depth of them unless fewer match, None on a miss
+        """
+        self.check(version)
+        entry = self.entries.get(key)
+        if entry is not None:
+            cached_depth, results = entry
+            # a ranking that stopped short of its depth already holds every match
+            if (cached_depth is None or len(results) < cached_depth or
+                    (depth is not None and depth <= cached_depth)):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return results
+        self.misses += 1
+        return None
+
+    def put(self, key, depth, results, version):
+        """stores the results of a query, evicting the least recently used ones
+        if the cache is full
+        Args:
+        key (tuple) : the normalized query
+        depth (int) : number of best results that were ranked, None for all of them
+        results (list) : the (filename, score) results
+        version (int) : the version of the index they were computed against
+        """
+        self.check(version)
+        if len(results) > self.max_results:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.num_results -= len(old[1])
+        self.entries[key] = (depth, results)
+        self.num_results += len(results)
+        while len(self.entries) > self.max_entries or self.num_results > self.max_results:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.num_results -= len(evicted)
+            self.evictions += 1
+
+    def check(self, version):
+        """drops every entry if the index changed since they were stored
+        Args:
+        version (int) : the current version of the index
+        """
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        """drops every entry"""
+        self.entries.clear()
+        self.num_results = 0
+
+    def stats(self):
+        """reports how well the cache is doing
+        Returns:
+        dict : entries, results, hits, misses, hit_rate, evictions and invalidations
+        """
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "results": self.num_results, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations}
@@ -0,0 +1,257 @@
+"""
+Asynchronous query server for the SearchEngine.
+
+Clients connect over TCP (or a Unix socket) and send one JSON request per
+line:
+
+    {"query": "fox AND dog", "k": 10, "offset": 0}
+
+k and offset are optional, as for SearchEngine.search_results. Each request
+is answered, in order, with one JSON line:
+
+    {"query": "fox AND dog", "results": [{"file": "fox1.txt",
+     "path": "docs/fox1.txt", "score": 0.38}, ...]}
+
+or {"error": "..."} for a request that isn't valid JSON, a query that can't
+be parsed or one whose search failed. A request longer than LINE_LIMIT bytes
+is answered with an error and the connection closed, as the rest of the line
+can't be told apart from the next request. The event loop only reads and writes
+sockets: queries are scored in a pool of worker processes, each with its own
+SearchEngine opened from the saved index file (which the operating system
+shares between them), or, without worker processes, in one thread next to
+the loop so slow queries don't hold up other clients' I/O. A worker process
+that dies is replaced.
+"""
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# the engine of a worker process, opened by init_worker
+ENGINE = None
+# the longest request line read, in bytes
+LINE_LIMIT = 1 << 16
+
+
+def init_worker(factory, directory, analyzer, index_path, weighting, quantize):
+    """opens the engine of a worker process from the saved index
+    Args:
+    factory (type) : the SearchEngine class
+    directory (str) : the directory of the documents
+    analyzer (Analyzer) : the analyzer the index was built with
+    index_path (str) : the saved index
+    weighting (str) : the weighting scheme of the index
+    quantize (bool) : whether the index quantizes its weights
+    """
+    global ENGINE
+    ENGINE = factory(directory, index_path=index_path, update=False, weighting=weighting,
+                     quantize=quantize, analyzer=analyzer)
+
+
+def worker_search(query, k=None, offset=0):
+    """answers a query with the engine of a worker process, see search_json"""
+    return search_json(ENGINE, query, k, offset)
+
+
+def search_json(engine, query, k=None, offset=0):
+    """answers a query with JSON friendly results
+    Args:
+    engine (SearchEngine) : the engine to search
+    query (str) : the query
+    k (int) : number of results to return, None for all of them
+    offset (int) : number of best results to skip
+    Returns:
+    list : a dict with the file, path and score of each result, best first
+    """
+    return [{"file": name, "path": "%s/%s" % (engine.directory, name), "score": score}
+            for name, score in engine.search_results(query, k, offset)]
+
+
+class QueryServer:
+    """
+    Serves SearchEngine queries to many clients at once.
+
+    Attributes:
+        engine (SearchEngine) : the engine queries are answered with when there are no
+            worker processes
+        pool (Executor) : where queries are scored, a ProcessPoolExecutor of workers or a
+            single thread
+        initargs (tuple) : the arguments of init_worker, to start new workers with
+        workers (int) : number of worker processes, 0 to score in a thread
+        requests (int) : number of requests answered
+        errors (int) : number of requests answered with an error
+        connections (set) : the tasks handling the connected clients
+    """
+    def __init__(self, engine, index_path=None, workers=0):
+        """
+        Args:
+        engine (SearchEngine) : the engine to serve
+        index_path (str) : the file the engine's index is saved in, which worker processes
+            open. Required when workers is more than 0
+        workers (int) : number of worker processes to score queries in. Only a SearchEngine
+            can be opened in them: an engine without an index of its own, such as a
+            ShardedSearchEngine, is served with 0
+        """
+        self.engine = engine
+        self.workers = workers
+        if workers:
+            if index_path is None:
+                raise ValueError("worker processes need the index saved to an index_path")
+            if getattr(engine, "index", None) is None:
+                raise ValueError("worker processes need a SearchEngine, serve %s with workers=0"
+                                 % type(engine).__name__)
+            index = engine.index
+            self.initargs = (type(engine), engine.directory, engine.analyzer, index_path,
+                             index.weighting.name, index.quantized)
+            self.pool = self.start_workers()
+        else:
+            self.initargs = None
+            self.pool = ThreadPoolExecutor(1)
+        self.requests = self.errors = 0
+        self.connections = set()
+
+    def start_workers(self):
+        """starts the pool of worker processes
+        Returns:
+        ProcessPoolExecutor : the pool, its workers open the engine with init_worker
+        """
+        # spawned rather than forked, so workers don't inherit the sockets of connected
+        # clients and keep them open after the clients hang up
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=init_worker, initargs=self.initargs)
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """starts listening for clients
+        Args:
+        host (str) : the address to listen on
+        port (int) : the TCP port, 0 for any free port
+        path (str) : a Unix socket to listen on instead of a TCP port
+        Returns:
+        asyncio.Server : the listening server, see its sockets for the address
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path, limit=LINE_LIMIT)
+        return await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+
+    async def serve_forever(self, host="127.0.0.1", port=8765, path=None):
+        """listens for clients until cancelled, see start"""
+        server = await self.start(host, port, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    async def stop(self, server):
+        """stops listening, waits for the connected clients to disconnect and
+        shuts the worker pool down
+        Args:
+        server (asyncio.Server) : the server returned by start
+        """
+        server.close()
+        if self.connections:
+            await asyncio.wait(self.connections)
+        await server.wait_closed()
+        self.close()
+
+    async def handle(self, reader, writer):
+        """answers the requests of one client until it disconnects
+        Args:
+        reader (asyncio.StreamReader) : the client's requests
+        writer (asyncio.StreamWriter) : where the answers go
+        """
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    self.requests += 1
+                    self.errors += 1
+                    writer.write(json.dumps({"error": "invalid request: line too long"})
+                                 .encode("utf-8") + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self.answer(line)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def answer(self, line):
+        """answers one request
+        Args:
+        line (bytes) : the JSON request
+        Returns:
+        dict : the JSON response
+        """
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            query = request["query"]
+            k = request.get("k")
+            offset = request.get("offset", 0)
+            if (not isinstance(query, str) or not (k is None or is_count(k)) or
+                    not is_count(offset)):
+                raise ValueError("query must be a string, k and offset non-negative integers")
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self.errors += 1
+            return {"error": "invalid request: %s" % error}
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            if self.workers:
+                results = await loop.run_in_executor(pool, worker_search, query, k, offset)
+            else:
+                results = await loop.run_in_executor(pool, search_json, self.engine, query,
+                                                     k, offset)
+        except BrokenProcessPool:
+            # a worker died, the pool can't run anything anymore: replace it so later
+            # requests are answered again, unless a request that failed with it already has
+            self.errors += 1
+            if self.pool is pool:
+                pool.shutdown(wait=False)
+                self.pool = self.start_workers()
+            return {"query": query, "error": "search failed: a worker died"}
+        except ValueError as error:
+            self.errors += 1
+            return {"query": query, "error": str(error)}
+        except Exception as error:
+            self.errors += 1
+            return {"query": query,
+                    "error": "search failed: %s" % (str(error) or type(error).__name__)}
+        return {"query": query, "results": results}
+
+    def close(self):
+        """shuts the worker pool down"""
+        self.pool.shutdown()
+
+
+def is_count(value):
+    """tells whether a request value is a non-negative integer, which booleans aren't"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+async def request(reader, writer, query, k=None, offset=0):
+    """sends one query to a QueryServer and waits for its answer
+    Args:
+    reader (asyncio.StreamReader) : the connection's reader
+    writer (asyncio.StreamWriter) : the connection's writer
+    query (str) : the query
+    k (int) : number of results to return, None for all of them
+    offset (int) : number of best results to skip
+    Returns:
+    dict : the server's response
+    """
+    writer.write(json.dumps({"query": query, "k": k, "offset": offset}).encode("utf-8") + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
@@ -0,0 +1,212 @@
+"""
+Sharded search over a directory of documents.
+
+The text files of a directory are split into shards by a hash of their name,
+so a file always lands in the same shard, and each shard is indexed and
+searched by its own SearchEngine in its own worker process. A query is
+scattered to every shard, each returns its best offset + k results, and the
+coordinator merges those lists into the overall best k: the whole corpus no
+longer has to fit in, or be scored by, one process. Files with equal scores
+are ordered by name, in each shard and in the merged list, which is the order
+an index of the whole corpus built from scratch ranks them in.
+
+Weighting schemes that depend on corpus statistics (tfidf, bm25) would give
+each shard its own idf and average length, making scores from different
+shards incomparable. The coordinator therefore gathers the statistics of
+every shard, adds them up (inverted_index.CorpusStats) and hands the totals
+back, and every shard weighs its postings with them, so a sharded corpus
+scores documents exactly as one index of the whole corpus would. Each shard
+keeps the document frequencies of its own terms only, but the coordinator
+holds those of the whole vocabulary, and each refresh sends it to every
+shard once.
+"""
+import heapq
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from inverted_index import CorpusStats
+from project4 import SearchEngine
+from tokenizer import Analyzer
+from weighting import get_weighting
+
+# the shard engine of a worker process, opened by open_shard
+SHARD = None
+
+
+def shard_of(filename, shards):
+    """picks the shard a file belongs to
+    Args:
+    filename (str) : the file name
+    shards (int) : number of shards
+    Returns:
+    int : the shard number, the same in every run
+    """
+    return zlib.crc32(filename.encode("utf-8")) % shards
+
+
+def open_shard(directory, names, index_path, analyzer, weighting, quantize, positional,
+               compress, cache_size):
+    """indexes the files of one shard, or opens its saved index and brings it up to
+    date (and saves it if anything changed), in a worker process
+    Args:
+    directory (str) : the directory of the documents
+    names (list) : the files of the directory in this shard
+    index_path (str) : the shard's index file, None to keep it in memory
+    analyzer (Analyzer) : splits documents and queries into terms
+    weighting (str) : the weighting scheme
+    quantize (bool) : whether weights are stored in one byte
+    positional (bool) : whether positions are indexed
+    compress (bool) : whether the saved postings are compressed
+    cache_size (int) : number of queries whose results the shard caches
+    """
+    global SHARD
+    SHARD = SearchEngine(directory, index_path=index_path, weighting=weighting,
+                         quantize=quantize, positional=positional, compress=compress,
+                         cache_size=cache_size, analyzer=analyzer, names=names)
+    SHARD.index.refresh_weights()
+
+
+def shard_stats():
+    """the corpus statistics of the worker's shard, see InvertedIndex.corpus_stats"""
+    return SHARD.index.corpus_stats()
+
+
+def set_shard_corpus(corpus):
+    """makes the worker's shard weigh with the statistics of the whole corpus"""
+    SHARD.index.set_corpus(corpus)
+
+
+def shard_search(query, depth):
+    """the best results of a query in the worker's shard
+    Args:
+    query (str) : the query
+    depth (int) : number of results to return, None for all of them
+    Returns:
+    list : (filename, score) tuples, best first and files with equal scores by name,
+        see merge_key
+    """
+    results = SHARD.search_results(query, depth)
+    if depth:
+        # the engine orders equal scores by doc id, so files tied with the last one kept
+        # may be cut off: look deeper until the score drops to order the ties by name
+        size = depth
+        while len(results) == size and results[-1][1] == results[depth - 1][1]:
+            size *= 2
+            results = SHARD.search_results(query, size)
+    results.sort(key=merge_key)
+    return results[:depth]
+
+
+def merge_key(pair):
+    """sort key of a (filename, score) pair: higher scores first, then file names"""
+    return -pair[1], pair[0]
+
+
+def shard_size():
+    """the number of documents in the worker's shard"""
+    return len(SHARD.index)
+
+
+class ShardedSearchEngine:
+    """
+    Searches a directory split into shards, each served by a worker process.
+    search and search_results behave like those of SearchEngine, so a
+    ShardedSearchEngine can be served by a QueryServer without worker processes
+    of its own (workers=0): the shards already score queries in parallel.
+
+    Attributes:
+        directory (str) : the directory of documents
+        analyzer (Analyzer) : how documents and queries are split into terms
+        shards (list) : a single process ProcessPoolExecutor per shard, holding its engine
+        corpus (CorpusStats) : the combined statistics the shards weigh with, document
+            frequencies of every term included. None when the weighting scheme only
+            depends on each document
+    """
+    def __init__(self, directory, stopwords=(), index_path=None, shards=None,
+                 weighting="log", quantize=False, positional=False, compress=None,
+                 cache_size=1024, analyzer=None):
+        """
+        Args:
+        directory (str) : the directory of documents to search
+        stopwords (frozenset) : words left out of the index and of queries
+        index_path (str) : optional prefix of the shards' index files, shard i is saved to
+            index_path + ".i" and opened from there next time
+        shards (int) : number of shards and worker processes, one per CPU by default
+        weighting, quantize, positional, compress, cache_size, analyzer : see SearchEngine,
+            each shard caches the results of its cache_size most recent queries
+        """
+        if shards is None:
+            shards = os.cpu_count() or 1
+        if shards < 1:
+            raise ValueError("need at least one shard")
+        self.directory = directory
+        self.analyzer = Analyzer(stopwords) if analyzer is None else analyzer
+        names = sorted(i for i in os.listdir(directory) if ".txt" in i)
+        parts = [[] for _ in range(shards)]
+        for name in names:
+            parts[shard_of(name, shards)].append(name)
+        # spawned rather than forked, so workers start from a clean process and don't
+        # inherit sockets of a server the engine is used in
+        context = multiprocessing.get_context("spawn")
+        self.shards = []
+        for number, part in enumerate(parts):
+            path = None if index_path is None else "%s.%d" % (index_path, number)
+            self.shards.append(ProcessPoolExecutor(
+                1, mp_context=context, initializer=open_shard,
+                initargs=(directory, part, path, self.analyzer, weighting, quantize,
+                          positional, compress, cache_size)))
+        self.corpus = None
+        # opens every shard now rather than on the first query
+        self.scatter(shard_size)
+        if not get_weighting(weighting).local:
+            self.refresh_stats()
+
+    def scatter(self, func, *args):
+        """runs a function in every shard's worker process at once
+        Args:
+        func (callable) : a module level function, such as shard_search
+        Returns:
+        list : the result of each shard, in shard order
+        """
+        futures = [shard.submit(func, *args) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def refresh_stats(self):
+        """gathers the statistics of every shard and makes them all weigh with the
+        totals, so scores from different shards can be compared"""
+        self.corpus = CorpusStats.combine(self.scatter(shard_stats))
+        self.scatter(set_shard_corpus, self.corpus)
+
+    def __len__(self):
+        return sum(self.scatter(shard_size))
+
+    def search_results(self, query, k=None, offset=0):
+        """scores the files matching a query in every shard, see SearchEngine.search_results
+        Args:
+        query (str) : the query
+        k (int) : number of results to return, None for all of them
+        offset (int) : number of best results to skip
+        Returns:
+        list : a list of tuples: (filename, score) sorted in descending order of relevancy.
+            Files with equal scores are ordered by name
+        """
+        depth = None if k is None else offset + k
+        results = self.scatter(shard_search, query, depth)
+        merged = heapq.merge(*results, key=merge_key)
+        return list(islice(merged, offset, depth))
+
+    def search(self, query, k=None, offset=0):
+        """
+        Searches query and returns the paths of the matching files, best match first,
+        one per line, see SearchEngine.search
+        """
+        return "".join("%s/%s \n" % (self.directory, name)
+                       for name, _ in self.search_results(query, k, offset))
+
+    def close(self):
+        """shuts the shards' worker processes down"""
+        for shard in self.shards:
+            shard.shutdown()
@@ -0,0 +1,52 @@
+"""
+Stopword sets shared by the search engines.
+
+A stopword file is read in one go, split on whitespace and kept as a
+frozenset, so checking a token is a single hash lookup. The set is loaded
+once per file and shared by every engine in the process, and being a plain
+frozenset it is cheap to pickle into worker processes.
+"""
+import os
+
+# frozensets already loaded, by absolute path of the file
+LOADED = {}
+
+
+def read_stopwords(filename):
+    """reads the words of a stopword file
+    Args:
+    filename (str) : the path to a file of whitespace separated words
+    Returns:
+    list : the lower case words of the file, in order
+    """
+    with open(filename, 'r') as reader:
+        return reader.read().lower().split()
+
+
+def load_stopwords(filename):
+    """loads a stopword file, reading it only the first time it's asked for
+    Args:
+    filename (str) : the path to a file of whitespace separated words
+    Returns:
+    frozenset : the lower case words of the file
+    """
+    path = os.path.abspath(filename)
+    stopwords = LOADED.get(path)
+    if stopwords is None:
+        stopwords = LOADED[path] = frozenset(read_stopwords(path))
+    return stopwords
+
+
+def stopword_set(stopwords):
+    """turns a collection of stopwords into a frozenset
+    Args:
+    stopwords : a frozenset, any iterable of words or a hash table such as HashTableLinear
+        whose keys are the words
+    Returns:
+    frozenset : the words, the same object when stopwords already is one
+    """
+    if isinstance(stopwords, frozenset):
+        return stopwords
+    if hasattr(stopwords, "items"):
+        return frozenset(key for key, _ in stopwords.items())
+    return frozenset(stopwords)
@@ -0,0 +1,177 @@
+"""
+Streaming tokenizer used to index documents, and the analyzer that turns
+text into terms for both indexing and querying.
+
+Files are read in chunks of bounded size and split into words chunk by
+chunk, so memory used while indexing depends on the chunk size rather than
+on the size of the largest document.
+
+An Analyzer normalizes a whole chunk at once (lowercasing, and replacing
+punctuation with one str.translate call), splits it on whitespace, then
+drops stopwords and optionally stems the words of the chunk in one list
+comprehension, so there is no per-character or per-word Python loop.
+"""
+import string
+
+from stopwords import stopword_set
+
+CHUNK_SIZE = 1 << 16
+
+# punctuation becomes a space, so "fox," and "fox" are one term and "well-known" is two.
+# Apostrophes are dropped instead, keeping "don't" one word
+PUNCTUATION = str.maketrans(
+    dict.fromkeys(string.punctuation.replace("'", "") + "\u201c\u201d\u2013\u2014\u2026", " ")
+    | dict.fromkeys("'\u2018\u2019"))
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """reads a text file in chunks
+    Args:
+    path (str) : the path to a file
+    chunk_size (int) : maximum number of characters per chunk
+    Returns:
+    generator : the chunks of the file, in order
+    """
+    with open(path, 'r') as reader:
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def split_chunks(chunks, normalize=str.lower):
+    """splits chunks of text into lower case words. A word cut in two by a chunk
+    boundary is carried over and joined with the start of the next chunk.
+    Args:
+    chunks (iterable) : consecutive pieces of a text
+    normalize (callable) : applied to each chunk before it is split, must work a
+        character at a time (see Analyzer.normalize)
+    Returns:
+    generator : a list of words per chunk
+    """
+    tail = ''
+    for chunk in chunks:
+        chunk = tail + normalize(chunk)
+        words = chunk.split()
+        if words and not chunk[-1].isspace():
+            tail = words.pop()
+        else:
+            tail = ''
+        yield words
+    if tail:
+        yield [tail]
+
+
+def tokenize(chunks, analyzer):
+    """turns chunks of text into the words that get indexed
+    Args:
+    chunks (iterable) : consecutive pieces of a text
+    analyzer (Analyzer) : the analyzer of the index, or the stopwords of a default one
+    Returns:
+    generator : the terms of the text, see Analyzer
+    """
+    return as_analyzer(analyzer).tokenize(chunks)
+
+
+def stem(word):
+    """reduces an English plural to its singular, with the rules of Harman's S stemmer
+    Args:
+    word (str) : a lower case word
+    Returns:
+    str : the stem
+    """
+    if word[-1:] != "s" or len(word) < 3:
+        return word
+    if word.endswith("ies") and len(word) > 3 and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if not word.endswith(("us", "ss")):
+        return word[:-1]
+    return word
+
+
+class Analyzer:
+    """
+    Turns text into terms: lowercases it, replaces punctuation with spaces, splits it
+    on whitespace, leaves out stopwords and stems what's left. The index and the
+    queries against it must be analyzed the same way, so a SearchEngine uses one
+    Analyzer for both and the index records its name.
+    Attributes:
+        stopwords (frozenset) : words left out, normalized like the text
+        punctuation (bool) : whether punctuation is replaced with spaces
+        stem (bool) : whether plurals are reduced to their singular, see stem
+        name (str) : identifies the options, two analyzers with the same name produce
+            the same terms given the same stopwords
+    """
+    def __init__(self, stopwords=(), punctuation=True, stem=False):
+        """
+        Args:
+        stopwords (iterable) : words to leave out, see stopwords.stopword_set
+        punctuation (bool) : replace punctuation with spaces, otherwise it is part of
+            the word it's attached to
+        stem (bool) : reduce plurals to their singular. Stopwords are removed first
+        """
+        self.punctuation = punctuation
+        self.stem = stem
+        stopwords = stopword_set(stopwords)
+        normalized = frozenset(word for words in stopwords for word in
+                               self.normalize(words).split())
+        self.stopwords = stopwords if normalized == stopwords else normalized
+        self.name = "+".join(option for option, used in (("punct", punctuation),
+                                                         ("stem", stem)) if used) or "plain"
+
+    def __repr__(self):
+        return "Analyzer(%d stopwords, %s)" % (len(self.stopwords), self.name)
+
+    def normalize(self, text):
+        """lowercases text and, if punctuation is stripped, replaces it with spaces
+        Args:
+        text (str) : any text, a chunk of a document or a query
+        Returns:
+        str : the text, the same length unless apostrophes were dropped
+        """
+        text = text.lower()
+        if self.punctuation:
+            return text.translate(PUNCTUATION)
+        return text
+
+    def terms(self, words):
+        """drops stopwords and stems a list of normalized words
+        Args:
+        words (list) : words split from normalized text
+        Returns:
+        list : the terms, in order
+        """
+        stopwords = self.stopwords
+        if self.stem:
+            return [stem(word) for word in words if word not in stopwords]
+        return [word for word in words if word not in stopwords]
+
+    def analyze(self, text):
+        """turns a piece of text into its terms
+        Args:
+        text (str) : e.g. a query
+        Returns:
+        list : the terms, in order
+        """
+        return self.terms(self.normalize(text).split())
+
+    def tokenize(self, chunks):
+        """turns a text read in chunks into its terms
+        Args:
+        chunks (iterable) : consecutive pieces of a text, see read_chunks
+        Returns:
+        generator : the terms, in order
+        """
+        for words in split_chunks(chunks, self.normalize):
+            yield from self.terms(words)
+
+
+def as_analyzer(analyzer):
+    """returns analyzer if it is an Analyzer, otherwise a default Analyzer leaving out
+    analyzer as stopwords"""
+    if isinstance(analyzer, Analyzer):
+        return analyzer
+    return Analyzer(analyzer)
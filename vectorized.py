@@ -0,0 +1,58 @@
+"""
+Optional NumPy scoring path for the SearchEngine.
+
+Posting arrays are wrapped as NumPy arrays without copying and each query
+term's stored weights are added into a dense array indexed by doc id in one
+vectorized pass. The module still imports
+without NumPy installed; numpy is then None and SearchEngine keeps to the
+pure Python loop.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from codec import BlockSequence
+
+
+def as_numpy(values, dtype):
+    """wraps an array or memoryview without copying it. Compressed values
+    (a codec.BlockSequence) are decoded into a new array instead.
+    Args:
+    values (array or memoryview) : typed values
+    dtype (numpy.dtype) : their NumPy type
+    Returns:
+    numpy.ndarray : a read only view of the values
+    """
+    if not len(values):
+        return numpy.zeros(0, dtype)
+    if isinstance(values, BlockSequence):
+        return numpy.fromiter(values, dtype, len(values))
+    return numpy.frombuffer(values, dtype)
+
+
+def score_terms(index, terms, postings=None):
+    """scores each document containing one of the terms, like SearchEngine.get_scores
+    Args:
+    index (InvertedIndex) : the index to score against, with fresh weights
+    terms (list) : a list of str
+    postings (callable) : finds the posting list of a term, index.postings by default
+    Returns:
+    dict : doc id -> relevancy score, in ascending doc id order
+    """
+    norms = as_numpy(index.doc_norms, numpy.float64)
+    scores = numpy.zeros(len(norms))
+    weight_type = numpy.uint8 if index.quantized else numpy.float32
+    lookup = index.postings if postings is None else postings
+    for term in terms:
+        postings = lookup(term)
+        if postings is None:
+            continue
+        doc_ids = as_numpy(postings.doc_ids, numpy.intc)
+        weights = as_numpy(postings.weights, weight_type)
+        # doc ids are unique within a posting list, so fancy indexed += is safe
+        scores[doc_ids] += weights * postings.scale
+    # removed documents keep their postings until the index is saved
+    scores[norms == 0] = 0
+    matched = numpy.flatnonzero(scores)
+    return dict(zip(matched.tolist(), scores[matched].tolist()))
@@ -0,0 +1,179 @@
+"""
+Term weighting schemes.
+
+A scheme turns the frequencies in a posting list into the weight each posting
+adds to a document's score. The InvertedIndex computes and stores these
+weights while indexing, so scoring a query only has to add them up. Schemes
+are looked up by name with get_weighting, which is how SearchEngine and the
+saved index file refer to them.
+
+    log     (1 + log tf) / document length, the original score
+    raw     tf / document length
+    tfidf   (1 + log tf) * idf / document length, idf = log(1 + N / df)
+    bm25    Okapi BM25 with k1 = 1.2 and b = 0.75
+
+N is the number of live documents and df the number of them containing the
+term. tfidf and bm25 depend on these corpus statistics, so their weights are
+recomputed in one pass (InvertedIndex.refresh_weights) after the index
+changes rather than per document. The statistics are the index's own unless
+it is one shard of a larger corpus, see InvertedIndex.term_stats.
+"""
+import math
+from array import array
+
+
+class Weighting:
+    """
+    Base class of the weighting schemes. Every scheme computes the weights of a
+    whole posting list with weights(postings, index, stats); the local ones (see
+    LocalWeighting) can also weigh a single posting.
+
+    Attributes:
+        name (str) : the name the scheme is configured by
+        local (bool) : True when a posting's weight only depends on the posting and its
+            document, so it can be computed as soon as the document is added
+    """
+    name = None
+    local = False
+
+
+class LocalWeighting(Weighting):
+    """
+    Base class of the schemes whose weights only depend on the posting and its
+    document. Each defines weigh(doc_id, freq, index), the weight of one posting,
+    which InvertedIndex.add_document uses as documents are added.
+    """
+    local = True
+
+    def weights(self, postings, index, stats):
+        """computes the weights of a whole posting list
+        Args:
+        postings (PostingList) : the postings
+        index (InvertedIndex) : the index the postings belong to
+        stats (tuple) : number of documents, number of them containing the term and
+            average document length of the corpus, see InvertedIndex.term_stats
+        Returns:
+        list : the weight of each posting, in order
+        """
+        return [self.weigh(doc_id, freq, index) for doc_id, freq in postings]
+
+
+class LogWeighting(LocalWeighting):
+    """
+    (1 + log tf) / document length, the original SearchEngine score.
+    """
+    name = "log"
+
+    def weigh(self, doc_id, freq, index):
+        """computes the weight of one posting
+        Args:
+        doc_id (int) : the document id
+        freq (int) : frequency of the term in the document
+        index (InvertedIndex) : the index the posting belongs to
+        Returns:
+        float : the weight
+        """
+        return (1 + math.log(freq)) * index.doc_norms[doc_id]
+
+
+class RawWeighting(LocalWeighting):
+    """
+    tf / document length.
+    """
+    name = "raw"
+
+    def weigh(self, doc_id, freq, index):
+        return freq * index.doc_norms[doc_id]
+
+
+class TfIdfWeighting(Weighting):
+    """
+    (1 + log tf) * idf / document length. The smoothed idf log(1 + N / df) stays
+    positive, so a term found in every document still counts.
+    """
+    name = "tfidf"
+
+    def weights(self, postings, index, stats):
+        num_docs, doc_freq, _ = stats
+        idf = math.log(1 + num_docs / doc_freq) if doc_freq else 0.0
+        doc_norms = index.doc_norms
+        return [(1 + math.log(freq)) * idf * doc_norms[doc_id] for doc_id, freq in postings]
+
+
+class BM25Weighting(Weighting):
+    """
+    Okapi BM25: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg length)),
+    with the non negative idf log(1 + (N - df + 0.5) / (df + 0.5)).
+
+    Attributes:
+        k1 (float) : how quickly repeated occurrences of a term saturate
+        b (float) : how strongly scores are normalized by document length
+    """
+    name = "bm25"
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+    def weights(self, postings, index, stats):
+        num_docs, doc_freq, avg_length = stats
+        idf = math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = avg_length or 1.0
+        doc_lengths = index.doc_lengths
+        k1, b = self.k1, self.b
+        weights = []
+        for doc_id, freq in postings:
+            length = doc_lengths[doc_id]
+            if length:
+                weights.append(idf * freq * (k1 + 1) /
+                               (freq + k1 * (1 - b + b * length / avg_length)))
+            else:
+                weights.append(0.0)
+        return weights
+
+
+SCHEMES = {}
+
+
+def register(scheme):
+    """makes a weighting scheme available to get_weighting
+    Args:
+    scheme (Weighting) : the scheme
+    Returns:
+    Weighting : the scheme
+    """
+    SCHEMES[scheme.name] = scheme
+    return scheme
+
+
+def get_weighting(name):
+    """finds a weighting scheme by name
+    Args:
+    name (str) : the name of the scheme, e.g. "log"
+    Returns:
+    Weighting : the scheme
+    """
+    if name not in SCHEMES:
+        raise ValueError("unknown weighting scheme %r, expected one of %s"
+                         % (name, ", ".join(sorted(SCHEMES))))
+    return SCHEMES[name]
+
+
+def quantize(weights):
+    """stores weights in one byte each, as multiples of the largest weight / 255
+    Args:
+    weights (list) : non negative weights
+    Returns:
+    tuple : array of uint8 codes and the scale to multiply a code by
+    """
+    largest = max(weights, default=0.0)
+    if largest <= 0:
+        return array('B', bytes(len(weights))), 1.0
+    scale = largest / 255
+    return array('B', [min(255, int(weight / scale + 0.5)) for weight in weights]), scale
+
+
+register(LogWeighting())
+register(RawWeighting())
+register(TfIdfWeighting())
+register(BM25Weighting())